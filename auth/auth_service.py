@@ -1,76 +1,206 @@
-import requests
-from typing import Optional, Tuple
-from data.models import User
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
 
 CONFIG = {
     'firebase_api_key': 'YOUR_KEY_HERE',
     'firebase_auth_url': 'https://identitytoolkit.googleapis.com/v1/accounts',
+    'firebase_token_url': 'https://securetoken.googleapis.com/v1/token',
 }
 
+# Refresh the ID token this long before it expires
+REFRESH_MARGIN = 300
+
+class AuthError(Exception):
+    pass
+
+class FirebaseBackend:
+    # The Firebase Auth REST calls the app uses. Point auth_url/token_url at
+    # tools.standin_auth to run without the real service.
+    def __init__(self, api_key: str = CONFIG['firebase_api_key'], auth_url: str = CONFIG['firebase_auth_url'],
+                 token_url: str = CONFIG['firebase_token_url'], timeout: float = 10.0):
+        self.api_key = api_key
+        self.auth_url = auth_url
+        self.token_url = token_url
+        self.timeout = timeout
+        self.session = None
+
+    def post(self, url: str, **kwargs) -> Dict:
+        # requests is imported on first use, so the login window can paint
+        # before it is loaded; one pooled session serves every call after that
+        import requests
+        if self.session is None:
+            self.session = requests.Session()
+        try:
+            response = self.session.post(url, params={'key': self.api_key}, timeout=self.timeout, **kwargs)
+            data = response.json()
+        except requests.RequestException as e:
+            raise ConnectionError(f"Network error: {e}")
+        except ValueError:
+            raise AuthError(f"Unexpected response ({response.status_code})")
+        if not isinstance(data, dict):
+            raise AuthError(f"Unexpected response ({response.status_code})")
+        if response.status_code != 200:
+            raise AuthError(data.get('error', {}).get('message', f"Request failed ({response.status_code})"))
+        return data
+
+    def sign_up(self, email: str, password: str) -> Dict:
+        return self.post(f"{self.auth_url}:signUp", json={'email': email, 'password': password, 'returnSecureToken': True})
+
+    def sign_in(self, email: str, password: str) -> Dict:
+        data = self.post(f"{self.auth_url}:signInWithPassword",
+                         json={'email': email, 'password': password, 'returnSecureToken': True})
+        try:
+            return {
+                'uid': data['localId'],
+                'email': data['email'],
+                'id_token': data['idToken'],
+                'refresh_token': data['refreshToken'],
+                'expires_at': time.time() + int(data.get('expiresIn', 3600))
+            }
+        except (KeyError, TypeError, ValueError) as e:
+            raise AuthError(f"Unexpected sign-in response: {e!r}")
+
+    def refresh(self, refresh_token: str) -> Dict:
+        data = self.post(self.token_url, data={'grant_type': 'refresh_token', 'refresh_token': refresh_token})
+        try:
+            return {
+                'uid': data['user_id'],
+                'id_token': data['id_token'],
+                'refresh_token': data['refresh_token'],
+                'expires_at': time.time() + int(data.get('expires_in', 3600))
+            }
+        except (KeyError, TypeError, ValueError) as e:
+            raise AuthError(f"Unexpected refresh response: {e!r}")
+
+    def reset_password(self, email: str):
+        self.post(f"{self.auth_url}:sendOobCode", json={'requestType': 'PASSWORD_RESET', 'email': email})
+
+    def close(self):
+        if self.session is not None:
+            self.session.close()
+            self.session = None
+
+class TokenCache:
+    # The refresh token is a long-lived credential: the file is created
+    # owner-only and replaced atomically, so it is never world-readable or half-written
+    def __init__(self, path: str):
+        self.path = os.path.expanduser(path)
+
+    def load(self) -> Optional[Dict]:
+        try:
+            with open(self.path) as f:
+                session = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not all(key in session for key in ('uid', 'email', 'refresh_token')):
+            return None
+        return session
+
+    def save(self, session: Dict):
+        os.makedirs(os.path.dirname(self.path) or '.', mode=0o700, exist_ok=True)
+        temp = f"{self.path}.tmp"
+        fd = os.open(temp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(session, f)
+        os.replace(temp, self.path)
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
 class AuthService:
-    def __init__(self):
-        self.api_key = CONFIG['firebase_api_key']
-        self.auth_url = CONFIG['firebase_auth_url']
-        self.current_user: Optional[User] = None
+    def __init__(self, backend: Optional[FirebaseBackend] = None, token_cache: Optional[TokenCache] = None):
+        self.backend = backend or FirebaseBackend()
+        self.token_cache = token_cache
+        # refresh() runs on a worker thread while the GUI may log out; the
+        # session is only read or replaced under this lock
+        self.lock = threading.RLock()
+        self.session: Optional[Dict] = None
+        self.current_user = None
 
     def sign_up(self, email: str, password: str) -> Tuple[bool, str]:
-        url = f"{self.auth_url}:signUp?key={self.api_key}"
-        payload = {
-            'email': email,
-            'password': password,
-            'returnSecureToken': True
-        }
         try:
-            response = requests.post(url, json=payload, timeout=10)
-            data = response.json()
-            if response.status_code == 200:
-                return True, "Account created successfully!"
-            else:
-                error_msg = data.get('error', {}).get('message', 'Registration failed')
-                return False, error_msg
-        except Exception as e:
-            return False, f"Network error: {str(e)}"
+            self.backend.sign_up(email, password)
+            return True, "Account created successfully!"
+        except (AuthError, ConnectionError) as e:
+            return False, str(e)
 
     def sign_in(self, email: str, password: str) -> Tuple[bool, str]:
-        url = f"{self.auth_url}:signInWithPassword?key={self.api_key}"
-        payload = {
-            'email': email,
-            'password': password,
-            'returnSecureToken': True
-        }
         try:
-            response = requests.post(url, json=payload, timeout=10)
-            data = response.json()
-            if response.status_code == 200:
-                self.current_user = User(
-                    uid=data['localId'],
-                    email=data['email'],
-                    token=data['idToken']
-                )
-                return True, "Login successful!"
-            else:
-                error_msg = data.get('error', {}).get('message', 'Login failed')
-                return False, error_msg
-        except Exception as e:
-            return False, f"Network error: {str(e)}"
+            self.start_session(self.backend.sign_in(email, password))
+            return True, "Login successful!"
+        except (AuthError, ConnectionError) as e:
+            return False, str(e)
 
     def reset_password(self, email: str) -> Tuple[bool, str]:
-        url = f"{self.auth_url}:sendOobCode?key={self.api_key}"
-        payload = {
-            'requestType': 'PASSWORD_RESET',
-            'email': email
-        }
         try:
-            response = requests.post(url, json=payload, timeout=10)
-            if response.status_code == 200:
-                return True, "Password reset email sent!"
+            self.backend.reset_password(email)
+            return True, "Password reset email sent!"
+        except AuthError:
+            return False, "Failed to send reset email"
+        except ConnectionError as e:
+            return False, str(e)
+
+    def restore_session(self):
+        # Offline and instant: a cached session is trusted until refresh()
+        # says otherwise, so a returning user skips the login round trip
+        if self.token_cache is None:
+            return None
+        session = self.token_cache.load()
+        if session is None:
+            return None
+        self.start_session(session, save=False)
+        return self.current_user
+
+    def needs_refresh(self) -> bool:
+        session = self.session
+        return session is not None and session.get('expires_at', 0) - time.time() < REFRESH_MARGIN
+
+    def refresh(self) -> Tuple[bool, str]:
+        # Network failures keep the cached session; a rejected refresh token ends it.
+        # The request runs without the lock, so the result is dropped if a
+        # logout or another sign-in replaced the session meanwhile.
+        with self.lock:
+            session = self.session
+        if session is None:
+            return False, "Not signed in"
+        try:
+            refreshed = self.backend.refresh(session['refresh_token'])
+        except AuthError as e:
+            with self.lock:
+                if self.session is session:
+                    self.logout()
+            return False, str(e)
+        except ConnectionError as e:
+            return False, str(e)
+        with self.lock:
+            if self.session is not session:
+                return False, "Signed out during refresh"
+            self.start_session(dict(session, **refreshed))
+        return True, "Session refreshed"
+
+    def start_session(self, session: Dict, save: bool = True):
+        from data.models import User
+        with self.lock:
+            self.session = session
+            if self.current_user is not None and self.current_user.uid == session['uid']:
+                self.current_user.token = session.get('id_token', '')
             else:
-                return False, "Failed to send reset email"
-        except Exception as e:
-            return False, f"Network error: {str(e)}"
+                self.current_user = User(uid=session['uid'], email=session['email'], token=session.get('id_token', ''))
+            if save and self.token_cache is not None:
+                self.token_cache.save(session)
 
     def is_authenticated(self) -> bool:
         return self.current_user is not None
 
     def logout(self):
-        self.current_user = None
+        with self.lock:
+            self.current_user = None
+            self.session = None
+            if self.token_cache is not None:
+                self.token_cache.clear()
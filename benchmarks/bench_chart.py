@@ -0,0 +1,51 @@
+# Measures sustained chart frame rate for the full-redraw and blitting modes.
+# Run with: QT_QPA_PLATFORM=offscreen python -m benchmarks.bench_chart
+
+import argparse
+import os
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt5.QtWidgets import QApplication, QVBoxLayout, QWidget
+from ui.widgets import ChartWidget
+
+def run(app: QApplication, blit: bool, samples: int) -> float:
+    window = QWidget()
+    layout = QVBoxLayout()
+    charts = [ChartWidget(title, "#ff6b6b", blit=blit) for title in ("Glucose", "pH", "Oxygen")]
+    for chart in charts:
+        layout.addWidget(chart)
+    window.setLayout(layout)
+    window.resize(1000, 700)
+    window.show()
+    app.processEvents()
+
+    start_time = datetime.now()
+    started = time.perf_counter()
+    for i in range(samples):
+        timestamp = start_time + timedelta(seconds=i)
+        for chart in charts:
+            chart.add_data_point(timestamp, 90 + (i % 20))
+        app.processEvents()
+    elapsed = time.perf_counter() - started
+
+    window.close()
+    return samples / elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description="ChartWidget frame rate benchmark")
+    parser.add_argument('--samples', type=int, default=300)
+    args = parser.parse_args()
+
+    app = QApplication([])
+    full_fps = run(app, blit=False, samples=args.samples)
+    blit_fps = run(app, blit=True, samples=args.samples)
+
+    print(f"full redraw: {full_fps:8.1f} frames/s (3 charts)")
+    print(f"blitting:    {blit_fps:8.1f} frames/s (3 charts)")
+    print(f"speedup:     {blit_fps / full_fps:8.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+# Dashboard CPU and repaint count as the ingest rate rises. A feeder thread
+# emits one readings_received signal per sample, the worst case for the event
+# queue; CPU is for the whole process, feeder included.
+# Run with: QT_QPA_PLATFORM=offscreen python -m benchmarks.bench_dashboard [--fps 30]
+
+import argparse
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt5.QtCore import QThread, QTimer, pyqtSignal
+from PyQt5.QtWidgets import QApplication
+from data.database import DatabaseManager
+from data.models import BiometricReading
+from ui.dashboard import DashboardWidget
+
+class Feeder(QThread):
+    readings_received = pyqtSignal(list)
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+        self.stop_event = threading.Event()
+        self.sent = 0
+
+    def run(self):
+        start_time = datetime(2024, 1, 1)
+        started = time.monotonic()
+        while not self.stop_event.wait(0.005):
+            due = int((time.monotonic() - started) * self.rate)
+            while self.sent < due:
+                i = self.sent
+                self.readings_received.emit([BiometricReading(
+                    start_time + timedelta(seconds=i / self.rate), 90 + (i % 40), 7.0 + (i % 10) / 20, 95 + (i % 5))])
+                self.sent += 1
+
+def measure(app: QApplication, rate: float, duration: float, fps: float, db_manager: DatabaseManager) -> dict:
+    dashboard = DashboardWidget(db_manager)
+    dashboard.refresh_scheduler.interval_ms = int(1000 / fps) if fps else 0
+    dashboard.resize(1000, 700)
+    dashboard.show()
+    app.processEvents()
+
+    feeder = Feeder(rate)
+    feeder.readings_received.connect(dashboard.handle_new_batch)
+    frames_before = dashboard.refresh_scheduler.frames
+    cpu_started = time.process_time()
+    feeder.start()
+    QTimer.singleShot(int(duration * 1000), app.quit)
+    app.exec_()
+    feeder.stop_event.set()
+    feeder.wait()
+    cpu = time.process_time() - cpu_started
+    dashboard.close()
+
+    return {
+        'rate': rate,
+        'received': feeder.sent / (rate * duration),
+        'frames_per_s': (dashboard.refresh_scheduler.frames - frames_before) / duration,
+        'cpu_pct': cpu / duration * 100
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Dashboard refresh benchmark")
+    parser.add_argument('--rates', type=float, nargs='+', default=[1, 10, 100, 1000])
+    parser.add_argument('--duration', type=float, default=5.0)
+    parser.add_argument('--fps', type=float, default=30, help="frame cap, 0 to redraw on every event-loop pass")
+    args = parser.parse_args()
+
+    app = QApplication([])
+    db_manager = DatabaseManager(':memory:')
+    print(f"{'rate Hz':>8} {'received':>9} {'frames/s':>9} {'cpu %':>6}")
+    for rate in args.rates:
+        result = measure(app, rate, args.duration, args.fps, db_manager)
+        print(f"{result['rate']:8.0f} {result['received']:9.0%} {result['frames_per_s']:9.1f} {result['cpu_pct']:6.1f}",
+              flush=True)
+
+if __name__ == "__main__":
+    main()
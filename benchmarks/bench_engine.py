@@ -0,0 +1,90 @@
+# Many-band ingestion: the asyncio engine against one ESP32DataThread per band.
+# Stand-in bands run in a subprocess on consecutive ports; the client side is
+# measured for delivered samples, end-to-end latency and CPU.
+# Run with: python -m benchmarks.bench_engine [--devices 100] [--duration 20]
+
+import argparse
+import subprocess
+import sys
+import threading
+import time
+
+from PyQt5.QtCore import QCoreApplication, QTimer
+from data.models import to_epoch_ms
+from threads.band_engine import Device
+from threads.engine_bridge import EngineBridge
+from threads.esp_thread import ESP32DataThread
+
+def measure(app: QCoreApplication, mode: str, devices: int, rate: float, duration: float, base_port: int) -> dict:
+    bands = subprocess.Popen(
+        [sys.executable, '-m', 'tools.standin_band', '--port', str(base_port), '--count', str(devices),
+         '--rate', str(rate)],
+        stdout=subprocess.PIPE
+    )
+    bands.stdout.readline()
+    addresses = [f"127.0.0.1:{base_port + i}" for i in range(devices)]
+
+    latencies = []
+    signals = [0]
+
+    def on_readings(readings):
+        now = time.time() * 1000
+        signals[0] += 1
+        latencies.extend(now - to_epoch_ms(reading.timestamp) for reading in readings)
+
+    if mode == 'threads':
+        workers = [ESP32DataThread(address, interval=1 / rate) for address in addresses]
+        for worker in workers:
+            worker.data_received.connect(lambda reading: on_readings([reading]))
+        start, stop = lambda: [w.start() for w in workers], lambda: [(w.stop(), w.wait()) for w in workers]
+    else:
+        transport = 'poll' if mode == 'engine' else mode.split('-')[1]
+        bridge = EngineBridge([Device(f"band-{i}", address, transport=transport, interval=1 / rate)
+                               for i, address in enumerate(addresses)])
+        bridge.readings_received.connect(lambda batch: on_readings([reading for _, reading in batch]))
+        start, stop = bridge.start, bridge.stop
+
+    cpu_started = time.process_time()
+    start()
+    # QThreads are not visible to threading.active_count()
+    threads = threading.active_count() + (devices if mode == 'threads' else 0)
+    QTimer.singleShot(int(duration * 1000), app.quit)
+    app.exec_()
+    stop()
+    cpu = time.process_time() - cpu_started
+
+    bands.terminate()
+    bands.wait()
+
+    latencies.sort()
+    count = len(latencies)
+    return {
+        'mode': mode,
+        'devices': devices,
+        'delivered': count / (devices * rate * duration),
+        'signals_per_s': signals[0] / duration,
+        'p50_ms': latencies[count // 2] if count else float('nan'),
+        'p95_ms': latencies[int(count * 0.95)] if count else float('nan'),
+        'cpu_pct': cpu / duration * 100,
+        'threads': threads
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-band ingestion benchmark")
+    parser.add_argument('--devices', type=int, nargs='+', default=[10, 100])
+    parser.add_argument('--rate', type=float, default=1.0)
+    parser.add_argument('--duration', type=float, default=20.0)
+    parser.add_argument('--modes', nargs='+', default=['engine', 'engine-chunked', 'threads'])
+    parser.add_argument('--base-port', type=int, default=18000)
+    args = parser.parse_args()
+
+    app = QCoreApplication([])
+    print(f"{'mode':15} {'devices':>7} {'delivered':>10} {'signals/s':>10} {'p50 ms':>8} {'p95 ms':>8} {'cpu %':>6} {'threads':>7}")
+    for devices in args.devices:
+        for mode in args.modes:
+            r = measure(app, mode, devices, args.rate, args.duration, args.base_port)
+            print(f"{r['mode']:15} {r['devices']:7} {r['delivered']:10.0%} {r['signals_per_s']:10.1f} "
+                  f"{r['p50_ms']:8.1f} {r['p95_ms']:8.1f} {r['cpu_pct']:6.1f} {r['threads']:7}", flush=True)
+
+if __name__ == "__main__":
+    main()
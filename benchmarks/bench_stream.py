@@ -0,0 +1,82 @@
+# Compares end-to-end latency, delivered samples and client CPU of the polling
+# thread against the push transports, using a stand-in band in a subprocess.
+# Run with: python -m benchmarks.bench_stream [--duration 10] [--rates 1 10 50]
+
+import argparse
+import socket
+import subprocess
+import sys
+import time
+
+from PyQt5.QtCore import QCoreApplication, QTimer
+from data.models import to_epoch_ms
+from threads.esp_thread import ESP32DataThread
+from threads.stream_thread import ESP32StreamThread
+
+def free_port(kind=socket.SOCK_STREAM) -> int:
+    with socket.socket(socket.AF_INET, kind) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def measure(app: QCoreApplication, mode: str, rate: float, duration: float) -> dict:
+    http_port, udp_port = free_port(), free_port(socket.SOCK_DGRAM)
+    band = subprocess.Popen(
+        [sys.executable, '-m', 'tools.standin_band', '--port', str(http_port), '--rate', str(rate),
+         '--udp', f"127.0.0.1:{udp_port}"],
+        stdout=subprocess.PIPE
+    )
+    band.stdout.readline()
+    address = f"127.0.0.1:{http_port}"
+
+    latencies = []
+
+    def on_readings(readings):
+        now = time.time() * 1000
+        latencies.extend(now - to_epoch_ms(reading.timestamp) for reading in readings)
+
+    if mode == 'poll':
+        thread = ESP32DataThread(address, interval=1 / rate)
+        thread.data_received.connect(lambda reading: on_readings([reading]))
+    else:
+        thread = ESP32StreamThread(address, transport=mode, udp_port=udp_port)
+        thread.readings_received.connect(on_readings)
+
+    cpu_started = time.process_time()
+    thread.start()
+    QTimer.singleShot(int(duration * 1000), app.quit)
+    app.exec_()
+    thread.stop()
+    thread.wait()
+    cpu = time.process_time() - cpu_started
+
+    band.terminate()
+    band.wait()
+
+    latencies.sort()
+    count = len(latencies)
+    return {
+        'mode': mode,
+        'rate': rate,
+        'delivered': count / (rate * duration),
+        'p50_ms': latencies[count // 2] if count else float('nan'),
+        'p95_ms': latencies[int(count * 0.95)] if count else float('nan'),
+        'cpu_pct': cpu / duration * 100
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Polling vs streaming ingestion benchmark")
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--rates', type=float, nargs='+', default=[1, 10, 50])
+    parser.add_argument('--modes', nargs='+', default=['poll', 'sse', 'chunked', 'udp'])
+    args = parser.parse_args()
+
+    app = QCoreApplication([])
+    print(f"{'mode':8} {'rate':>6} {'delivered':>10} {'p50 ms':>8} {'p95 ms':>8} {'cpu %':>6}")
+    for rate in args.rates:
+        for mode in args.modes:
+            result = measure(app, mode, rate, args.duration)
+            print(f"{result['mode']:8} {result['rate']:6.0f} {result['delivered']:10.0%} "
+                  f"{result['p50_ms']:8.1f} {result['p95_ms']:8.1f} {result['cpu_pct']:6.1f}")
+
+if __name__ == "__main__":
+    main()
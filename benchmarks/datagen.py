@@ -0,0 +1,79 @@
+# Deterministic synthetic readings for the benchmarks. The same seed, rate and
+# start always produce the same samples, so numbers from two commits compare.
+
+import threading
+import time
+from typing import Iterator, List, Optional
+import numpy as np
+from PyQt5.QtCore import QThread, pyqtSignal
+from data.models import BiometricReading, ReadingBatch
+
+START_MS = 1704067200000  # 2024-01-01T00:00:00Z
+
+def user_ids(users: int) -> List[str]:
+    return [f"bench-user-{i}" for i in range(users)]
+
+def generate(count: int, rate: float = 1.0, start_ms: int = START_MS, seed: int = 0, offset: int = 0) -> ReadingBatch:
+    # Samples offset .. offset + count of one band: a daily glucose and pH
+    # cycle plus noise, crossing the alert limits now and then
+    rng = np.random.default_rng([seed, offset])
+    index = np.arange(offset, offset + count)
+    seconds = index / rate
+    return ReadingBatch(
+        start_ms + (seconds * 1000).astype(np.int64),
+        100 + 30 * np.sin(2 * np.pi * seconds / 86400) + rng.normal(0, 6, count),
+        7.1 + 0.25 * np.sin(2 * np.pi * seconds / 43200) + rng.normal(0, 0.05, count),
+        np.clip(96 + rng.normal(0, 1.5, count), 80, 100)
+    )
+
+def rows(users: int, count: int, rate: float = 1.0, seed: int = 0, chunk_size: int = 100000) -> Iterator[List[tuple]]:
+    # (user_id, epoch ms, glucose, ph, oxygen) chunks, count samples per user
+    for user_index, user_id in enumerate(user_ids(users)):
+        for offset in range(0, count, chunk_size):
+            batch = generate(min(chunk_size, count - offset), rate, seed=seed * 1000 + user_index, offset=offset)
+            yield list(zip([user_id] * len(batch), batch.timestamps.tolist(), batch.glucose.tolist(),
+                           batch.ph.tolist(), batch.oxygen.tolist()))
+
+def populate(db_manager, users: int, count: int, rate: float = 1.0, seed: int = 0) -> int:
+    written = 0
+    conn = db_manager.connect()
+    for chunk in rows(users, count, rate, seed):
+        with conn:
+            db_manager.insert_rows(conn.cursor(), chunk)
+        written += len(chunk)
+    conn.close()
+    return written
+
+class SyntheticDataThread(QThread):
+    # FakeDataThread's signals, fed from generate(): paced at the sample rate,
+    # or as fast as the receiver keeps up with realtime=False
+    data_received = pyqtSignal(BiometricReading)
+    readings_received = pyqtSignal(list)
+    connection_status = pyqtSignal(bool)
+
+    def __init__(self, rate: float = 1.0, count: Optional[int] = None, seed: int = 0, realtime: bool = True):
+        super().__init__()
+        self.rate = rate
+        self.count = count
+        self.seed = seed
+        self.realtime = realtime
+        self.sent = 0
+        self.stop_event = threading.Event()
+
+    def run(self):
+        self.connection_status.emit(False)
+        started = time.monotonic()
+        while not self.stop_event.is_set() and (self.count is None or self.sent < self.count):
+            batch = generate(1000 if self.count is None else min(1000, self.count - self.sent),
+                             self.rate, seed=self.seed, offset=self.sent)
+            for reading in batch:
+                if self.realtime:
+                    delay = started + self.sent / self.rate - time.monotonic()
+                    if delay > 0 and self.stop_event.wait(delay):
+                        return
+                self.data_received.emit(reading)
+                self.readings_received.emit([reading])
+                self.sent += 1
+
+    def stop(self):
+        self.stop_event.set()
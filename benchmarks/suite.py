@@ -0,0 +1,257 @@
+# Hot-path benchmarks for ingest, queries, the History tab, live chart redraws
+# and CSV export, written to a JSON file that later runs compare against.
+# Run with:
+#   python -m benchmarks.suite --output baseline.json [--quick]
+#   python -m benchmarks.suite --compare baseline.json [--output current.json]
+#   python -m benchmarks.suite --results current.json --compare baseline.json
+# Generated databases are kept in --data-dir, so only the first run pays for
+# building the 10M-row one. Comparing exits with status 1 on a regression.
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt5.QtCore import QDate, QEventLoop
+from PyQt5.QtWidgets import QApplication
+from benchmarks import datagen
+from data.database import DatabaseManager
+from data.models import User, to_datetime
+from ui.history import HistoryWidget
+from ui.widgets import ChartWidget
+
+SUITES = ('ingest', 'query', 'history', 'render', 'export')
+USER = datagen.user_ids(1)[0]
+
+def metric(value: float, unit: str, better: str = 'lower') -> Dict:
+    return {'value': value, 'unit': unit, 'better': better}
+
+def best_of(function: Callable[[], object], repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+def dataset(data_dir: str, rows: int, seed: int) -> DatabaseManager:
+    # One band at 1 Hz, so the rows span rows seconds of history
+    path = os.path.join(data_dir, f"readings_{rows}_{seed}.db")
+    if not os.path.exists(path):
+        started = time.perf_counter()
+        db_manager = DatabaseManager(f"{path}.partial")
+        datagen.populate(db_manager, users=1, count=rows, seed=seed)
+        conn = db_manager.connect()
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        conn.close()
+        os.replace(f"{path}.partial", path)
+        print(f"  generated {rows} rows in {time.perf_counter() - started:.1f} s", file=sys.stderr)
+    return DatabaseManager(path)
+
+def data_end(rows: int) -> datetime:
+    return to_datetime(datagen.START_MS + (rows - 1) * 1000)
+
+def bench_ingest(args, app: QApplication) -> Dict:
+    results = {}
+    workdir = tempfile.mkdtemp(prefix='biotrack-ingest-')
+    readings = datagen.generate(args.ingest_rows, seed=args.seed).readings()
+
+    # One transaction per reading, as the original dashboard wrote them
+    db_manager = DatabaseManager(os.path.join(workdir, 'save.db'))
+    started = time.perf_counter()
+    for reading in readings:
+        db_manager.save_reading(USER, reading)
+    results['ingest.save_reading'] = metric(len(readings) / (time.perf_counter() - started), 'rows/s', 'higher')
+
+    db_manager = DatabaseManager(os.path.join(workdir, 'queue.db'))
+    started = time.perf_counter()
+    db_manager.queue_readings(USER, readings)
+    db_manager.flush()
+    results['ingest.queue_reading'] = metric(len(readings) / (time.perf_counter() - started), 'rows/s', 'higher')
+    db_manager.close()
+
+    # The live path end to end: a source thread's signals into the writer queue
+    db_manager = DatabaseManager(os.path.join(workdir, 'signal.db'))
+    source = datagen.SyntheticDataThread(count=args.ingest_rows * 10, seed=args.seed, realtime=False)
+    source.readings_received.connect(lambda batch: db_manager.queue_readings(USER, batch))
+    loop = QEventLoop()
+    source.finished.connect(loop.quit)
+    started = time.perf_counter()
+    source.start()
+    loop.exec_()
+    app.processEvents()
+    db_manager.flush()
+    results['ingest.signal_to_disk'] = metric(source.sent / (time.perf_counter() - started), 'rows/s', 'higher')
+    db_manager.close()
+
+    shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+def bench_query(args, app: QApplication) -> Dict:
+    results = {}
+    for rows in args.sizes:
+        db_manager = dataset(args.data_dir, rows, args.seed)
+        end = data_end(rows)
+        results[f"query.get_readings_1h@{rows}"] = metric(
+            best_of(lambda: db_manager.get_readings(USER, end - timedelta(hours=1), end), args.repeat) * 1000, 'ms')
+        results[f"query.newest_page@{rows}"] = metric(
+            best_of(lambda: db_manager.get_rows_page(USER, limit=500), args.repeat) * 1000, 'ms')
+        results[f"query.aggregates_hourly@{rows}"] = metric(
+            best_of(lambda: db_manager.get_aggregates(USER, resolution=3600), args.repeat) * 1000, 'ms')
+    return results
+
+def bench_history(args, app: QApplication) -> Dict:
+    # The tab's default range: the last seven days, table, chart and
+    # statistics, until the load thread has delivered and finished
+    results = {}
+    for rows in args.sizes:
+        db_manager = dataset(args.data_dir, rows, args.seed)
+        end = data_end(rows).date()
+        widget = HistoryWidget(db_manager)
+        widget.resize(1000, 700)
+        widget.show()
+        widget.current_user = User(USER, 'bench@localhost', '')
+        widget.start_date.setDate(QDate(end.year, end.month, end.day).addDays(-7))
+        widget.end_date.setDate(QDate(end.year, end.month, end.day))
+
+        def load():
+            widget.history_model.user_id = None  # a fresh query every time, not the refresh path
+            widget.load_history()
+            widget.load_thread.wait()
+            app.processEvents()  # the queued loaded signal: chart and statistics drawn
+
+        results[f"history.load_history@{rows}"] = metric(best_of(load, args.repeat) * 1000, 'ms')
+        widget.close()
+    return results
+
+def bench_render(args, app: QApplication) -> Dict:
+    # Cost of one redraw as samples arrive, after the chart has filled
+    results = {}
+    for blit in (True, False):
+        chart = ChartWidget("Glucose", "#ff6b6b", capacity=args.chart_points, blit=blit)
+        chart.resize(1000, 300)
+        chart.show()
+        batch = datagen.generate(args.chart_points + args.frames, seed=args.seed)
+        timestamps = batch.datetimes().astype(datetime)
+        chart.add_data_points(timestamps[:args.chart_points], batch.glucose[:args.chart_points])
+        app.processEvents()
+
+        started = time.perf_counter()
+        for i in range(args.chart_points, args.chart_points + args.frames):
+            chart.add_data_point(timestamps[i], float(batch.glucose[i]))
+            app.processEvents()
+        name = 'blit' if blit else 'full'
+        results[f"render.add_data_point_{name}"] = metric((time.perf_counter() - started) / args.frames * 1000, 'ms/frame')
+        chart.close()
+    return results
+
+def bench_export(args, app: QApplication) -> Dict:
+    db_manager = dataset(args.data_dir, args.export_rows, args.seed)
+    workdir = tempfile.mkdtemp(prefix='biotrack-export-')
+    filename = os.path.join(workdir, 'export.csv')
+
+    started = time.perf_counter()
+    written = db_manager.export_to_csv(USER, filename)
+    elapsed = time.perf_counter() - started
+
+    # Separate run: tracemalloc slows allocation-heavy code down several times
+    tracemalloc.start()
+    db_manager.export_to_csv(USER, filename)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    shutil.rmtree(workdir, ignore_errors=True)
+    return {
+        f"export.csv_time@{written}": metric(elapsed, 's'),
+        f"export.csv_peak_memory@{written}": metric(peak / 1e6, 'MB'),
+    }
+
+def compare(baseline: Dict, current: Dict, tolerance: float) -> List[str]:
+    regressions = []
+    print(f"{'benchmark':42} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name in sorted(set(baseline['results']) | set(current['results'])):
+        old, new = baseline['results'].get(name), current['results'].get(name)
+        if old is None or new is None:
+            print(f"{name:42} {'-' if old is None else format(old['value'], '12.3f'):>12} "
+                  f"{'-' if new is None else format(new['value'], '12.3f'):>12} {'':>8}  {'new' if old is None else 'missing'}")
+            continue
+        change = (new['value'] - old['value']) / old['value'] if old['value'] else 0.0
+        worse = change if new['better'] == 'lower' else -change
+        status = 'REGRESSION' if worse > tolerance else 'improved' if worse < -tolerance else 'ok'
+        if status == 'REGRESSION':
+            regressions.append(name)
+        print(f"{name:42} {old['value']:12.3f} {new['value']:12.3f} {change:+8.1%}  {status} {new['unit']}")
+    return regressions
+
+def run(args) -> Dict:
+    app = QApplication.instance() or QApplication([])
+    results = {}
+    for name in args.only:
+        print(f"running {name}...", file=sys.stderr, flush=True)
+        results.update(globals()[f"bench_{name}"](args, app))
+    return {
+        'meta': {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'args': {key: value for key, value in vars(args).items() if key not in ('output', 'compare', 'results')},
+        },
+        'results': results,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="BioTrack benchmark suite")
+    parser.add_argument('--only', nargs='+', choices=SUITES, default=list(SUITES))
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 1_000_000, 10_000_000],
+                        help="database sizes (rows) for the query and history benchmarks")
+    parser.add_argument('--quick', action='store_true', help="10k and 100k rows only, for a fast check")
+    parser.add_argument('--ingest-rows', type=int, default=2000)
+    parser.add_argument('--export-rows', type=int, default=1_000_000)
+    parser.add_argument('--chart-points', type=int, default=10000)
+    parser.add_argument('--frames', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'biotrack-bench'))
+    parser.add_argument('--output', help="write results to this JSON file")
+    parser.add_argument('--compare', help="baseline JSON to compare against")
+    parser.add_argument('--results', help="compare this results file instead of running")
+    parser.add_argument('--tolerance', type=float, default=0.15, help="allowed slowdown before flagging, 0.15 = 15%%")
+    args = parser.parse_args()
+    if args.quick:
+        args.sizes = [10_000, 100_000]
+        args.export_rows = 100_000
+    os.makedirs(args.data_dir, exist_ok=True)
+
+    if args.results:
+        with open(args.results) as f:
+            current = json.load(f)
+    else:
+        current = run(args)
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(current, f, indent=2)
+        if not args.compare:
+            for name, result in current['results'].items():
+                print(f"{name:42} {result['value']:12.3f} {result['unit']}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, current, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regression(s) beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
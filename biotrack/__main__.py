@@ -0,0 +1,93 @@
+# Command-line entry points that need neither Qt nor a display. Run with:
+#   python -m biotrack ingest --band <user_id>=<address> [--band ...] [--fake <user_id>]
+#                             [--transport poll|sse|chunked|udp] [--db PATH]
+#   python -m biotrack import <file.csv[.gz]> --user <user_id> [--replace] [--db PATH]
+
+import argparse
+import signal
+import sys
+from typing import List, Tuple
+from config import CONFIG
+
+def parse_band(value: str) -> Tuple[str, str]:
+    user_id, separator, address = value.partition('=')
+    if not separator or not user_id or not address:
+        raise argparse.ArgumentTypeError(f"expected <user_id>=<address>, got {value!r}")
+    return user_id, address
+
+def ingest(args):
+    from biotrack.ingest import IngestDaemon, read_status
+    from data.database import DatabaseManager
+
+    running = read_status(args.status_file, CONFIG['ingest_status_interval'] * 3)
+    if running is not None:
+        sys.exit(f"An ingest daemon is already running (pid {running['pid']} on {running['host']})")
+
+    db_manager = DatabaseManager(args.db, batch_size=CONFIG['db_batch_size'],
+                                 flush_interval=CONFIG['db_flush_interval'] / 1000, archive_dir=args.archive_dir)
+    daemon = IngestDaemon(db_manager, args.status_file, CONFIG['ingest_status_interval'], args.retention_days)
+    bands: List[Tuple[str, str]] = args.band + [(user_id, None) for user_id in args.fake]
+    for user_id, address in bands:
+        daemon.add_band(user_id, address, args.transport, interval=args.interval, timeout=CONFIG['esp32_timeout'],
+                        max_backoff=CONFIG['esp32_max_backoff'], catch_up_limit=CONFIG['esp32_catch_up_limit'],
+                        udp_port=CONFIG['esp32_udp_port'])
+
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: daemon.stop())
+    daemon.run()
+
+def import_csv(args):
+    import sqlite3
+    from data.database import DatabaseManager
+
+    db_manager = DatabaseManager(args.db, archive_dir=args.archive_dir)
+    try:
+        report = db_manager.import_from_csv(args.user, args.file, 'replace' if args.replace else 'skip')
+    except (OSError, ValueError, sqlite3.Error) as e:
+        sys.exit(f"Import failed: {e}")
+    finally:
+        db_manager.close()
+    print(f"{report['written']} of {report['rows']} readings imported, "
+          f"{report['skipped']} already stored, {report['invalid']} unreadable rows")
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m biotrack', description="BioTrack headless tools")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    command = commands.add_parser('ingest', help="record readings from bands into the database until stopped")
+    command.add_argument('--band', type=parse_band, action='append', default=[], metavar='USER_ID=ADDRESS',
+                         help="a band and the user its readings belong to; repeat for more bands")
+    command.add_argument('--fake', action='append', default=[], metavar='USER_ID',
+                         help="simulated readings for this user")
+    command.add_argument('--transport', choices=('poll', 'sse', 'chunked', 'udp'), default=CONFIG['esp32_transport'])
+    command.add_argument('--interval', type=float, default=CONFIG['data_refresh_interval'] / 1000,
+                         help="seconds between polls (and between simulated readings)")
+    command.add_argument('--db', default=CONFIG['db_name'])
+    command.add_argument('--archive-dir', default=CONFIG['archive_dir'])
+    command.add_argument('--status-file', default=CONFIG['ingest_status_file'])
+    command.add_argument('--retention-days', type=float, default=CONFIG['retention_days'],
+                         help="archive older readings once a day; 0 turns it off")
+    command.set_defaults(run=ingest)
+
+    command = commands.add_parser('import', help="load a readings CSV (an export) into the database")
+    command.add_argument('file', help="CSV with timestamp, glucose, ph and oxygen columns, optionally gzipped")
+    command.add_argument('--user', required=True, metavar='USER_ID', help="the user the readings belong to")
+    command.add_argument('--replace', action='store_true',
+                         help="overwrite readings already stored for the same times instead of keeping them")
+    command.add_argument('--db', default=CONFIG['db_name'])
+    command.add_argument('--archive-dir', default=CONFIG['archive_dir'])
+    command.set_defaults(run=import_csv)
+
+    args = parser.parse_args()
+    if args.command == 'ingest' and not args.band and not args.fake:
+        parser.error("ingest needs at least one --band or --fake")
+    if args.command == 'ingest':
+        # Status, alerts and the dashboard all follow one band per user
+        users = [user_id for user_id, _ in args.band] + args.fake
+        duplicates = sorted({user_id for user_id in users if users.count(user_id) > 1})
+        if duplicates:
+            parser.error(f"one band per user; given more than once: {', '.join(duplicates)}")
+    args.run(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+import functools
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+from typing import Dict, List, Optional
+from data.alerts import AlertEvaluator
+from data.database import DatabaseManager
+from data.models import BiometricReading, ReadingBatch, to_epoch_ms
+from data.shared_ring import SharedReadingRing
+from threads.band_engine import Batch, BandEngine, Device
+from threads.sources import FakeSource, StreamSource
+
+# Headless poll -> parse -> persist: HTTP bands (poll, SSE, chunked) all on
+# one BandEngine loop, UDP and simulated ones on their own threads, writing
+# through DatabaseManager exactly as the dashboard does, alert episodes
+# included. A desktop app started while this runs attaches to the
+# database read-only instead of ingesting itself (CONFIG['ingest_mode']).
+# With ingest_mode 'process' the app runs one itself, in a child process
+# that also publishes readings to it through a SharedReadingRing.
+
+def read_status(path: str, max_age: float) -> Optional[Dict]:
+    # The running daemon's status, or None when there is none or it stopped
+    # updating (crashed or killed) more than max_age seconds ago
+    try:
+        with open(path) as f:
+            status = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if time.time() - status.get('updated', 0) > max_age:
+        return None
+    return status
+
+class Band:
+    def __init__(self, user_id: str, address: Optional[str], transport: str, ring: Optional[SharedReadingRing] = None):
+        self.user_id = user_id
+        self.address = address
+        self.transport = transport
+        self.ring = ring
+        self.source = None  # a thread source, or None when the engine serves the band
+        self.thread: Optional[threading.Thread] = None
+        self.connected: Optional[bool] = None
+        self.readings = 0
+        self.last_ts: Optional[int] = None
+
+    def status(self) -> Dict:
+        return {
+            'address': self.address,
+            'transport': self.transport,
+            'connected': self.connected,
+            'readings': self.readings,
+            'last_ts': self.last_ts,
+        }
+
+class IngestDaemon:
+    def __init__(self, db_manager: DatabaseManager, status_file: str, status_interval: float = 5.0,
+                 retention_days: float = 0, retention_every: float = 24 * 3600):
+        self.db_manager = db_manager
+        self.status_file = status_file
+        self.status_interval = status_interval
+        self.retention_days = retention_days
+        self.retention_every = retention_every
+        self.bands: List[Band] = []
+        self.engine = BandEngine(self.deliver, on_status=self.engine_status)
+        self.engine_bands: Dict[str, Band] = {}
+        self.evaluators: Dict[str, AlertEvaluator] = {}
+        self.settings: Dict[str, Optional[Dict]] = {}
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.started = time.time()
+        self.retention_thread: Optional[threading.Thread] = None
+        self.last_retention: Optional[float] = None
+
+    def add_band(self, user_id: str, address: Optional[str], transport: str = 'poll', interval: float = 5.0,
+                 timeout: float = 3.0, max_backoff: float = 60.0, catch_up_limit: int = 500, udp_port: int = 5005,
+                 ring: Optional[SharedReadingRing] = None):
+        # address None is simulated data, as the dashboard falls back to.
+        # One band per user: the status file, alert evaluators and engine
+        # devices are all keyed by user.
+        if any(band.user_id == user_id for band in self.bands):
+            raise ValueError(f"{user_id} already has a band")
+        band = Band(user_id, address, transport if address else 'fake', ring)
+        on_readings = functools.partial(self.record, band)
+        on_status = functools.partial(self.set_connected, band)
+        if address is None:
+            band.source = FakeSource(on_readings, on_status, interval)
+        elif transport == 'udp':
+            band.source = StreamSource(address, on_readings, on_status, transport=transport, udp_port=udp_port,
+                                       max_backoff=max_backoff)
+        else:
+            since = self.db_manager.latest_timestamp(user_id) if transport == 'poll' else None
+            self.engine.add_device(Device(user_id, address, transport=transport, interval=interval, timeout=timeout,
+                                          max_backoff=max_backoff, since=since, catch_up_limit=catch_up_limit))
+            self.engine_bands[user_id] = band
+        self.bands.append(band)
+        self.reload_thresholds(user_id)
+
+    def record(self, band: Band, readings: List[BiometricReading]):
+        # Runs on the band's thread
+        self.db_manager.queue_readings(band.user_id, readings)
+        band.readings += len(readings)
+        band.last_ts = to_epoch_ms(readings[-1].timestamp)
+        batch = ReadingBatch.from_readings(readings)
+        if band.ring is not None:
+            band.ring.write(batch)
+        with self.lock:
+            episodes = self.evaluators[band.user_id].feed(batch)
+        if episodes:
+            self.db_manager.queue_alert_events(band.user_id, episodes)
+
+    def deliver(self, batch: Batch):
+        # Runs on the engine's loop thread; one record() per band and flush
+        readings: Dict[str, List[BiometricReading]] = {}
+        for user_id, reading in batch:
+            readings.setdefault(user_id, []).append(reading)
+        for user_id, band_readings in readings.items():
+            self.record(self.engine_bands[user_id], band_readings)
+
+    def engine_status(self, device: Device, connected: bool):
+        self.set_connected(self.engine_bands[device.user_id], connected)
+
+    def set_connected(self, band: Band, connected: bool):
+        if connected != band.connected:
+            print(f"{band.user_id} ({band.address or 'simulated'}): {'connected' if connected else 'disconnected'}", flush=True)
+        band.connected = connected
+        if band.ring is not None:
+            band.ring.set_connected(connected)
+
+    def reload_thresholds(self, user_id: str):
+        # Thresholds changed in user_settings reach a running daemon within a status interval
+        settings = self.db_manager.get_user_settings(user_id)
+        if user_id in self.evaluators and settings == self.settings.get(user_id):
+            return
+        with self.lock:
+            self.settings[user_id] = settings
+            self.evaluators[user_id] = AlertEvaluator(self.db_manager.get_thresholds(user_id))
+
+    def status(self) -> Dict:
+        return {
+            'pid': os.getpid(),
+            'host': socket.gethostname(),
+            'db': os.path.abspath(self.db_manager.db_name),
+            'started': self.started,
+            'updated': time.time(),
+            'bands': {band.user_id: band.status() for band in self.bands},
+            'writer': self.db_manager.writer_stats(),
+        }
+
+    def write_status(self):
+        partial = f"{self.status_file}.partial"
+        with open(partial, 'w') as f:
+            json.dump(self.status(), f, indent=2)
+        os.replace(partial, self.status_file)
+
+    def apply_retention(self):
+        started = time.monotonic()
+        report = self.db_manager.apply_retention(self.retention_days)
+        if report['rows']:
+            print(f"Archived {report['rows']} readings in {time.monotonic() - started:.1f} s", flush=True)
+
+    def maybe_apply_retention(self):
+        if not self.retention_days:
+            return
+        if self.last_retention is not None and time.monotonic() - self.last_retention < self.retention_every:
+            return
+        if self.retention_thread is not None and self.retention_thread.is_alive():
+            return
+        self.last_retention = time.monotonic()
+        self.retention_thread = threading.Thread(target=self.apply_retention, name="Retention", daemon=True)
+        self.retention_thread.start()
+
+    def run(self):
+        # Blocks until stop(); call from the main thread so signals can end it
+        for band in self.bands:
+            if band.source is not None:
+                band.thread = threading.Thread(target=band.source.run, name=f"Band {band.user_id}", daemon=True)
+                band.thread.start()
+        if self.engine_bands:
+            self.engine.start()
+        print(f"Ingesting {len(self.bands)} band(s) into {self.db_manager.db_name}", flush=True)
+        try:
+            while True:
+                self.maybe_apply_retention()
+                for user_id in {band.user_id for band in self.bands}:
+                    self.reload_thresholds(user_id)
+                try:
+                    self.write_status()
+                except OSError as e:
+                    print(f"Could not write {self.status_file}: {e}", flush=True)
+                if self.stop_event.wait(self.status_interval):
+                    break
+        finally:
+            self.engine.stop(5)
+            threaded = [band for band in self.bands if band.source is not None]
+            for band in threaded:
+                band.source.stop()
+            for band in threaded:
+                band.thread.join(5)
+            self.db_manager.close()
+            try:
+                os.remove(self.status_file)
+            except OSError:
+                pass
+            print("Ingest stopped", flush=True)
+
+    def stop(self):
+        self.stop_event.set()
+
+def run_process(ring_name: str, user_id: str, address: Optional[str], band_options: Dict, db_options: Dict,
+                status_file: str, status_interval: float, retention_days: float, stop_event):
+    # Target of the ingest process the desktop app starts (threads/ingest_process.py).
+    # Ends on stop_event, SIGTERM, or when the app's process is gone.
+    ring = SharedReadingRing.attach(ring_name)
+    daemon = IngestDaemon(DatabaseManager(**db_options), status_file, status_interval, retention_days)
+    daemon.add_band(user_id, address, ring=ring, **band_options)
+
+    def watch_parent():
+        parent = multiprocessing.parent_process()
+        while not stop_event.wait(1.0):
+            if parent is not None and not parent.is_alive():
+                break
+        daemon.stop()
+
+    threading.Thread(target=watch_parent, name="Parent watch", daemon=True).start()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: daemon.stop())
+    try:
+        daemon.run()
+    finally:
+        ring.close()
@@ -6,7 +6,28 @@ CONFIG = {
     'firebase_api_key': 'API_KEYİNİ_BURAYA_YAZ',
     'firebase_auth_url': 'https://identitytoolkit.googleapis.com/v1/accounts',
     'esp32_default_ip': '192.168.4.1',
+    'esp32_transport': 'poll',  # poll, sse, chunked or udp
+    'esp32_udp_port': 5005,
+    'esp32_timeout': 3,  # seconds
+    'esp32_catch_up_limit': 500,  # samples per /data?since= page
+    'esp32_max_backoff': 60,  # seconds
     'data_refresh_interval': 5000,  # milliseconds
+    'ui_max_fps': 30,  # dashboard repaints per second, however fast readings arrive
+    'diagnostics_enabled': False,  # record pipeline timings from startup
+    'chart_window_seconds': 24 * 3600,
+    'chart_capacity': 100000,  # samples kept per live chart
     'db_name': 'db/biotrack_data.db',
-    'settings_file': 'biotrack_settings.ini'
+    'db_batch_size': 200,  # readings per write transaction
+    'db_flush_interval': 1000,  # milliseconds
+    'retention_days': 90,  # older readings move to monthly archive files
+    'archive_dir': 'db/archive',
+    'query_cache_mb': 64,  # read results kept for History and the charts; 0 turns the cache off
+    'ingest_mode': 'auto',  # local, attach (read-only, to `python -m biotrack ingest`), or auto: attach while it runs;
+                            # process runs the ingest daemon in a child process of the app
+    'ingest_ring_capacity': 65536,  # readings the process mode's shared-memory ring holds for the dashboard
+    'ingest_status_file': 'db/ingest_status.json',
+    'ingest_status_interval': 5,  # seconds between the daemon's status updates
+    'attach_poll_interval': 1000,  # milliseconds between an attached dashboard's reads
+    'settings_file': 'biotrack_settings.ini',
+    'session_file': '~/.biotrack/session.json'  # cached refresh token, owner-only
 }
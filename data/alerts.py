@@ -0,0 +1,169 @@
+from typing import Dict, List, Mapping, Optional, Tuple
+import numpy as np
+from data.models import ReadingBatch
+
+METRICS = ('glucose', 'ph', 'oxygen')
+STATUSES = ('normal', 'warning', 'critical')
+
+# metric: severity: (low, high); None means that side is not checked
+DEFAULT_LIMITS = {
+    'glucose': {'critical': (70.0, 140.0), 'warning': (80.0, 120.0)},
+    'ph': {'critical': (6.5, 7.5), 'warning': (7.0, 7.4)},
+    'oxygen': {'critical': (90.0, None), 'warning': (95.0, None)},
+}
+# An episode only ends once the value is back inside the limit by this margin,
+# so a reading hovering on the line does not open and close one per sample
+DEFAULT_HYSTERESIS = {'glucose': 2.0, 'ph': 0.05, 'oxygen': 1.0}
+# Episodes shorter than this are treated as noise and never recorded
+DEFAULT_MIN_DURATION = {'critical': 0, 'warning': 60 * 1000}
+
+class Bound:
+    __slots__ = ('metric', 'side', 'severity', 'limit', 'hysteresis', 'min_duration')
+
+    def __init__(self, metric: str, side: str, severity: str, limit: float, hysteresis: float, min_duration: int):
+        self.metric = metric
+        self.side = side
+        self.severity = severity
+        self.limit = limit
+        self.hysteresis = hysteresis
+        self.min_duration = min_duration
+
+    @property
+    def key(self) -> Tuple[str, str, str]:
+        return self.metric, self.side, self.severity
+
+    def state(self, values: np.ndarray, initial: bool) -> np.ndarray:
+        # Hysteresis as a vectorized latch: samples past the limit set it,
+        # samples clearly back inside reset it, anything between carries the
+        # last decision forward
+        if self.side == 'low':
+            enter, leave = values < self.limit, values >= self.limit + self.hysteresis
+        else:
+            enter, leave = values > self.limit, values <= self.limit - self.hysteresis
+        events = np.full(len(values), -1, dtype=np.int8)
+        events[leave] = 0
+        events[enter] = 1
+        last = np.where(events >= 0, np.arange(len(values)), -1)
+        np.maximum.accumulate(last, out=last)
+        return np.where(last >= 0, events[np.maximum(last, 0)] == 1, initial)
+
+class Episode:
+    __slots__ = ('metric', 'side', 'severity', 'limit', 'start_ts', 'end_ts', 'peak', 'samples', 'open')
+
+    def __init__(self, bound: Bound, start_ts: int, end_ts: int, peak: float, samples: int):
+        self.metric = bound.metric
+        self.side = bound.side
+        self.severity = bound.severity
+        self.limit = bound.limit
+        self.start_ts = start_ts
+        self.end_ts = end_ts
+        self.peak = peak
+        self.samples = samples
+        self.open = True
+
+    @property
+    def duration(self) -> int:
+        return self.end_ts - self.start_ts
+
+    def extend(self, end_ts: int, peak: float, samples: int):
+        self.end_ts = end_ts
+        self.peak = min(self.peak, peak) if self.side == 'low' else max(self.peak, peak)
+        self.samples += samples
+
+class Thresholds:
+    def __init__(self, limits: Optional[Dict] = None, hysteresis: Optional[Dict] = None,
+                 min_duration: Optional[Dict] = None):
+        self.limits = {metric: dict(levels) for metric, levels in (limits or DEFAULT_LIMITS).items()}
+        self.hysteresis = dict(DEFAULT_HYSTERESIS, **(hysteresis or {}))
+        self.min_duration = dict(DEFAULT_MIN_DURATION, **(min_duration or {}))
+
+    @classmethod
+    def from_settings(cls, settings: Mapping) -> 'Thresholds':
+        # settings: glucose_min, glucose_max, ph_min, ph_max, oxygen_min, as
+        # stored in user_settings or the Settings tab. They set the critical
+        # limits; warning limits keep their defaults but never fall outside them.
+        limits = {metric: dict(levels) for metric, levels in DEFAULT_LIMITS.items()}
+        for metric, levels in limits.items():
+            low, high = levels['critical']
+            low = float(settings.get(f"{metric}_min", low)) if low is not None else None
+            high = float(settings.get(f"{metric}_max", high)) if high is not None else None
+            levels['critical'] = (low, high)
+            warn_low, warn_high = levels['warning']
+            levels['warning'] = (
+                None if warn_low is None else max(warn_low, low),
+                None if warn_high is None else min(warn_high, high)
+            )
+        return cls(limits)
+
+    def bounds(self) -> List[Bound]:
+        compiled = []
+        for metric, levels in self.limits.items():
+            for severity, (low, high) in levels.items():
+                for side, limit in (('low', low), ('high', high)):
+                    if limit is not None:
+                        compiled.append(Bound(metric, side, severity, limit,
+                                              self.hysteresis[metric], self.min_duration[severity]))
+        return compiled
+
+    def classify(self, metric: str, values) -> np.ndarray:
+        # 0 normal, 1 warning, 2 critical for every value
+        values = np.asarray(values, dtype=np.float64)
+        status = np.zeros(values.shape, dtype=np.int8)
+        for level, severity in ((1, 'warning'), (2, 'critical')):
+            low, high = self.limits[metric][severity]
+            outside = np.zeros(values.shape, dtype=bool)
+            if low is not None:
+                outside |= values < low
+            if high is not None:
+                outside |= values > high
+            status[outside] = level
+        return status
+
+    def status(self, metric: str, value: float) -> str:
+        return STATUSES[int(self.classify(metric, [value])[0])]
+
+class AlertEvaluator:
+    # Stateful so a live stream can be fed batch by batch; a history scan is
+    # one evaluator fed the range in time order
+    def __init__(self, thresholds: Thresholds):
+        self.thresholds = thresholds
+        self.bounds = thresholds.bounds()
+        self.active: Dict[Tuple, Optional[Episode]] = {bound.key: None for bound in self.bounds}
+
+    def feed(self, batch: ReadingBatch) -> List[Episode]:
+        # Returns every episode that closed in this batch or is still open and
+        # already long enough to report; open ones come back again as they grow
+        if not len(batch):
+            return []
+        ts = batch.timestamps
+        changed = []
+        for bound in self.bounds:
+            values = batch.column(bound.metric)
+            current = self.active[bound.key]
+            state = bound.state(values, current is not None)
+
+            edges = np.diff(np.concatenate(([current is not None], state, [False])).astype(np.int8))
+            starts = np.flatnonzero(edges == 1)
+            ends = np.flatnonzero(edges == -1)
+            if current is not None:
+                starts = np.concatenate(([0], starts))
+
+            for start, end in zip(starts, ends):
+                run = values[start:end]
+                peak = float(run.min() if bound.side == 'low' else run.max()) if len(run) else None
+                if start == 0 and current is not None:
+                    # The carried episode, possibly closed by the very first sample
+                    episode = current
+                    if peak is not None:
+                        episode.extend(int(ts[end - 1]), peak, int(end - start))
+                else:
+                    episode = Episode(bound, int(ts[start]), int(ts[end - 1]), peak, int(end - start))
+                episode.open = end == len(values)
+                if episode.duration >= bound.min_duration:
+                    changed.append(episode)
+                current = episode if episode.open else None
+            self.active[bound.key] = current
+        return changed
+
+    def open_episodes(self) -> List[Episode]:
+        return [episode for episode in self.active.values() if episode is not None]
@@ -1,85 +1,912 @@
+import atexit
+import csv
+import gzip
+import os
+import pathlib
 import sqlite3
+import threading
 from datetime import datetime
-from typing import List, Optional
-from data.models import BiometricReading
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+import numpy as np
+from data.alerts import AlertEvaluator, Episode, Thresholds
+from data.models import BiometricReading, ReadingBatch, Timestamp, to_datetime, to_epoch_ms
+from data.query_cache import QueryCache, cached
+from data.writer import AlertEvents, ReadingWriter
+from data import importer, migrations, retention, rollups
+
+EXPORT_COLUMNS = {
+    'timestamp': 'Timestamp',
+    'glucose': 'Glucose',
+    'ph': 'pH',
+    'oxygen': 'Oxygen'
+}
+
+# SQL for each selectable column; 'ts' is the raw epoch-ms key
+COLUMN_SQL = {
+    'timestamp': "strftime('%Y-%m-%dT%H:%M:%f', ts / 1000.0, 'unixepoch')",
+    'ts': 'ts',
+    'glucose': 'glucose',
+    'ph': 'ph',
+    'oxygen': 'oxygen'
+}
+
+# Settings-tab keys and their user_settings columns
+SETTINGS_COLUMNS = {
+    'esp32_ip': 'esp32_ip',
+    'glucose_min': 'glucose_threshold_min',
+    'glucose_max': 'glucose_threshold_max',
+    'ph_min': 'ph_threshold_min',
+    'ph_max': 'ph_threshold_max',
+    'oxygen_min': 'oxygen_threshold_min'
+}
+
+# Percentiles get_statistics reports unless asked for others
+STAT_PERCENTILES = (5, 25, 50, 75, 95)
+
+ALERT_COLUMNS = ('metric', 'side', 'severity', 'start_ts', 'end_ts', 'threshold', 'peak', 'samples', 'open')
+
+def episode_values(e: Episode) -> Tuple:
+    # An episode as its ALERT_COLUMNS values
+    return e.metric, e.side, e.severity, e.start_ts, e.end_ts, e.limit, e.peak, e.samples, int(e.open)
 
 class DatabaseManager:
-    def __init__(self, db_name: str):
+    def __init__(self, db_name: str, batch_size: int = 200, flush_interval: float = 1.0, archive_dir: Optional[str] = None,
+                 read_only: bool = False, cache_bytes: int = 0, shared: bool = False):
         self.db_name = db_name
+        # Read-only managers attach to a database another process (the ingest
+        # daemon) writes: no migrations, no writer, and every write fails
+        self.read_only = read_only
+        # Shared: another process (the app's ingest process) writes readings too
+        self.shared = shared or read_only
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.archive_dir = archive_dir or f"{os.path.splitext(db_name)[0]}_archive"
+        self.archive_horizon: Optional[int] = None
+        self.writer: Optional[ReadingWriter] = None
+        self.writer_lock = threading.Lock()
+        self.user_keys: Dict[str, int] = {}
         self.init_database()
+        # Read results, up to cache_bytes (0 turns the cache off). Another
+        # process's writes can't be reported, so a shared manager empties it
+        # whenever the database file's data_version moves.
+        self.version_conn: Optional[sqlite3.Connection] = None
+        self.version_lock = threading.Lock()
+        self.data_version: Optional[int] = None
+        self.cache = QueryCache(cache_bytes, changed=self._data_changed if self.shared and cache_bytes > 0 else None)
+
+    def connect(self, **options) -> sqlite3.Connection:
+        if self.read_only:
+            return sqlite3.connect(f"{pathlib.Path(os.path.abspath(self.db_name)).as_uri()}?mode=ro", uri=True, **options)
+        return sqlite3.connect(self.db_name, **options)
+
+    def _data_changed(self) -> bool:
+        with self.version_lock:
+            if self.version_conn is None:
+                self.version_conn = self.connect(check_same_thread=False)
+            version = self.version_conn.execute("PRAGMA data_version").fetchone()[0]
+            changed, self.data_version = version != self.data_version, version
+        return changed
 
     def init_database(self):
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
+        conn = self.connect()
+        if self.read_only:
+            version = migrations.schema_version(conn)
+            if version != migrations.SCHEMA_VERSION:
+                conn.close()
+                raise sqlite3.DatabaseError(f"{self.db_name} is at schema version {version}, "
+                                            f"expected {migrations.SCHEMA_VERSION}")
+            self.archive_horizon = retention.horizon(conn)
+            conn.close()
+            return
+        conn.execute("PRAGMA journal_mode=WAL")
 
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS readings (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id TEXT NOT NULL,
-                timestamp TEXT NOT NULL,
-                glucose REAL NOT NULL,
-                ph REAL NOT NULL,
-                oxygen REAL NOT NULL,
-                created_at TEXT DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS user_settings (
-                user_id TEXT PRIMARY KEY,
-                esp32_ip TEXT DEFAULT '192.168.4.1',
-                language TEXT DEFAULT 'EN',
-                theme TEXT DEFAULT 'light',
-                glucose_threshold_min REAL DEFAULT 70,
-                glucose_threshold_max REAL DEFAULT 140,
-                ph_threshold_min REAL DEFAULT 6.5,
-                ph_threshold_max REAL DEFAULT 7.5,
-                oxygen_threshold_min REAL DEFAULT 90
+        report = migrations.migrate(conn, progress=lambda done, total: print(f"Migrating readings: {done}/{total}"))
+        if report:
+            print(f"Database migrated to schema version {migrations.SCHEMA_VERSION} "
+                  f"({report['before']['used_bytes'] / 1e6:.1f} MB -> {report['after']['used_bytes'] / 1e6:.1f} MB)")
+
+        self.archive_horizon = retention.horizon(conn)
+        conn.close()
+
+    def user_key(self, user_id: str, cursor: Optional[sqlite3.Cursor] = None) -> Optional[int]:
+        if user_id in self.user_keys:
+            return self.user_keys[user_id]
+
+        conn = None
+        if cursor is None:
+            conn = self.connect()
+            cursor = conn.cursor()
+        row = cursor.execute("SELECT user_key FROM users WHERE uid = ?", (user_id,)).fetchone()
+        if conn is not None:
+            conn.close()
+
+        if row:
+            self.user_keys[user_id] = row[0]
+            return row[0]
+        return None
+
+    def _ensure_user_key(self, cursor: sqlite3.Cursor, user_id: str) -> int:
+        # A key made here is only real once the caller commits; on rollback
+        # the caller must forget_user_keys, or the next new user gets it too
+        key = self.user_key(user_id, cursor)
+        if key is None:
+            key = cursor.execute("INSERT INTO users (uid) VALUES (?)", (user_id,)).lastrowid
+            self.user_keys[user_id] = key
+        return key
+
+    def forget_user_keys(self, user_ids: Iterable[str]):
+        for user_id in user_ids:
+            self.user_keys.pop(user_id, None)
+
+    def insert_rows(self, cursor: sqlite3.Cursor, rows: List[tuple]):
+        # rows: (user_id, epoch ms, glucose, ph, oxygen)
+        keyed = [(self._ensure_user_key(cursor, row[0]),) + tuple(row[1:]) for row in rows]
+        # Idempotent: a sample the band sends twice, or a catch-up page that
+        # overlaps what is already stored, is dropped by the primary key
+        cursor.executemany('''
+            INSERT INTO readings (user_key, ts, glucose, ph, oxygen)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (user_key, ts) DO NOTHING
+        ''', keyed)
+        if self.archive_horizon is not None:
+            # A minute already archived can't be recomputed from this table
+            # alone; the next retention pass moves these rows and fixes it up
+            keyed = [row for row in keyed if row[1] >= self.archive_horizon]
+        rollups.refresh_for_rows(cursor, keyed)
+
+    def rebuild_rollups(self, user_id: Optional[str] = None):
+        self.flush()
+        user_key = self.user_key(user_id) if user_id else None
+        if user_id and user_key is None:
+            return
+        conn = self.connect()
+        with conn:
+            rollups.rebuild_rollups(conn.cursor(), user_key)
+        conn.close()
+        self.cache.invalidate(user_id)
+
+    @cached('summaries')
+    def get_aggregates(self, user_id: str, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None,
+                       resolution: float = 3600) -> List[Dict]:
+        resolution_ms = max(int(resolution * 1000), 1)
+        granularity = rollups.granularity_for(resolution)
+
+        conn = self.connect()
+        if granularity is None:
+            columns = ", ".join(f"MIN({m}), MAX({m}), SUM({m}), SUM({m} * {m})" for m in rollups.METRICS)
+            rows = []
+            sources = self._sources(conn, user_id, start_date, end_date)
+            for source, where, params in sources:
+                query = f"SELECT ts / {resolution_ms} * {resolution_ms}, COUNT(*), {columns} FROM {source} WHERE {where} GROUP BY 1 ORDER BY 1"
+                for row in conn.execute(query, params).fetchall():
+                    # A bucket that straddles the edge of an archived month comes back in two parts
+                    if rows and rows[-1][0] == row[0]:
+                        rows[-1] = rollups.merge(rows[-1], row)
+                    else:
+                        rows.append(row)
+            sources.close()
+        else:
+            where, params = rollups.bucket_filter(granularity, self._key_or_missing(user_id), start_date, end_date)
+            columns = ", ".join(f"MIN({m}_min), MAX({m}_max), SUM({m}_sum), SUM({m}_sumsq)" for m in rollups.METRICS)
+            query = (f"SELECT bucket / {resolution_ms} * {resolution_ms}, SUM(count), {columns} "
+                     f"FROM {rollups.table_name(granularity)} WHERE {where} GROUP BY 1 ORDER BY 1")
+            rows = conn.execute(query, params).fetchall()
+        conn.close()
+
+        return [rollups.summarize(row) for row in rows]
+
+    @cached('summaries')
+    def get_statistics(self, user_id: str, start_date: Optional[Timestamp] = None, end_date: Optional[Timestamp] = None,
+                       metrics: Sequence[str] = rollups.METRICS, bucket: Optional[float] = None,
+                       percentiles: Sequence[float] = STAT_PERCENTILES,
+                       ranges: Optional[Dict[str, Tuple[Optional[float], Optional[float]]]] = None,
+                       samples: int = 2000, exact_rows: int = 100000) -> List[Dict]:
+        # Summary of a range, or of each bucket seconds wide (UTC-aligned), as
+        # a list of rollups.summarize dicts. Count, mean, min, max and std are
+        # exact, from the coarsest rollups the range aligns to plus raw rows at
+        # the edges. below/in_range/above are shares of readings against
+        # ranges, (low, high) per metric, by default the user's warning
+        # limits; only minutes whose min and max straddle a limit are read
+        # row by row, and once those hold more than exact_rows readings their
+        # shares are estimated from the sample instead. Percentiles come from
+        # about samples readings per bucket picked evenly over time, so they
+        # are approximate.
+        unknown = set(metrics) - set(rollups.METRICS)
+        if unknown:
+            raise ValueError(f"Unknown metrics: {', '.join(sorted(unknown))}")
+        bucket_ms = None if bucket is None else int(bucket * 1000)
+        if bucket_ms is not None and bucket_ms <= 0:
+            raise ValueError(f"Invalid bucket: {bucket}")
+        if ranges is None:
+            limits = self.get_thresholds(user_id).limits
+            ranges = {metric: limits[metric]['warning'] for metric in metrics if 'warning' in limits.get(metric, {})}
+        ranges = {metric: bounds for metric, bounds in ranges.items()
+                  if metric in metrics and bounds != (None, None)}
+        user_key = self.user_key(user_id)
+        if user_key is None:
+            return []
+
+        conn = self.connect()
+        try:
+            if start_date is None or end_date is None:
+                first, last = conn.execute(f"SELECT MIN(bucket), MAX(bucket) FROM {rollups.table_name('day')} WHERE user_key = ?",
+                                           (user_key,)).fetchone()
+                if first is None:
+                    return []
+            start_ts = first if start_date is None else to_epoch_ms(start_date)
+            end_ts = last + rollups.width_of('day') - 1 if end_date is None else to_epoch_ms(end_date)
+            if start_ts > end_ts:
+                return []
+
+            def group(column: str) -> str:
+                return f"{column} / {bucket_ms} * {bucket_ms}" if bucket_ms else str(start_ts)
+
+            totals: Dict[int, Tuple] = {}
+            counts: Dict[Tuple[int, str], List[int]] = {}
+            levels = [level for level in rollups.GRANULARITIES if not bucket_ms or bucket_ms % level[1] == 0]
+            pieces = rollups.cover(start_ts, end_ts + 1, levels)
+            range_columns = ", ".join(
+                f"SUM({self._below(metric, low, '')}), SUM({self._above(metric, high, '')})"
+                for metric, (low, high) in ranges.items()
             )
-        ''')
+            for granularity, low, high in pieces:
+                if granularity is None:
+                    columns = ", ".join(f"MIN({m}), MAX({m}), SUM({m}), SUM({m} * {m})" for m in rollups.METRICS)
+                    sources = self._sources(conn, user_id, low, high - 1)
+                    for source, where, params in sources:
+                        query = f"SELECT {group('ts')}, COUNT(*), {columns}{', ' if ranges else ''}{range_columns} FROM {source} WHERE {where} GROUP BY 1"
+                        for row in conn.execute(query, params).fetchall():
+                            self._add_statistics(totals, counts, row, ranges)
+                    sources.close()
+                else:
+                    columns = ", ".join(f"MIN({m}_min), MAX({m}_max), SUM({m}_sum), SUM({m}_sumsq)" for m in rollups.METRICS)
+                    query = (f"SELECT {group('bucket')}, SUM(count), {columns} FROM {rollups.table_name(granularity)} "
+                             f"WHERE user_key = ? AND bucket >= ? AND bucket < ? GROUP BY 1")
+                    for row in conn.execute(query, (user_key, low, high)).fetchall():
+                        self._add_statistics(totals, counts, row, {})
+
+            if not totals:
+                return []
+            # No more instants than readings: a short range is sampled whole
+            sampled = self._sample_readings(conn, user_key, start_ts, end_ts, group,
+                                             min(samples * max(1, len(totals)), sum(row[1] for row in totals.values())))
+            aligned = [(low, high) for granularity, low, high in pieces if granularity is not None]
+            if aligned and ranges:
+                self._count_aligned_ranges(conn, user_key, aligned[0][0], aligned[-1][1], group, ranges, counts,
+                                           sampled, exact_rows)
+        finally:
+            conn.close()
+
+        statistics = []
+        for key in sorted(totals):
+            summary = rollups.summarize(totals[key])
+            for metric in rollups.METRICS:
+                if metric not in metrics:
+                    del summary[metric]
+                    continue
+                values = sampled.get(key, {}).get(metric)
+                summary[metric]['percentiles'] = dict(zip(percentiles, np.percentile(values, percentiles).tolist())) \
+                    if values is not None and len(values) else {}
+                if metric in ranges:
+                    below, above = counts.get((key, metric), (0, 0))
+                    summary[metric].update(range=ranges[metric], below=below / summary['count'],
+                                           above=above / summary['count'],
+                                           in_range=(summary['count'] - below - above) / summary['count'])
+            statistics.append(summary)
+        return statistics
+
+    @staticmethod
+    def _below(metric: str, low: Optional[float], suffix: str, prefix: str = '') -> str:
+        return "0" if low is None else f"{prefix}{metric}{suffix} < {float(low)!r}"
+
+    @staticmethod
+    def _above(metric: str, high: Optional[float], suffix: str, prefix: str = '') -> str:
+        return "0" if high is None else f"{prefix}{metric}{suffix} > {float(high)!r}"
+
+    @staticmethod
+    def _add_statistics(totals: Dict, counts: Dict, row: Tuple, ranges: Dict):
+        # row: group key, count, min/max/sum/sumsq per metric, then below/above per ranged metric
+        key, width = row[0], 2 + 4 * len(rollups.METRICS)
+        if row[1]:
+            totals[key] = rollups.merge(totals[key], row[:width]) if key in totals else row[:width]
+        for i, metric in enumerate(ranges):
+            count = counts.setdefault((key, metric), [0, 0])
+            count[0] += row[width + 2 * i] or 0
+            count[1] += row[width + 2 * i + 1] or 0
+
+    def _count_aligned_ranges(self, conn: sqlite3.Connection, user_key: int, start_ts: int, end_ts: int,
+                              group: Callable[[str], str], ranges: Dict, counts: Dict,
+                              sampled: Dict[int, Dict[str, np.ndarray]], exact_rows: int):
+        # Minutes entirely below, above or inside a range count whole from
+        # their min and max; the rest, where the value crossed a limit, are
+        # counted from their readings
+        minute, width = rollups.table_name('minute'), rollups.width_of('minute')
+        conditions = {metric: self._minute_conditions(metric, low, high) for metric, (low, high) in ranges.items()}
+        columns = ", ".join(f"SUM(CASE WHEN {condition} THEN count ELSE 0 END)"
+                            for below, above, straddling in conditions.values() for condition in (below, above, straddling))
+        rows = conn.execute(f"SELECT {group('bucket')}, {columns} FROM {minute} "
+                            f"WHERE user_key = ? AND bucket >= ? AND bucket < ? GROUP BY 1", (user_key, start_ts, end_ts)).fetchall()
+
+        for i, (metric, (low, high)) in enumerate(ranges.items()):
+            straddling_counts = {}
+            for row in rows:
+                count = counts.setdefault((row[0], metric), [0, 0])
+                count[0] += row[1 + 3 * i]
+                count[1] += row[2 + 3 * i]
+                straddling_counts[row[0]] = row[3 + 3 * i]
+
+            if sum(straddling_counts.values()) > exact_rows:
+                # Too many to read: the sampled readings that fall in such
+                # minutes stand in for them
+                for key, straddling_count in straddling_counts.items():
+                    sample = sampled.get(key)
+                    if not straddling_count or sample is None:
+                        continue
+                    values = sample[metric]
+                    within = self._straddling(sample[f'{metric}_min'], sample[f'{metric}_max'], low, high)
+                    if within.any():
+                        values = values[within]
+                    count = counts[(key, metric)]
+                    count[0] += round(straddling_count * float(np.mean(values < low))) if low is not None else 0
+                    count[1] += round(straddling_count * float(np.mean(values > high))) if high is not None else 0
+                continue
 
-        conn.commit()
+            # Minutes are whole within a piece, so the join is bounded by them alone
+            straddling = conditions[metric][2]
+            for source, first, last in self._pieces(conn, start_ts, end_ts - 1):
+                first = start_ts if first is None else max(start_ts, first)
+                last = end_ts if last is None else min(end_ts, last)
+                for table in self._tables(source):
+                    query = (f"SELECT {group('m.bucket')}, SUM({self._below(metric, low, '', 'r.')}), "
+                             f"SUM({self._above(metric, high, '', 'r.')}) FROM {minute} m JOIN {table} r "
+                             f"ON r.user_key = m.user_key AND r.ts >= m.bucket AND r.ts < m.bucket + {width} "
+                             f"WHERE m.user_key = ? AND m.bucket >= ? AND m.bucket < ? AND {straddling} GROUP BY 1")
+                    for key, below_count, above_count in conn.execute(query, (user_key, first, last)):
+                        count = counts[(key, metric)]
+                        count[0] += below_count or 0
+                        count[1] += above_count or 0
+
+    def _minute_conditions(self, metric: str, low: Optional[float], high: Optional[float]) -> Tuple[str, str, str]:
+        # SQL over a minute rollup: wholly below, wholly above, and straddling a limit
+        below, above = self._below(metric, low, '_max'), self._above(metric, high, '_min')
+        inside = " AND ".join(([f"{metric}_min >= {float(low)!r}"] if low is not None else []) +
+                              ([f"{metric}_max <= {float(high)!r}"] if high is not None else []))
+        return below, above, f"NOT ({below} OR {above} OR ({inside}))"
+
+    @staticmethod
+    def _straddling(minimum: np.ndarray, maximum: np.ndarray, low: Optional[float], high: Optional[float]) -> np.ndarray:
+        # _minute_conditions' straddling test, for minutes already fetched
+        result = np.zeros(len(minimum), dtype=bool)
+        if low is not None:
+            result |= (minimum < low) & (maximum >= low)
+        if high is not None:
+            result |= (maximum > high) & (minimum <= high)
+        return result
+
+    def _sample_readings(self, conn: sqlite3.Connection, user_key: int, start_ts: int, end_ts: int,
+                         group: Callable[[str], str], samples: int) -> Dict[int, Dict[str, np.ndarray]]:
+        # The first reading at or after each of samples evenly spaced instants,
+        # one index seek apiece, with the min and max of its minute; a reading
+        # hit from several instants (after a gap) counts once
+        step = max(1, (end_ts - start_ts + 1) // samples)
+        width = rollups.width_of('minute')
+        extremes = ", ".join(f"m.{metric}_min, m.{metric}_max" for metric in rollups.METRICS)
+        rows = []
+        for source, low, high in self._pieces(conn, start_ts, end_ts):
+            low = start_ts if low is None else max(start_ts, low)
+            high = end_ts + 1 if high is None else min(end_ts + 1, high)
+            first = start_ts + step // 2 + max(0, -(-(low - start_ts - step // 2) // step)) * step
+            if first >= high:
+                continue
+            for table in self._tables(source):
+                query = f"""
+                    WITH RECURSIVE instants(t) AS (SELECT ? UNION ALL SELECT t + ? FROM instants WHERE t + ? < ?)
+                    SELECT {group('r.ts')}, r.ts, r.glucose, r.ph, r.oxygen, {extremes} FROM (
+                        SELECT DISTINCT (SELECT ts FROM {table} WHERE user_key = ? AND ts >= t AND ts < ? ORDER BY ts LIMIT 1) AS hit
+                        FROM instants
+                    ) JOIN {table} r ON r.user_key = ? AND r.ts = hit
+                    LEFT JOIN {rollups.table_name('minute')} m ON m.user_key = r.user_key AND m.bucket = r.ts / {width} * {width}
+                """
+                rows += conn.execute(query, (first, step, step, high, user_key, high, user_key)).fetchall()
+
+        grouped: Dict[int, list] = {}
+        for row in rows:
+            grouped.setdefault(row[0], []).append(row[1:])
+        names = ['ts'] + list(rollups.METRICS) + [f"{metric}_{side}" for metric in rollups.METRICS for side in ('min', 'max')]
+        sampled = {}
+        for key, values in grouped.items():
+            columns = np.array(values, dtype=np.float64).T
+            sampled[key] = dict(zip(names, columns))
+        return sampled
+
+    @staticmethod
+    def _tables(source: str) -> Tuple[str, ...]:
+        # An archived piece reads as one union; queries that seek per row go to its two halves
+        return ('readings', 'archive.readings') if source == retention.ARCHIVED_SOURCE else (source,)
+
+    def apply_retention(self, max_age_days: float, now: Optional[Timestamp] = None,
+                        progress: Optional[Callable[[int], None]] = None) -> Dict:
+        # Moves readings older than max_age_days into monthly archive files,
+        # then hands the freed pages back in small steps. Runs beside the
+        # writer; queries keep seeing every row throughout.
+        self.flush()
+        conn = self.connect()
+        report = retention.archive_readings(conn, self.archive_dir, retention.cutoff_for(max_age_days, now), progress=progress)
+        self.archive_horizon = retention.horizon(conn)
+        report['freed_pages'] = retention.incremental_vacuum(conn)
         conn.close()
+        if report['rows']:
+            # Late rows folded into archived months change their rollups
+            self.cache.invalidate()
+        return report
 
     def save_reading(self, user_id: str, reading: BiometricReading):
-        conn = sqlite3.connect(self.db_name)
+        conn = self.connect()
         cursor = conn.cursor()
 
-        cursor.execute('''
-            INSERT INTO readings (user_id, timestamp, glucose, ph, oxygen)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (user_id, reading.timestamp.isoformat(), reading.glucose, reading.ph, reading.oxygen))
+        rows = [(user_id, to_epoch_ms(reading.timestamp), reading.glucose, reading.ph, reading.oxygen)]
+        try:
+            self.insert_rows(cursor, rows)
+            conn.commit()
+        except sqlite3.Error:
+            self.forget_user_keys([user_id])
+            raise
+        finally:
+            conn.close()
+        self.rows_written(rows)
+
+    def rows_written(self, rows: Sequence[Tuple]):
+        # Tells the cache which (user_id, ts, ...) rows were just committed
+        if not self.cache.enabled:
+            return
+        timestamps: Dict[str, List[int]] = {}
+        for row in rows:
+            timestamps.setdefault(row[0], []).append(row[1])
+        for user_id, stamps in timestamps.items():
+            self.cache.written(user_id, stamps)
+
+    def _writer(self) -> ReadingWriter:
+        if self.read_only:
+            raise sqlite3.OperationalError(f"{self.db_name} is attached read-only")
+        if self.writer is None:
+            # The band engine queues from its own thread, the dashboard from the GUI thread
+            with self.writer_lock:
+                if self.writer is None:
+                    writer = ReadingWriter(self, self.batch_size, self.flush_interval)
+                    writer.start()
+                    atexit.register(writer.close)
+                    self.writer = writer
+        return self.writer
 
-        conn.commit()
+    def queue_reading(self, user_id: str, reading: BiometricReading):
+        self._writer().put((user_id, to_epoch_ms(reading.timestamp), reading.glucose, reading.ph, reading.oxygen))
+
+    def queue_readings(self, user_id: str, readings: List[BiometricReading]):
+        for reading in readings:
+            self.queue_reading(user_id, reading)
+
+    def latest_timestamp(self, user_id: str) -> Optional[int]:
+        # Newest persisted sample in epoch ms, including rows still queued in the writer
+        self.flush()
+        conn = self.connect()
+        latest = None
+        sources = self._sources(conn, user_id, order='desc')
+        for source, where, params in sources:
+            latest = conn.execute(f"SELECT MAX(ts) FROM {source} WHERE {where}", params).fetchall()[0][0]
+            if latest is not None:
+                break
+        sources.close()
         conn.close()
+        return latest
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        if self.writer is None:
+            return True
+        return self.writer.flush(timeout)
 
+    def writer_stats(self) -> Dict:
+        if self.writer is None:
+            return {}
+        return self.writer.stats()
+
+    def cache_stats(self) -> Dict:
+        return self.cache.stats()
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            atexit.unregister(self.writer.close)
+            self.writer = None
+        with self.version_lock:
+            if self.version_conn is not None:
+                self.version_conn.close()
+                self.version_conn = None
+
+    @cached('readings')
     def get_readings(self, user_id: str, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None) -> List[BiometricReading]:
-        conn = sqlite3.connect(self.db_name)
+        return [
+            BiometricReading(row[0], row[1], row[2], row[3])
+            for rows in self.iter_rows(user_id, start_date, end_date, ('ts', 'glucose', 'ph', 'oxygen'))
+            for row in rows
+        ]
+
+    @cached('batch')
+    def get_reading_batch(self, user_id: str, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None,
+                          order: str = 'asc', chunk_size: int = 50000) -> ReadingBatch:
+        chunks = [
+            ReadingBatch.from_rows(rows)
+            for rows in self.iter_rows(user_id, start_date, end_date, ('ts', 'glucose', 'ph', 'oxygen'), chunk_size, order)
+        ]
+        return ReadingBatch.concat(chunks)
+
+    def _key_or_missing(self, user_id: str) -> int:
+        # Unknown users match nothing rather than raising
+        key = self.user_key(user_id)
+        return -1 if key is None else key
+
+    def _sources(self, conn: sqlite3.Connection, user_id: str, start_date: Optional[Timestamp] = None,
+                 end_date: Optional[Timestamp] = None, order: str = 'asc') -> Iterator[Tuple[str, str, list]]:
+        # (table, where, params) per piece of the range, in time order. A range
+        # within the retention age is the hot table alone; one reaching further
+        # back gets a piece per archived month, with that month's file attached
+        # while the piece is read. Finish each piece's cursor before the next.
+        start_ts = None if start_date is None else to_epoch_ms(start_date)
+        end_ts = None if end_date is None else to_epoch_ms(end_date)
+        base_where, base_params = self._range_filter(user_id, start_ts, end_ts)
+
+        pieces = self._pieces(conn, start_ts, end_ts, order)
+        try:
+            for source, low, high in pieces:
+                where, params = base_where, list(base_params)
+                if low is not None:
+                    where += " AND ts >= ?"
+                    params.append(low)
+                if high is not None:
+                    where += " AND ts < ?"
+                    params.append(high)
+                yield source, where, params
+        finally:
+            pieces.close()
+
+    def _pieces(self, conn: sqlite3.Connection, start_ts: Optional[int], end_ts: Optional[int],
+                order: str = 'asc') -> Iterator[Tuple[str, Optional[int], Optional[int]]]:
+        # (source, low, high) behind _sources: [low, high) bounds, None where open
+        pieces, covered = [], start_ts
+        for month_start, month_end, file in retention.partitions(conn, start_ts, end_ts):
+            if covered is None or covered < month_start:
+                pieces.append((covered, month_start, None))
+            pieces.append((month_start, month_end, file))
+            covered = month_end
+        if covered is None or end_ts is None or end_ts >= covered:
+            pieces.append((covered, None, None))
+        if order == 'desc':
+            pieces.reverse()
+
+        for low, high, file in pieces:
+            if file is not None and not os.path.exists(os.path.join(self.archive_dir, file)):
+                print(f"Archive partition {file} is missing from {self.archive_dir}")
+                file = None
+            if file is None:
+                yield 'readings', low, high
+                continue
+            retention.attach(conn, self.archive_dir, file, self.read_only)
+            try:
+                yield retention.ARCHIVED_SOURCE, low, high
+            finally:
+                retention.detach(conn)
+
+    def _range_filter(self, user_id: str, start_date: Optional[Timestamp], end_date: Optional[Timestamp]) -> Tuple[str, list]:
+        where = "user_key = ?"
+        params = [self._key_or_missing(user_id)]
+
+        if start_date is not None:
+            where += " AND ts >= ?"
+            params.append(to_epoch_ms(start_date))
+
+        if end_date is not None:
+            where += " AND ts <= ?"
+            params.append(to_epoch_ms(end_date))
+
+        return where, params
+
+    def get_readings_page(self, user_id: str, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None,
+                          after_ts: Optional[Timestamp] = None, limit: int = 500, order: str = 'desc') -> List[BiometricReading]:
+        rows = self.get_rows_page(user_id, start_date, end_date, after_ts, limit, order)
+        return [BiometricReading(row[0], row[1], row[2], row[3]) for row in rows]
+
+    @cached('rows')
+    def get_rows_page(self, user_id: str, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None,
+                      after_ts: Optional[Timestamp] = None, limit: int = 500, order: str = 'desc') -> List[tuple]:
+        if order not in ('asc', 'desc'):
+            raise ValueError(f"Invalid order: {order}")
+        if after_ts is not None and order == 'desc':
+            end_date = to_epoch_ms(after_ts) - 1 if end_date is None else min(to_epoch_ms(end_date), to_epoch_ms(after_ts) - 1)
+        elif after_ts is not None:
+            start_date = to_epoch_ms(after_ts) + 1 if start_date is None else max(to_epoch_ms(start_date), to_epoch_ms(after_ts) + 1)
+
+        rows = []
+        conn = self.connect()
+        sources = self._sources(conn, user_id, start_date, end_date, order)
+        for source, where, params in sources:
+            query = f"SELECT ts, glucose, ph, oxygen FROM {source} WHERE {where} ORDER BY ts {order.upper()} LIMIT ?"
+            rows += conn.execute(query, params + [limit - len(rows)]).fetchall()
+            if len(rows) >= limit:
+                break
+        sources.close()
+        conn.close()
+
+        return rows
+
+    @cached('scalar')
+    def estimate_reading_count(self, user_id: str, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None) -> int:
+        # Whole minute buckets at the range edges are counted, hence "estimate"
+        where, params = rollups.bucket_filter('minute', self._key_or_missing(user_id), start_date, end_date)
+
+        conn = self.connect()
+        count = conn.execute(f"SELECT SUM(count) FROM {rollups.table_name('minute')} WHERE {where}", params).fetchone()[0]
+        conn.close()
+
+        return count or 0
+
+    def iter_rows(self, user_id: str, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None,
+                  columns: Sequence[str] = tuple(EXPORT_COLUMNS), chunk_size: int = 5000, order: str = 'desc') -> Iterator[List[tuple]]:
+        unknown = set(columns) - set(COLUMN_SQL)
+        if unknown:
+            raise ValueError(f"Unknown columns: {', '.join(sorted(unknown))}")
+        if order not in ('asc', 'desc'):
+            raise ValueError(f"Invalid order: {order}")
+
+        selected = ', '.join(COLUMN_SQL[column] for column in columns)
+
+        conn = self.connect()
+        sources = self._sources(conn, user_id, start_date, end_date, order)
+        try:
+            for source, where, params in sources:
+                cursor = conn.execute(f"SELECT {selected} FROM {source} WHERE {where} ORDER BY ts {order.upper()}", params)
+                try:
+                    while True:
+                        rows = cursor.fetchmany(chunk_size)
+                        if not rows:
+                            break
+                        yield rows
+                finally:
+                    cursor.close()
+        finally:
+            sources.close()
+            conn.close()
+
+    def export_to_csv(self, user_id: str, filename: str, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None,
+                      columns: Optional[Sequence[str]] = None, compress: Optional[bool] = None, chunk_size: int = 5000,
+                      progress: Optional[Callable[[int, int], None]] = None,
+                      should_cancel: Optional[Callable[[], bool]] = None) -> int:
+        columns = list(columns or EXPORT_COLUMNS)
+        unknown = set(columns) - set(EXPORT_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown columns: {', '.join(sorted(unknown))}")
+        if compress is None:
+            compress = filename.endswith('.gz')
+        total = self.estimate_reading_count(user_id, start_date, end_date) if progress else 0
+
+        if compress:
+            csvfile = gzip.open(filename, 'wt', newline='')
+        else:
+            csvfile = open(filename, 'w', newline='', buffering=1 << 16)
+
+        written = 0
+        with csvfile:
+            writer = csv.writer(csvfile, lineterminator='\n')
+            writer.writerow([EXPORT_COLUMNS[column] for column in columns])
+            for rows in self.iter_rows(user_id, start_date, end_date, columns, chunk_size):
+                if should_cancel and should_cancel():
+                    break
+                writer.writerows(rows)
+                written += len(rows)
+                if progress:
+                    progress(written, total)
+
+        return written
+
+    def import_from_csv(self, user_id: str, filename: str, duplicates: str = 'skip', chunk_size: int = 50000,
+                        transaction_rows: int = 200000, progress: Optional[Callable[[int, int], None]] = None,
+                        should_cancel: Optional[Callable[[], bool]] = None) -> Dict:
+        # Bulk load of a readings CSV (an export, or another machine's). Rows
+        # already stored are skipped, or overwritten with duplicates='replace'.
+        # The file is parsed into an unindexed temp table first, which takes
+        # no lock on the database; its ts index is built once at the end and
+        # rows then move into readings in time order, transaction_rows per
+        # transaction with their rollups, so the writer is never held up for
+        # long. Exports are newest first, and inserting them as they come
+        # would leave the table's pages half empty.
+        if duplicates not in ('skip', 'replace'):
+            raise ValueError(f"Invalid duplicates mode: {duplicates}")
+        if self.read_only:
+            raise sqlite3.OperationalError(f"{self.db_name} is attached read-only")
+        conflict = "DO NOTHING" if duplicates == 'skip' else \
+            "DO UPDATE SET glucose = excluded.glucose, ph = excluded.ph, oxygen = excluded.oxygen"
+        source = importer.CsvReadings(filename, chunk_size)
+        report = {'rows': 0, 'written': 0, 'skipped': 0, 'invalid': 0}
+
+        self.flush()
+        conn = self.connect()
+        conn.isolation_level = None
+        conn.execute("PRAGMA synchronous=NORMAL")
         cursor = conn.cursor()
+        try:
+            cursor.execute("CREATE TEMP TABLE import_staging (ts INTEGER NOT NULL, glucose REAL, ph REAL, oxygen REAL)")
+            # A transaction that only writes the temp table leaves the database unlocked.
+            # Parsing and moving are weighted half each in progress.
+            cursor.execute("BEGIN")
+            for ts, glucose, ph, oxygen in source:
+                if should_cancel and should_cancel():
+                    return report
+                cursor.executemany("INSERT INTO import_staging VALUES (?, ?, ?, ?)",
+                                   zip(ts.tolist(), glucose.tolist(), ph.tolist(), oxygen.tolist()))
+                if progress:
+                    progress(source.position // 2, source.size)
+            cursor.execute("COMMIT")
+            report.update(rows=source.rows, invalid=source.invalid)
+            if not source.rows:
+                return report
+            cursor.execute("CREATE INDEX temp.import_staging_ts ON import_staging (ts)")
 
-        query = "SELECT timestamp, glucose, ph, oxygen FROM readings WHERE user_id = ?"
-        params = [user_id]
+            cursor.execute("BEGIN IMMEDIATE")
+            user_key = self._ensure_user_key(cursor, user_id)
+            cursor.execute("COMMIT")
+            first_ts, last_ts = cursor.execute("SELECT MIN(ts), MAX(ts) FROM import_staging").fetchone()
+            horizon = self.archive_horizon
+            low, moved = first_ts, 0
+            while low <= last_ts and not (should_cancel and should_cancel()):
+                row = cursor.execute("SELECT ts FROM import_staging WHERE ts >= ? ORDER BY ts LIMIT 1 OFFSET ?",
+                                     (low, transaction_rows - 1)).fetchone()
+                high = last_ts if row is None else row[0]
+                cursor.execute("BEGIN IMMEDIATE")
+                report['written'] += cursor.execute(f"""
+                    INSERT INTO readings (user_key, ts, glucose, ph, oxygen)
+                    SELECT ?, ts, glucose, ph, oxygen FROM import_staging WHERE ts >= ? AND ts <= ? ORDER BY ts
+                    ON CONFLICT (user_key, ts) {conflict}
+                """, (user_key, low, high)).rowcount
+                # Archived minutes can't be recomputed from this table; see below
+                refresh_from = low if horizon is None else max(low, horizon)
+                if refresh_from <= high:
+                    rollups.refresh_range(cursor, user_key, refresh_from, high)
+                cursor.execute("COMMIT")
+                self.cache.written_range(user_id, low, high)
+                moved += cursor.execute("SELECT COUNT(*) FROM import_staging WHERE ts >= ? AND ts <= ?", (low, high)).fetchone()[0]
+                if progress:
+                    progress(source.size // 2 + source.size * moved // (2 * source.rows), source.size)
+                low = high + 1
 
-        if start_date:
-            query += " AND timestamp >= ?"
-            params.append(start_date.isoformat())
+            if horizon is not None and first_ts < horizon:
+                # Rows of archived months go straight on to their archive file,
+                # where copies already archived are dropped (kept, not replaced)
+                # and the month's rollups are refreshed
+                late = cursor.execute("SELECT COUNT(*) FROM readings WHERE user_key = ? AND ts < ?",
+                                      (user_key, horizon)).fetchone()[0]
+                archived = retention.archive_readings(conn, self.archive_dir, horizon)['rows']
+                report['written'] -= max(0, late - archived)
+                self.cache.written_range(user_id, first_ts, horizon - 1)
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+                self.user_keys.pop(user_id, None)
+            raise
+        finally:
+            conn.close()
 
-        if end_date:
-            query += " AND timestamp <= ?"
-            params.append(end_date.isoformat())
+        if duplicates == 'skip':
+            report['skipped'] = report['rows'] - report['written']
+        return report
 
-        query += " ORDER BY timestamp DESC"
+    def get_user_settings(self, user_id: str) -> Optional[Dict]:
+        conn = self.connect()
+        row = conn.execute(f"SELECT {', '.join(SETTINGS_COLUMNS.values())} FROM user_settings WHERE user_id = ?",
+                           (user_id,)).fetchone()
+        conn.close()
+        return dict(zip(SETTINGS_COLUMNS, row)) if row else None
 
-        cursor.execute(query, params)
-        rows = cursor.fetchall()
+    def save_user_settings(self, user_id: str, settings: Dict):
+        keys = [key for key in settings if key in SETTINGS_COLUMNS]
+        columns = [SETTINGS_COLUMNS[key] for key in keys]
+        updates = ', '.join(f"{column} = excluded.{column}" for column in columns)
+        conn = self.connect()
+        with conn:
+            conn.execute(f"""
+                INSERT INTO user_settings (user_id, {', '.join(columns)})
+                VALUES (?{', ?' * len(columns)})
+                ON CONFLICT (user_id) DO UPDATE SET {updates}
+            """, [user_id] + [settings[key] for key in keys])
         conn.close()
+        # Statistics default to the thresholds' ranges
+        self.cache.invalidate(user_id)
 
-        return [BiometricReading(row[0], row[1], row[2], row[3]) for row in rows]
+    def get_thresholds(self, user_id: str) -> Thresholds:
+        return Thresholds.from_settings(self.get_user_settings(user_id) or {})
+
+    def queue_alert_events(self, user_id: str, episodes: Sequence[Episode]):
+        # Written by the writer thread with the next readings batch; the
+        # episodes are copied now, as open ones keep growing
+        self._writer().put(AlertEvents(user_id, [episode_values(e) for e in episodes]))
 
-    def export_to_csv(self, user_id: str, filename: str):
-        readings = self.get_readings(user_id)
+    def insert_alert_events(self, cursor: sqlite3.Cursor, user_id: str, values: Sequence[Tuple]):
+        user_key = self._ensure_user_key(cursor, user_id)
+        # An open episode is written again each time it grows
+        cursor.executemany(f"""
+            INSERT INTO alert_events (user_key, {', '.join(ALERT_COLUMNS)})
+            VALUES (?{', ?' * len(ALERT_COLUMNS)})
+            ON CONFLICT (user_key, metric, side, severity, start_ts) DO UPDATE SET
+                end_ts = excluded.end_ts, peak = excluded.peak, samples = excluded.samples, open = excluded.open
+        """, [(user_key,) + tuple(row) for row in values])
+
+    def save_alert_events(self, user_id: str, episodes: Sequence[Episode], cursor: Optional[sqlite3.Cursor] = None):
+        conn = None
+        if cursor is None:
+            conn = self.connect()
+            cursor = conn.cursor()
+        try:
+            self.insert_alert_events(cursor, user_id, [episode_values(e) for e in episodes])
+            if conn is not None:
+                conn.commit()
+        except sqlite3.Error:
+            self.forget_user_keys([user_id])
+            raise
+        finally:
+            if conn is not None:
+                conn.close()
+
+    def scan_alerts(self, user_id: str, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None,
+                    thresholds: Optional[Thresholds] = None, chunk_size: int = 200000) -> int:
+        # Re-evaluates a stored range (after a threshold change, or for data
+        # recorded before alerts existed) and replaces its episodes
+        evaluator = AlertEvaluator(thresholds or self.get_thresholds(user_id))
+        episodes = {}
+        for rows in self.iter_rows(user_id, start_date, end_date, ('ts', 'glucose', 'ph', 'oxygen'), chunk_size, 'asc'):
+            for episode in evaluator.feed(ReadingBatch.from_rows(rows)):
+                episodes[(episode.metric, episode.side, episode.severity, episode.start_ts)] = episode
+
+        where = "user_key = ?"
+        params = [self._key_or_missing(user_id)]
+        if start_date:
+            where += " AND start_ts >= ?"
+            params.append(to_epoch_ms(start_date))
+        if end_date:
+            where += " AND start_ts <= ?"
+            params.append(to_epoch_ms(end_date))
+
+        conn = self.connect()
+        with conn:
+            conn.execute(f"DELETE FROM alert_events WHERE {where}", params)
+            self.save_alert_events(user_id, list(episodes.values()), conn.cursor())
+        conn.close()
+        return len(episodes)
+
+    def get_alert_events(self, user_id: str, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None,
+                         metric: Optional[str] = None, severity: Optional[str] = None) -> List[Dict]:
+        # Episodes overlapping the range, oldest first; served from alert_events alone
+        where = "user_key = ?"
+        params: list = [self._key_or_missing(user_id)]
+        if start_date:
+            where += " AND end_ts >= ?"
+            params.append(to_epoch_ms(start_date))
+        if end_date:
+            where += " AND start_ts <= ?"
+            params.append(to_epoch_ms(end_date))
+        if metric:
+            where += " AND metric = ?"
+            params.append(metric)
+        if severity:
+            where += " AND severity = ?"
+            params.append(severity)
+
+        conn = self.connect()
+        rows = conn.execute(f"SELECT {', '.join(ALERT_COLUMNS)} FROM alert_events WHERE {where} ORDER BY start_ts",
+                            params).fetchall()
+        conn.close()
 
-        with open(filename, 'w', newline='') as csvfile:
-            csvfile.write("Timestamp,Glucose,pH,Oxygen\n")
-            for reading in readings:
-                csvfile.write(f"{reading.timestamp},{reading.glucose},{reading.ph},{reading.oxygen}\n")
+        events = []
+        for row in rows:
+            event = dict(zip(ALERT_COLUMNS, row))
+            event['start'] = to_datetime(event.pop('start_ts'))
+            event['end'] = to_datetime(event.pop('end_ts'))
+            event['open'] = bool(event['open'])
+            events.append(event)
+        return events
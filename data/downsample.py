@@ -0,0 +1,63 @@
+import numpy as np
+
+def minmax(x: np.ndarray, y: np.ndarray, n_buckets: int):
+    # Keeps the lowest and highest sample of every bucket, in time order, so
+    # short spikes survive no matter how far the series is reduced.
+    x = np.asarray(x)
+    y = np.asarray(y)
+    n = len(x)
+    if n_buckets <= 0 or n <= n_buckets * 2:
+        return x, y
+
+    edges = np.linspace(0, n, n_buckets + 1).astype(np.int64)[:-1]
+    bucket_of = np.repeat(np.arange(n_buckets), np.diff(np.append(edges, n)))
+    low_idx = _first_match(y == np.minimum.reduceat(y, edges)[bucket_of], bucket_of)
+    high_idx = _first_match(y == np.maximum.reduceat(y, edges)[bucket_of], bucket_of)
+
+    keep = np.unique(np.concatenate((low_idx, high_idx, [0, n - 1])))
+    return x[keep], y[keep]
+
+def _first_match(mask: np.ndarray, bucket_of: np.ndarray) -> np.ndarray:
+    hits = np.flatnonzero(mask)
+    _, first = np.unique(bucket_of[hits], return_index=True)
+    return hits[first]
+
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int):
+    # Largest-Triangle-Three-Buckets. Each bucket picks the point forming the
+    # largest triangle with the previously chosen point and the mean of the
+    # next bucket; the per-bucket search is vectorized.
+    x = np.asarray(x)
+    y = np.asarray(y)
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return x, y
+
+    xf = x.astype(np.float64)
+    yf = y.astype(np.float64)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    sums_x = np.add.reduceat(xf[1:n - 1], edges[:-1] - 1)
+    sums_y = np.add.reduceat(yf[1:n - 1], edges[:-1] - 1)
+    sizes = np.diff(edges)
+    means_x = np.append(sums_x / sizes, xf[-1])
+    means_y = np.append(sums_y / sizes, yf[-1])
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    prev = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        ax, ay = xf[prev], yf[prev]
+        cx, cy = means_x[i + 1], means_y[i + 1]
+        areas = np.abs((ax - cx) * (yf[lo:hi] - ay) - (ax - xf[lo:hi]) * (cy - ay))
+        prev = lo + int(areas.argmax())
+        selected[i + 1] = prev
+
+    return x[selected], y[selected]
+
+def downsample(x: np.ndarray, y: np.ndarray, target: int, method: str = 'minmax'):
+    if method == 'lttb':
+        return lttb(x, y, target)
+    if method == 'minmax':
+        return minmax(x, y, max(1, target // 2))
+    raise ValueError(f"Unknown downsampling method: {method}")
@@ -0,0 +1,108 @@
+import csv
+import gzip
+import io
+import itertools
+import math
+import os
+from typing import Dict, Iterator, List, Sequence, Tuple
+import numpy as np
+from data.models import parse_timestamps, to_epoch_ms
+
+# Header names accepted per column, lowercased: export_to_csv's plus the raw ones
+HEADER_NAMES = {
+    'timestamp': ('timestamp', 'ts', 'time'),
+    'glucose': ('glucose',),
+    'ph': ('ph',),
+    'oxygen': ('oxygen',)
+}
+
+# (epoch ms, glucose, ph, oxygen) as int64 and float64 arrays of equal length
+Columns = Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+
+def epoch_ms(text: str) -> int:
+    # Raw epoch milliseconds or ISO 8601 text
+    text = text.strip()
+    return int(text) if text.lstrip('-').isdigit() else to_epoch_ms(text)
+
+class CsvReadings:
+    # Streams a readings CSV (export_to_csv's layout, gzipped if the name ends
+    # in .gz) as column chunks. Values stay float64, so an export imported
+    # back stores exactly what it held. Rows that don't parse, or carry NaN or
+    # infinity, are counted in invalid and skipped.
+    def __init__(self, filename: str, chunk_size: int = 50000):
+        self.filename = filename
+        self.chunk_size = chunk_size
+        self.size = os.path.getsize(filename)
+        self.position = 0  # bytes of the file consumed so far, for progress
+        self.rows = 0
+        self.invalid = 0
+
+    def __iter__(self) -> Iterator[Columns]:
+        with open(self.filename, 'rb') as raw:
+            binary = gzip.GzipFile(fileobj=raw) if self.filename.endswith('.gz') else raw
+            reader = csv.reader(io.TextIOWrapper(binary, encoding='utf-8-sig', newline=''))
+            header = next(reader, None)
+            if header is None:
+                return
+            indices = self.column_indices(header)
+            while True:
+                chunk = list(itertools.islice(reader, self.chunk_size))
+                if not chunk:
+                    break
+                self.position = raw.tell()
+                columns = self.parse(chunk, indices)
+                self.rows += len(columns[0])
+                if len(columns[0]):
+                    yield columns
+
+    def column_indices(self, header: Sequence[str]) -> List[int]:
+        names = [name.strip().lower() for name in header]
+        indices = []
+        for column, accepted in HEADER_NAMES.items():
+            found = [i for i, name in enumerate(names) if name in accepted]
+            if not found:
+                raise ValueError(f"{self.filename} has no {column} column (header: {', '.join(header)})")
+            indices.append(found[0])
+        return indices
+
+    def parse(self, chunk: List[List[str]], indices: List[int]) -> Columns:
+        try:
+            fields = [[row[i] for row in chunk] for i in indices]
+            ts = np.array(fields[0], dtype=np.int64) if fields[0][0].isdigit() else parse_timestamps(fields[0])
+            values = [np.array(field, dtype=np.float64) for field in fields[1:]]
+        except (ValueError, IndexError):
+            return self.parse_rows(chunk, indices)
+        finite = np.isfinite(values[0]) & np.isfinite(values[1]) & np.isfinite(values[2])
+        if not finite.all():
+            self.invalid += int((~finite).sum())
+            ts, values = ts[finite], [column[finite] for column in values]
+        return (ts, *values)
+
+    def parse_rows(self, chunk: List[List[str]], indices: List[int]) -> Columns:
+        # The slow path, for a chunk with at least one bad row
+        parsed = []
+        for row in chunk:
+            try:
+                values = [float(row[i]) for i in indices[1:]]
+                if all(math.isfinite(value) for value in values):
+                    parsed.append((epoch_ms(row[indices[0]]), *values))
+                    continue
+            except (ValueError, IndexError, TypeError):
+                pass
+            self.invalid += 1
+        if not parsed:
+            return np.empty(0, np.int64), np.empty(0), np.empty(0), np.empty(0)
+        ts, glucose, ph, oxygen = zip(*parsed)
+        return np.array(ts, dtype=np.int64), np.array(glucose), np.array(ph), np.array(oxygen)
+
+    def report(self) -> Dict:
+        return {'rows': self.rows, 'invalid': self.invalid}
+
+def load(filename: str, chunk_size: int = 50000) -> Columns:
+    # A whole file in time order, whatever order it was written in (exports are newest first)
+    chunks = list(CsvReadings(filename, chunk_size))
+    if not chunks:
+        return np.empty(0, np.int64), np.empty(0), np.empty(0), np.empty(0)
+    columns = [np.concatenate(column) for column in zip(*chunks)]
+    order = np.argsort(columns[0], kind='stable')
+    return tuple(column[order] for column in columns)
@@ -0,0 +1,190 @@
+import bisect
+import cProfile
+import functools
+import io
+import json
+import pstats
+import threading
+import time
+import tracemalloc
+from collections import deque
+from typing import Callable, Dict, Optional
+
+# Histogram bucket upper bounds in seconds: powers of two from 1 µs to ~67 s
+BUCKETS = [2 ** i / 1e6 for i in range(27)]
+
+class Histogram:
+    __slots__ = ('counts', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds: float):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, q: float) -> float:
+        # Upper bound of the bucket holding the q-th sample, so at most 2x high
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if n and seen >= rank:
+                return min(BUCKETS[i] if i < len(BUCKETS) else self.max, self.max)
+        return self.max
+
+    def to_dict(self) -> Dict:
+        return {
+            'count': self.count,
+            'mean_ms': self.total / self.count * 1000 if self.count else 0.0,
+            'p50_ms': self.percentile(0.5) * 1000,
+            'p95_ms': self.percentile(0.95) * 1000,
+            'p99_ms': self.percentile(0.99) * 1000,
+            'max_ms': self.max * 1000,
+            'buckets_ms': {f"{(BUCKETS[i] if i < len(BUCKETS) else float('inf')) * 1000:g}": n
+                           for i, n in enumerate(self.counts) if n},
+        }
+
+class Instrumentation:
+    # Latency histograms, counters and gauges for the ingest -> dashboard ->
+    # database/chart pipeline. Off by default: every entry point then returns
+    # after a single attribute check.
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.histograms: Dict[str, Histogram] = {}
+        self.counters: Dict[str, int] = {}
+        self.gauges: Dict[str, float] = {}
+        self.in_flight: Dict[str, deque] = {}
+        self.since = time.time()
+
+    def enable(self, enabled: bool = True):
+        self.enabled = enabled
+        if not enabled:
+            self.in_flight.clear()
+
+    def clock(self) -> float:
+        # Pass the result to record(); 0.0 while disabled makes record() a no-op
+        return time.perf_counter() if self.enabled else 0.0
+
+    def record(self, name: str, started: float):
+        if started:
+            self.observe(name, time.perf_counter() - started)
+
+    def observe(self, name: str, seconds: float):
+        if not self.enabled:
+            return
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.add(seconds)
+
+    def count(self, name: str, n: int = 1):
+        if self.enabled:
+            with self.lock:
+                self.counters[name] = self.counters.get(name, 0) + n
+
+    def gauge(self, name: str, value: float):
+        if self.enabled:
+            self.gauges[name] = value
+
+    def sent(self, channel: str):
+        # Paired with received() on the other side of a queued signal; the
+        # gap is the time the emission waited in the receiver's event queue
+        if self.enabled:
+            queue = self.in_flight.get(channel)
+            if queue is None:
+                queue = self.in_flight[channel] = deque(maxlen=10000)
+            queue.append(time.perf_counter())
+
+    def received(self, channel: str):
+        if self.enabled:
+            queue = self.in_flight.get(channel)
+            if queue:
+                self.record(f"signal.{channel}", queue.popleft())
+
+    def timed(self, name: str) -> Callable:
+        def decorate(function: Callable) -> Callable:
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return function(*args, **kwargs)
+                started = time.perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    self.record(name, started)
+            return wrapper
+        return decorate
+
+    def reset(self):
+        with self.lock:
+            self.histograms.clear()
+            self.counters.clear()
+            self.gauges.clear()
+            self.in_flight.clear()
+            self.since = time.time()
+
+    def snapshot(self) -> Dict:
+        with self.lock:
+            return {
+                'enabled': self.enabled,
+                'since': self.since,
+                'seconds': time.time() - self.since,
+                'stages': {name: histogram.to_dict() for name, histogram in sorted(self.histograms.items())},
+                'counters': dict(sorted(self.counters.items())),
+                'gauges': dict(sorted(self.gauges.items())),
+            }
+
+    def dump(self, path: str, extra: Optional[Dict] = None):
+        with open(path, 'w') as f:
+            json.dump(dict(self.snapshot(), **(extra or {})), f, indent=2)
+
+metrics = Instrumentation()
+
+class Capture:
+    # Opt-in profiling for a fixed window. 'cpu' is cProfile, which only sees
+    # the thread that started it (the GUI thread from the Diagnostics tab);
+    # 'memory' is tracemalloc, which sees every thread.
+    def __init__(self, kind: str, limit: int = 30):
+        if kind not in ('cpu', 'memory'):
+            raise ValueError(f"Unknown capture: {kind}")
+        self.kind = kind
+        self.limit = limit
+        self.profile: Optional[cProfile.Profile] = None
+        self.baseline: Optional[tracemalloc.Snapshot] = None
+        self.started = 0.0
+
+    def start(self):
+        self.started = time.perf_counter()
+        if self.kind == 'cpu':
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+        else:
+            tracemalloc.start(10)
+            self.baseline = tracemalloc.take_snapshot()
+
+    def stop(self) -> str:
+        elapsed = time.perf_counter() - self.started
+        if self.kind == 'cpu':
+            self.profile.disable()
+            out = io.StringIO()
+            out.write(f"CPU profile of the GUI thread over {elapsed:.1f} s\n")
+            pstats.Stats(self.profile, stream=out).sort_stats('cumulative').print_stats(self.limit)
+            return out.getvalue()
+
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        lines = [f"Allocations over {elapsed:.1f} s: {current / 1e6:.1f} MB traced now, peak {peak / 1e6:.1f} MB",
+                 f"Top {self.limit} growth by line:"]
+        for stat in snapshot.compare_to(self.baseline, 'lineno')[:self.limit]:
+            lines.append(f"  {stat.size_diff / 1024:+10.1f} KiB {stat.count_diff:+8d} blocks  {stat.traceback}")
+        return "\n".join(lines)
@@ -0,0 +1,227 @@
+import os
+import sqlite3
+import sys
+import time
+from typing import Callable, Dict, Optional
+from data import rollups
+from data.models import to_epoch_ms
+
+# PRAGMA user_version values:
+#   0  unversioned legacy layout (TEXT user_id/timestamp rows with a rowid)
+#   2  compact layout: users table plus WITHOUT ROWID readings keyed by (user_key, ts)
+#   3  alert_events log
+#   4  archive_partitions catalog for monthly retention
+SCHEMA_VERSION = 4
+
+def create_readings_table(cursor: sqlite3.Cursor, table: str = 'readings'):
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS {table} (
+            user_key INTEGER NOT NULL,
+            ts INTEGER NOT NULL,
+            glucose REAL NOT NULL,
+            ph REAL NOT NULL,
+            oxygen REAL NOT NULL,
+            PRIMARY KEY (user_key, ts)
+        ) WITHOUT ROWID
+    ''')
+
+def create_schema(cursor: sqlite3.Cursor, readings_table: str = 'readings'):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            user_key INTEGER PRIMARY KEY,
+            uid TEXT NOT NULL UNIQUE
+        )
+    ''')
+
+    create_readings_table(cursor, readings_table)
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS user_settings (
+            user_id TEXT PRIMARY KEY,
+            esp32_ip TEXT DEFAULT '192.168.4.1',
+            language TEXT DEFAULT 'EN',
+            theme TEXT DEFAULT 'light',
+            glucose_threshold_min REAL DEFAULT 70,
+            glucose_threshold_max REAL DEFAULT 140,
+            ph_threshold_min REAL DEFAULT 6.5,
+            ph_threshold_max REAL DEFAULT 7.5,
+            oxygen_threshold_min REAL DEFAULT 90
+        )
+    ''')
+
+    # One row per threshold episode; open episodes are updated in place as they grow
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS alert_events (
+            user_key INTEGER NOT NULL,
+            metric TEXT NOT NULL,
+            side TEXT NOT NULL,
+            severity TEXT NOT NULL,
+            start_ts INTEGER NOT NULL,
+            end_ts INTEGER NOT NULL,
+            threshold REAL NOT NULL,
+            peak REAL NOT NULL,
+            samples INTEGER NOT NULL,
+            open INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_key, metric, side, severity, start_ts)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS alert_events_time ON alert_events (user_key, start_ts)")
+
+    # Readings older than the retention age live in one file per month;
+    # [month_start, archived_before) of each month has been moved there
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS archive_partitions (
+            month_start INTEGER PRIMARY KEY,
+            month_end INTEGER NOT NULL,
+            file TEXT NOT NULL,
+            rows INTEGER NOT NULL DEFAULT 0,
+            archived_before INTEGER NOT NULL
+        )
+    ''')
+
+    rollups.create_rollup_tables(cursor)
+
+def schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def _table_exists(conn: sqlite3.Connection, name: str) -> bool:
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)).fetchone() is not None
+
+def _file_size(conn: sqlite3.Connection) -> Dict:
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    pages = conn.execute("PRAGMA page_count").fetchone()[0]
+    free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    return {'file_bytes': pages * page_size, 'used_bytes': (pages - free) * page_size}
+
+def _time_query(conn: sqlite3.Connection, query: str, params: tuple, repeat: int = 5) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        conn.execute(query, params).fetchall()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+def migrate(conn: sqlite3.Connection, chunk_size: int = 20000,
+            progress: Optional[Callable[[int, int], None]] = None) -> Optional[Dict]:
+    # Copies legacy rows in short IMMEDIATE transactions so readers and other
+    # writers only ever wait for one chunk. Progress is stored in the database,
+    # so an interrupted migration resumes where it stopped.
+    conn.isolation_level = None
+    if schema_version(conn) >= SCHEMA_VERSION:
+        return None
+
+    if not _table_exists(conn, 'readings') or 'ts' in [row[1] for row in conn.execute("PRAGMA table_info(readings)")]:
+        if not _table_exists(conn, 'readings'):
+            # Only possible before the first table exists; lets retention hand
+            # freed pages back a step at a time instead of with a full VACUUM
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+        conn.execute("BEGIN IMMEDIATE")
+        create_schema(conn.cursor())
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        conn.execute("COMMIT")
+        return None
+
+    sample = conn.execute("SELECT user_id, MAX(timestamp) FROM readings GROUP BY user_id ORDER BY COUNT(*) DESC LIMIT 1").fetchone()
+    report = {'before': _file_size(conn)}
+    if sample:
+        report['before']['page_query_ms'] = _time_query(
+            conn, "SELECT timestamp, glucose, ph, oxygen FROM readings WHERE user_id = ? AND timestamp <= ? ORDER BY timestamp DESC LIMIT 500", sample)
+        report['before']['count_query_ms'] = _time_query(
+            conn, "SELECT COUNT(*), AVG(glucose) FROM readings WHERE user_id = ? AND timestamp <= ?", sample, repeat=1)
+
+    conn.execute("BEGIN IMMEDIATE")
+    create_schema(conn.cursor(), readings_table='readings_compact')
+    conn.execute("CREATE TABLE IF NOT EXISTS migration_state (key TEXT PRIMARY KEY, value INTEGER)")
+    conn.execute("COMMIT")
+
+    state = conn.execute("SELECT value FROM migration_state WHERE key = 'last_id'").fetchone()
+    last_id = state[0] if state else 0
+    total = conn.execute("SELECT COUNT(*) FROM readings WHERE id > ?", (last_id,)).fetchone()[0]
+    user_keys = dict(conn.execute("SELECT uid, user_key FROM users").fetchall())
+    copied = 0
+
+    def copy_chunk() -> int:
+        nonlocal last_id
+        rows = conn.execute(
+            "SELECT id, user_id, timestamp, glucose, ph, oxygen FROM readings WHERE id > ? ORDER BY id LIMIT ?",
+            (last_id, chunk_size)
+        ).fetchall()
+        if not rows:
+            return 0
+
+        converted = []
+        for _, uid, timestamp, glucose, ph, oxygen in rows:
+            if uid not in user_keys:
+                user_keys[uid] = conn.execute("INSERT INTO users (uid) VALUES (?)", (uid,)).lastrowid
+            converted.append((user_keys[uid], to_epoch_ms(timestamp), glucose, ph, oxygen))
+        converted.sort()
+
+        conn.executemany(
+            "INSERT OR IGNORE INTO readings_compact (user_key, ts, glucose, ph, oxygen) VALUES (?, ?, ?, ?, ?)", converted)
+        rollups.refresh_for_rows(conn.cursor(), converted, source='readings_compact')
+        last_id = rows[-1][0]
+        conn.execute("INSERT OR REPLACE INTO migration_state (key, value) VALUES ('last_id', ?)", (last_id,))
+        return len(rows)
+
+    while True:
+        conn.execute("BEGIN IMMEDIATE")
+        count = copy_chunk()
+        conn.execute("COMMIT")
+        if not count:
+            break
+        copied += count
+        if progress:
+            progress(copied, total)
+
+    # Swap in the new table under one short lock, picking up rows written meanwhile
+    conn.execute("BEGIN IMMEDIATE")
+    while copy_chunk():
+        pass
+    conn.execute("DROP TABLE readings")
+    for granularity in ('minute', 'hour', 'day'):
+        conn.execute(f"DROP TABLE IF EXISTS readings_rollup_{granularity}")
+    conn.execute("ALTER TABLE readings_compact RENAME TO readings")
+    conn.execute("DROP TABLE migration_state")
+    conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    conn.execute("COMMIT")
+
+    report['after'] = _file_size(conn)
+    if sample:
+        user_key = user_keys[sample[0]]
+        end_ts = to_epoch_ms(sample[1])
+        report['after']['page_query_ms'] = _time_query(
+            conn, "SELECT ts, glucose, ph, oxygen FROM readings WHERE user_key = ? AND ts <= ? ORDER BY ts DESC LIMIT 500", (user_key, end_ts))
+        report['after']['count_query_ms'] = _time_query(
+            conn, "SELECT COUNT(*), AVG(glucose) FROM readings WHERE user_key = ? AND ts <= ?", (user_key, end_ts), repeat=1)
+    report['rows'] = copied
+    return report
+
+def vacuum(conn: sqlite3.Connection) -> Dict:
+    conn.isolation_level = None
+    conn.execute("VACUUM")
+    return _file_size(conn)
+
+if __name__ == "__main__":
+    # python -m data.migrations [db_path] [--vacuum]
+    from config import CONFIG
+
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    path = args[0] if args else CONFIG['db_name']
+    conn = sqlite3.connect(path)
+    report = migrate(conn, progress=lambda done, total: print(f"\r{done}/{total} rows", end='', flush=True))
+    print()
+    if report is None:
+        print(f"{path} is already at schema version {SCHEMA_VERSION}")
+    else:
+        if '--vacuum' in sys.argv:
+            report['after'].update(vacuum(conn))
+        before, after = report['before'], report['after']
+        print(f"Migrated {report['rows']} readings")
+        print(f"Data size: {before['used_bytes'] / 1e6:.1f} MB -> {after['used_bytes'] / 1e6:.1f} MB")
+        print(f"File size: {before['file_bytes'] / 1e6:.1f} MB -> {os.path.getsize(path) / 1e6:.1f} MB"
+              + ("" if '--vacuum' in sys.argv else " (run with --vacuum to return freed pages)"))
+        for key in ('page_query_ms', 'count_query_ms'):
+            if key in before:
+                print(f"{key}: {before[key]:.2f} -> {after[key]:.2f}")
+    conn.close()
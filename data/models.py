@@ -1,13 +1,41 @@
-from datetime import datetime
-from typing import Dict
+import warnings
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, List, Sequence, Union
+import numpy as np
+
+Timestamp = Union[str, datetime, int, float]
+
+# Epoch values are milliseconds. Naive datetimes are treated as UTC wall-clock
+# time, the same way SQLite's strftime('%s') and numpy.datetime64 read them.
+def to_epoch_ms(value: Timestamp) -> int:
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        return int(value)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return round(value.timestamp() * 1000)
+
+def to_datetime(value: Timestamp) -> datetime:
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, str):
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return datetime.fromtimestamp(int(value) / 1000, timezone.utc).replace(tzinfo=None)
 
 class BiometricReading:
-    def __init__(self, timestamp: str, glucose: float, ph: float, oxygen: float):
-        self.timestamp = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+    __slots__ = ('timestamp', 'glucose', 'ph', 'oxygen')
+
+    def __init__(self, timestamp: Timestamp, glucose: float, ph: float, oxygen: float):
+        self.timestamp = to_datetime(timestamp)
         self.glucose = glucose
         self.ph = ph
         self.oxygen = oxygen
 
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'BiometricReading':
+        return cls(data['timestamp'], data['glucose'], data['ph'], data['oxygen'])
+
     def to_dict(self) -> Dict:
         return {
             'timestamp': self.timestamp.isoformat(),
@@ -16,6 +44,83 @@ class BiometricReading:
             'oxygen': self.oxygen
         }
 
+class ReadingBatch:
+    __slots__ = ('timestamps', 'glucose', 'ph', 'oxygen')
+    METRICS = ('glucose', 'ph', 'oxygen')
+
+    def __init__(self, timestamps, glucose, ph, oxygen):
+        self.timestamps = np.asarray(timestamps, dtype=np.int64)
+        self.glucose = np.asarray(glucose, dtype=np.float32)
+        self.ph = np.asarray(ph, dtype=np.float32)
+        self.oxygen = np.asarray(oxygen, dtype=np.float32)
+
+    @classmethod
+    def empty(cls) -> 'ReadingBatch':
+        return cls([], [], [], [])
+
+    @classmethod
+    def from_rows(cls, rows: Sequence[tuple]) -> 'ReadingBatch':
+        if not rows:
+            return cls.empty()
+        timestamps, glucose, ph, oxygen = zip(*rows)
+        return cls(parse_timestamps(timestamps), glucose, ph, oxygen)
+
+    @classmethod
+    def from_readings(cls, readings: Iterable[BiometricReading]) -> 'ReadingBatch':
+        readings = list(readings)
+        return cls(
+            [to_epoch_ms(r.timestamp) for r in readings],
+            [r.glucose for r in readings],
+            [r.ph for r in readings],
+            [r.oxygen for r in readings]
+        )
+
+    @classmethod
+    def concat(cls, batches: Sequence['ReadingBatch']) -> 'ReadingBatch':
+        if not batches:
+            return cls.empty()
+        return cls(*(np.concatenate([getattr(b, name) for b in batches]) for name in cls.__slots__))
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def __iter__(self) -> Iterator[BiometricReading]:
+        for i in range(len(self)):
+            yield BiometricReading(
+                int(self.timestamps[i]), float(self.glucose[i]), float(self.ph[i]), float(self.oxygen[i])
+            )
+
+    def __getitem__(self, index) -> 'ReadingBatch':
+        if isinstance(index, (int, np.integer)):
+            index = slice(index, index + 1 if index != -1 else None)
+        return ReadingBatch(self.timestamps[index], self.glucose[index], self.ph[index], self.oxygen[index])
+
+    def column(self, metric: str) -> np.ndarray:
+        if metric not in self.METRICS:
+            raise ValueError(f"Unknown metric: {metric}")
+        return getattr(self, metric)
+
+    def datetimes(self) -> np.ndarray:
+        return self.timestamps.astype('datetime64[ms]')
+
+    def readings(self) -> List[BiometricReading]:
+        return list(self)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(getattr(self, name).nbytes for name in self.__slots__)
+
+def parse_timestamps(values: Sequence) -> np.ndarray:
+    if values and not isinstance(values[0], str):
+        return np.asarray(values, dtype=np.int64)
+    try:
+        # Plain ISO text parses in one vectorized call; offsets fall back to Python
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            return np.array(values, dtype='datetime64[ms]').astype(np.int64)
+    except (ValueError, UserWarning, DeprecationWarning):
+        return np.fromiter((to_epoch_ms(value) for value in values), dtype=np.int64, count=len(values))
+
 class User:
     def __init__(self, uid: str, email: str, token: str):
         self.uid = uid
@@ -0,0 +1,311 @@
+import bisect
+import copy
+import functools
+import inspect
+import sys
+import threading
+from collections import OrderedDict, deque
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+from data.models import BiometricReading, ReadingBatch, to_epoch_ms
+
+# Writes remembered per user, to judge results that were being read while they landed
+WRITE_LOG = 64
+
+# Result shapes the cache knows how to size, copy and extend:
+#   batch     ReadingBatch, full range; arrays are made read-only and shared
+#   readings  list of BiometricReading, full range
+#   rows      list of tuples (a page; never extended)
+#   summaries list of dicts (aggregates, statistics)
+#   scalar    a number
+EXTENDABLE = ('batch', 'readings')
+
+def estimate_size(value) -> int:
+    # Rough bytes held by a cached result; lists are sized from their first item
+    if isinstance(value, ReadingBatch):
+        return value.nbytes + 200
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + (estimate_size(value[0]) * len(value) if value else 0)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value.values())
+    if isinstance(value, BiometricReading):
+        return 250
+    return sys.getsizeof(value)
+
+def _freeze(value) -> Hashable:
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple, set)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+def _newest(value, shape: str) -> Optional[int]:
+    if shape == 'batch':
+        return int(value.timestamps.max()) if len(value) else None
+    return max((to_epoch_ms(reading.timestamp) for reading in value), default=None)
+
+def _combine(old, new, shape: str, order: str):
+    parts = [old, new] if order == 'asc' else [new, old]
+    if shape == 'batch':
+        return _read_only(ReadingBatch.concat(parts))
+    return parts[0] + parts[1]
+
+def _read_only(batch: ReadingBatch) -> ReadingBatch:
+    for name in ReadingBatch.__slots__:
+        getattr(batch, name).flags.writeable = False
+    return batch
+
+def _copy(value, shape: str):
+    # Callers get their own list; batches are shared but read-only
+    if shape in ('readings', 'rows'):
+        return list(value)
+    if shape == 'summaries':
+        return copy.deepcopy(value)
+    return value
+
+
+class CacheEntry:
+    __slots__ = ('user_id', 'start_ts', 'end_ts', 'shape', 'order', 'value', 'size', 'newest', 'stale')
+
+    def __init__(self, user_id: str, start_ts: Optional[int], end_ts: Optional[int], shape: str, order: str, value):
+        self.user_id = user_id
+        self.start_ts = start_ts
+        self.end_ts = end_ts
+        self.shape = shape
+        self.order = order
+        self.value = value
+        self.size = estimate_size(value)
+        # Newest reading in the range when the result was read; a write past
+        # it is appended on the next hit rather than thrown away
+        self.newest = _newest(value, shape) if shape in EXTENDABLE else None
+        self.stale = False
+
+    def contains(self, ts: int) -> bool:
+        return (self.start_ts is None or ts >= self.start_ts) and (self.end_ts is None or ts <= self.end_ts)
+
+    def first_within(self, timestamps: List[int]) -> Optional[int]:
+        # Oldest of the sorted timestamps inside the range
+        i = 0 if self.start_ts is None else bisect.bisect_left(timestamps, self.start_ts)
+        if i < len(timestamps) and self.contains(timestamps[i]):
+            return timestamps[i]
+        return None
+
+    def first_overlapping(self, start_ts: int, end_ts: int) -> Optional[int]:
+        first = start_ts if self.start_ts is None else max(start_ts, self.start_ts)
+        return first if first <= end_ts and self.contains(first) else None
+
+
+class QueryCache:
+    # LRU cache of DatabaseManager read results, bounded by estimated bytes.
+    # Writes report the timestamps they touched: an entry whose range holds
+    # none of them survives, a full-range raw result whose new rows all lie
+    # past its newest one is topped up on its next hit, anything else is
+    # dropped. A result read while the same user's data was being written is
+    # judged against those writes the same way before it is stored.
+    def __init__(self, max_bytes: int, changed: Optional[Callable[[], bool]] = None):
+        self.max_bytes = max_bytes
+        # Polled before each lookup when writes can't be reported (another
+        # process writes); True empties the cache
+        self.changed = changed
+        self.entries: 'OrderedDict[Hashable, CacheEntry]' = OrderedDict()
+        self.generations: Dict[str, int] = {}
+        self.writes: Dict[str, deque] = {}
+        self.clears = 0
+        self.lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.extensions = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def generation(self, user_id: str) -> Tuple[int, int]:
+        # Taken before a read and handed back with its result
+        return self.clears, self.generations.get(user_id, 0)
+
+    def lookup(self, key: Hashable) -> Optional[CacheEntry]:
+        if self.changed is not None and self.changed():
+            self.clear()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def store(self, key: Hashable, entry: CacheEntry, generation: Tuple[int, int]):
+        if entry.shape == 'batch':
+            _read_only(entry.value)
+        with self.lock:
+            stale = self._missed(entry, generation)
+            if stale is None or entry.size > self.max_bytes:
+                return
+            entry.stale = stale
+            self._remove(key)
+            self.entries[key] = entry
+            self.bytes += entry.size
+            self._evict()
+
+    def extend(self, key: Hashable, entry: CacheEntry, delta, generation: Tuple[int, int]) -> bool:
+        # delta: the rows newer than entry.newest, read with the range's other
+        # arguments. False if the entry was dropped meanwhile.
+        with self.lock:
+            if self.entries.get(key) is not entry:
+                return False
+            newest = _newest(delta, entry.shape)
+            if newest is not None:
+                self.bytes -= entry.size
+                entry.value = _combine(entry.value, delta, entry.shape, entry.order)
+                entry.size = estimate_size(entry.value)
+                entry.newest = newest
+                self.bytes += entry.size
+                self.extensions += 1
+            # A write that landed during the read may not be in delta yet
+            stale = self._missed(entry, generation)
+            if stale is None:
+                self._remove(key)
+                return False
+            entry.stale = stale
+            self._evict()
+            return True
+
+    def written(self, user_id: str, timestamps: Iterable[int]):
+        timestamps = sorted(timestamps)
+        if timestamps:
+            self._written(user_id, lambda entry: entry.first_within(timestamps))
+
+    def written_range(self, user_id: str, start_ts: int, end_ts: int):
+        # A bulk write known only by its span
+        self._written(user_id, lambda entry: entry.first_overlapping(start_ts, end_ts))
+
+    def _written(self, user_id: str, first_within: Callable[[CacheEntry], Optional[int]]):
+        with self.lock:
+            generation = self.generations.get(user_id, 0) + 1
+            self.generations[user_id] = generation
+            self.writes.setdefault(user_id, deque(maxlen=WRITE_LOG)).append((generation, first_within))
+            for key, entry in list(self.entries.items()):
+                if entry.user_id != user_id:
+                    continue
+                stale = self._affected(entry, first_within)
+                if stale is None:
+                    self._remove(key)
+                    self.invalidations += 1
+                elif stale:
+                    entry.stale = True
+
+    @staticmethod
+    def _affected(entry: CacheEntry, first_within: Callable[[CacheEntry], Optional[int]]) -> Optional[bool]:
+        # False: the write missed the entry; True: it can be appended; None: drop it
+        first = first_within(entry)
+        if first is None:
+            return False
+        if entry.shape in EXTENDABLE and (entry.newest is None or first > entry.newest):
+            return True
+        return None
+
+    def _missed(self, entry: CacheEntry, generation: Tuple[int, int]) -> Optional[bool]:
+        # Whether the entry, read from generation on, needs topping up; None
+        # if a write since then may have changed it or is no longer known
+        if generation == self.generation(entry.user_id):
+            return entry.stale
+        clears, since = generation
+        log = self.writes.get(entry.user_id)
+        if clears != self.clears or not log or log[0][0] > since + 1:
+            return None
+        stale = entry.stale
+        for written, first_within in log:
+            if written > since:
+                affected = self._affected(entry, first_within)
+                if affected is None:
+                    return None
+                stale = stale or affected
+        return stale
+
+    def invalidate(self, user_id: Optional[str] = None):
+        # Everything of one user (or everyone's): settings that shape results changed
+        with self.lock:
+            for key, entry in list(self.entries.items()):
+                if user_id is None or entry.user_id == user_id:
+                    self._remove(key)
+                    self.invalidations += 1
+            # Results read across this can't be judged; see _missed
+            if user_id is None:
+                self.clears += 1
+                self.writes.clear()
+            else:
+                self.generations[user_id] = self.generations.get(user_id, 0) + 1
+                self.writes.pop(user_id, None)
+
+    def clear(self):
+        self.invalidate()
+
+    def _evict(self):
+        # Least recently used first, by estimated size
+        while self.bytes > self.max_bytes:
+            self._remove(next(iter(self.entries)))
+            self.evictions += 1
+
+    def _remove(self, key: Hashable):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry.size
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self.entries),
+            'bytes': self.bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'extensions': self.extensions,
+            'invalidations': self.invalidations,
+            'evictions': self.evictions,
+        }
+
+
+def cached(shape: str, order: str = 'desc'):
+    # Caches a DatabaseManager read method taking user_id, start_date and
+    # end_date. order is the result's time order when the method has no
+    # order argument of its own.
+    def decorator(method):
+        signature = inspect.signature(method)
+
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            cache: QueryCache = self.cache
+            if not cache.enabled:
+                return method(self, *args, **kwargs)
+            bound = signature.bind(self, *args, **kwargs)
+            bound.apply_defaults()
+            arguments = dict(bound.arguments)
+            del arguments['self']
+            for name in ('start_date', 'end_date', 'after_ts'):
+                if arguments.get(name) is not None:
+                    arguments[name] = to_epoch_ms(arguments[name])
+            key = (method.__name__, _freeze(arguments))
+            user_id = arguments['user_id']
+
+            entry = cache.lookup(key)
+            if entry is not None and entry.stale:
+                generation = cache.generation(user_id)
+                since = entry.start_ts if entry.newest is None else entry.newest + 1
+                delta = method(self, **dict(arguments, start_date=since))
+                if not cache.extend(key, entry, delta, generation):
+                    entry = None
+            if entry is not None:
+                return _copy(entry.value, shape)
+
+            generation = cache.generation(user_id)
+            value = method(self, *args, **kwargs)
+            cache.store(key, CacheEntry(user_id, arguments.get('start_date'), arguments.get('end_date'), shape,
+                                        arguments.get('order', order), value), generation)
+            return _copy(value, shape)
+        return wrapper
+    return decorator
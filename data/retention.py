@@ -0,0 +1,183 @@
+import os
+import pathlib
+import sqlite3
+import sys
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+from data import migrations, rollups
+from data.models import Timestamp, to_epoch_ms
+
+DAY_MS = 86400 * 1000
+
+# Late rows that belong to an archived month sit in the hot table until the
+# next retention pass moves them, so an archived month is read from both
+ARCHIVED_SOURCE = "(SELECT * FROM readings UNION ALL SELECT * FROM archive.readings)"
+
+def month_bounds(ts: int) -> Tuple[int, int]:
+    # UTC calendar month containing ts, as [start, end) epoch ms
+    moment = datetime.fromtimestamp(ts / 1000, timezone.utc)
+    start = datetime(moment.year, moment.month, 1, tzinfo=timezone.utc)
+    end = datetime(moment.year + moment.month // 12, moment.month % 12 + 1, 1, tzinfo=timezone.utc)
+    return int(start.timestamp() * 1000), int(end.timestamp() * 1000)
+
+def partition_file(month_start: int) -> str:
+    return f"readings_{datetime.fromtimestamp(month_start / 1000, timezone.utc):%Y_%m}.db"
+
+def cutoff_for(max_age_days: float, now: Optional[Timestamp] = None) -> int:
+    # Whole UTC days, so an archived minute is always complete and the
+    # rollups computed from the hot table stay exact
+    now_ms = to_epoch_ms(now if now is not None else datetime.now(timezone.utc))
+    return (now_ms - int(max_age_days * DAY_MS)) // DAY_MS * DAY_MS
+
+def horizon(conn: sqlite3.Connection) -> Optional[int]:
+    # Everything before this has been archived at least once
+    return conn.execute("SELECT MAX(archived_before) FROM archive_partitions").fetchone()[0]
+
+def partitions(conn: sqlite3.Connection, start_ts: Optional[int] = None,
+               end_ts: Optional[int] = None) -> List[Tuple[int, int, str]]:
+    # (month_start, month_end, file) of archived months overlapping [start_ts, end_ts], oldest first
+    return conn.execute(
+        "SELECT month_start, month_end, file FROM archive_partitions WHERE month_end > ? AND month_start <= ? ORDER BY month_start",
+        (-(1 << 62) if start_ts is None else start_ts, (1 << 62) if end_ts is None else end_ts)
+    ).fetchall()
+
+def attach(conn: sqlite3.Connection, archive_dir: str, file: str, read_only: bool = False):
+    path = os.path.join(archive_dir, file)
+    if read_only:
+        # Needs a connection opened with uri=True, as DatabaseManager's read-only ones are
+        path = f"{pathlib.Path(os.path.abspath(path)).as_uri()}?mode=ro"
+    conn.execute("ATTACH DATABASE ? AS archive", (path,))
+
+def detach(conn: sqlite3.Connection):
+    conn.execute("DETACH DATABASE archive")
+
+def _next_old_ts(conn: sqlite3.Connection, user_keys: List[int], after_ts: int, cutoff_ts: int) -> Optional[int]:
+    found = [
+        conn.execute("SELECT MIN(ts) FROM readings WHERE user_key = ? AND ts >= ? AND ts < ?",
+                     (user_key, after_ts, cutoff_ts)).fetchone()[0]
+        for user_key in user_keys
+    ]
+    found = [ts for ts in found if ts is not None]
+    return min(found) if found else None
+
+def _move_range(conn: sqlite3.Connection, user_key: int, start_ts: int, end_ts: int,
+                late_before: int, chunk_size: int) -> int:
+    # Each chunk is committed to the archive first and only then deleted from
+    # the hot table, so a crash can leave a chunk in both files (the next
+    # pass drops the copy) but never in neither
+    moved = 0
+    while True:
+        row = conn.execute(
+            "SELECT ts FROM readings WHERE user_key = ? AND ts >= ? AND ts < ? ORDER BY ts LIMIT 1 OFFSET ?",
+            (user_key, start_ts, end_ts, chunk_size - 1)
+        ).fetchone()
+        chunk_end = end_ts if row is None else row[0] + 1
+        bounds = (user_key, start_ts, chunk_end)
+
+        conn.execute("BEGIN IMMEDIATE")
+        moved += conn.execute("INSERT OR IGNORE INTO archive.readings SELECT * FROM readings WHERE user_key = ? AND ts >= ? AND ts < ?",
+                              bounds).rowcount
+        conn.execute("COMMIT")
+
+        conn.execute("BEGIN IMMEDIATE")
+        # Rows that arrived after their month was archived never got rollups
+        # (see DatabaseManager.insert_rows); the archive now has the full minute
+        late = conn.execute("SELECT user_key, ts FROM readings WHERE user_key = ? AND ts >= ? AND ts < ?",
+                            (user_key, start_ts, min(chunk_end, late_before))).fetchall()
+        conn.execute("DELETE FROM readings WHERE user_key = ? AND ts >= ? AND ts < ?", bounds)
+        if late:
+            rollups.refresh_for_rows(conn.cursor(), late, source='archive.readings')
+        conn.execute("COMMIT")
+
+        start_ts = chunk_end
+        if row is None:
+            return moved
+
+def archive_readings(conn: sqlite3.Connection, archive_dir: str, cutoff_ts: int, chunk_size: int = 50000,
+                     progress: Optional[Callable[[int], None]] = None) -> Dict:
+    # Moves every reading older than cutoff_ts into the archive file of its
+    # month. Rollups and alert_events stay in the hot database, so aggregates
+    # over archived months never have to open the archive.
+    conn.isolation_level = None
+    late_before = horizon(conn) or -(1 << 62)
+    user_keys = [row[0] for row in conn.execute("SELECT user_key FROM users")]
+    report = {'rows': 0, 'partitions': []}
+
+    ts = _next_old_ts(conn, user_keys, -(1 << 62), cutoff_ts)
+    while ts is not None:
+        month_start, month_end = month_bounds(ts)
+        end_ts = min(month_end, cutoff_ts)
+        file = partition_file(month_start)
+        os.makedirs(archive_dir, exist_ok=True)
+
+        # Catalogued before the first row leaves the hot table, so readers look
+        # in the archive as soon as there can be something there
+        conn.execute("""
+            INSERT INTO archive_partitions (month_start, month_end, file, archived_before) VALUES (?, ?, ?, ?)
+            ON CONFLICT (month_start) DO NOTHING
+        """, (month_start, month_end, file, month_start))
+        attach(conn, archive_dir, file)
+        try:
+            migrations.create_readings_table(conn.cursor(), 'archive.readings')
+            moved = sum(_move_range(conn, user_key, month_start, end_ts, late_before, chunk_size) for user_key in user_keys)
+        finally:
+            detach(conn)
+        conn.execute("UPDATE archive_partitions SET rows = rows + ?, archived_before = MAX(archived_before, ?) WHERE month_start = ?",
+                     (moved, end_ts, month_start))
+
+        report['rows'] += moved
+        report['partitions'].append(file)
+        if progress:
+            progress(report['rows'])
+        ts = _next_old_ts(conn, user_keys, end_ts, cutoff_ts)
+    return report
+
+def incremental_vacuum(conn: sqlite3.Connection, step_pages: int = 1000) -> int:
+    # Returns freed pages to the file system a step at a time, each step a
+    # short write transaction. Databases created before incremental
+    # auto-vacuum need a one-off full VACUUM first (the CLI's --vacuum).
+    conn.isolation_level = None
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        return 0
+    initial = free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    while free:
+        # executescript steps the pragma to completion; execute() frees one page
+        conn.executescript(f"PRAGMA incremental_vacuum({step_pages})")
+        remaining = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if remaining >= free:
+            break
+        free = remaining
+    return initial - free
+
+def enable_incremental_vacuum(conn: sqlite3.Connection):
+    # Rewrites the whole file, so it holds the write lock for as long as a VACUUM takes
+    conn.isolation_level = None
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
+
+if __name__ == "__main__":
+    # python -m data.retention [db_path] [--days N] [--vacuum]
+    from config import CONFIG
+    from data.database import DatabaseManager
+
+    args = sys.argv[1:]
+    days = CONFIG['retention_days']
+    if '--days' in args:
+        days = float(args.pop(args.index('--days') + 1))
+    args = [arg for arg in args if not arg.startswith('--')]
+    path = args[0] if args else CONFIG['db_name']
+    size_before = os.path.getsize(path)
+
+    db = DatabaseManager(path, archive_dir=CONFIG['archive_dir'])
+    report = db.apply_retention(days, progress=lambda done: print(f"\r{done} rows archived", end='', flush=True))
+    conn = db.connect()
+    incremental = conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    if '--vacuum' in sys.argv and not incremental:
+        enable_incremental_vacuum(conn)
+        incremental = True
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.close()
+    print()
+    print(f"Archived {report['rows']} readings older than {days:g} days into {len(report['partitions'])} partition(s)")
+    print(f"Hot database: {size_before / 1e6:.1f} MB -> {os.path.getsize(path) / 1e6:.1f} MB ({report['freed_pages']} pages freed)"
+          + ("" if incremental else " (run with --vacuum once to enable incremental vacuum)"))
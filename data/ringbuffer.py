@@ -0,0 +1,41 @@
+import numpy as np
+
+class RingBuffer:
+    # Every value is stored twice, at i and i + capacity, so the live window
+    # is always one contiguous slice and view() never has to copy.
+    def __init__(self, capacity: int, dtype=np.float64):
+        self.capacity = capacity
+        self._data = np.zeros(capacity * 2, dtype=dtype)
+        self._start = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def append(self, value):
+        end = (self._start + self._size) % self.capacity
+        self._data[end] = value
+        self._data[end + self.capacity] = value
+        if self._size < self.capacity:
+            self._size += 1
+        else:
+            self._start = (self._start + 1) % self.capacity
+
+    def extend(self, values):
+        values = np.asarray(values, dtype=self._data.dtype)[-self.capacity:]
+        count = len(values)
+        if not count:
+            return
+        positions = (self._start + self._size + np.arange(count)) % self.capacity
+        self._data[positions] = values
+        self._data[positions + self.capacity] = values
+        overflow = max(0, self._size + count - self.capacity)
+        self._size = min(self.capacity, self._size + count)
+        self._start = (self._start + overflow) % self.capacity
+
+    def clear(self):
+        self._start = 0
+        self._size = 0
+
+    def view(self) -> np.ndarray:
+        return self._data[self._start:self._start + self._size]
@@ -0,0 +1,165 @@
+import math
+import sqlite3
+import sys
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from data.models import to_datetime, to_epoch_ms
+
+METRICS = ('glucose', 'ph', 'oxygen')
+
+# name, bucket width in milliseconds
+GRANULARITIES = [
+    ('minute', 60 * 1000),
+    ('hour', 3600 * 1000),
+    ('day', 86400 * 1000),
+]
+
+def table_name(granularity: str) -> str:
+    return f"rollup_{granularity}"
+
+def width_of(granularity: str) -> int:
+    return dict(GRANULARITIES)[granularity]
+
+def create_rollup_tables(cursor: sqlite3.Cursor):
+    metric_columns = ",\n".join(
+        f"{metric}_min REAL, {metric}_max REAL, {metric}_sum REAL, {metric}_sumsq REAL" for metric in METRICS
+    )
+    for granularity, _ in GRANULARITIES:
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table_name(granularity)} (
+                user_key INTEGER NOT NULL,
+                bucket INTEGER NOT NULL,
+                count INTEGER NOT NULL,
+                {metric_columns},
+                PRIMARY KEY (user_key, bucket)
+            ) WITHOUT ROWID
+        ''')
+
+def _select(level: int, source: str) -> str:
+    granularity, width = GRANULARITIES[level]
+    if level == 0:
+        metrics = ", ".join(f"MIN({m}), MAX({m}), SUM({m}), SUM({m} * {m})" for m in METRICS)
+        return f"SELECT user_key, ts / {width} * {width}, COUNT(*), {metrics} FROM {source} WHERE user_key = ? AND ts >= ? AND ts < ?"
+    metrics = ", ".join(f"MIN({m}_min), MAX({m}_max), SUM({m}_sum), SUM({m}_sumsq)" for m in METRICS)
+    finer = table_name(GRANULARITIES[level - 1][0])
+    return f"SELECT user_key, bucket / {width} * {width}, SUM(count), {metrics} FROM {finer} WHERE user_key = ? AND bucket >= ? AND bucket < ?"
+
+def refresh_range(cursor: sqlite3.Cursor, user_key: int, first_ts: int, last_ts: int, source: str = 'readings'):
+    # Buckets are recomputed from the level below rather than incremented, so
+    # refreshing twice, or after a write that turned out to be a duplicate,
+    # never double counts.
+    for level, (granularity, width) in enumerate(GRANULARITIES):
+        start = first_ts // width * width
+        end = last_ts // width * width + width
+        table = table_name(granularity)
+        cursor.execute(f"DELETE FROM {table} WHERE user_key = ? AND bucket >= ? AND bucket < ?", (user_key, start, end))
+        cursor.execute(f"INSERT INTO {table} {_select(level, source)} GROUP BY 1, 2", (user_key, start, end))
+
+def touched_runs(rows: Iterable[Tuple]) -> Dict[int, List[Tuple[int, int]]]:
+    # rows: (user_key, ts, ...). Touched minutes are merged into contiguous
+    # runs, so a live batch or a catch-up backlog costs a single range refresh.
+    width = GRANULARITIES[0][1]
+    minutes: Dict[int, set] = {}
+    for row in rows:
+        minutes.setdefault(row[0], set()).add(row[1] // width)
+
+    runs = {}
+    for user_key, touched in minutes.items():
+        ordered = sorted(touched)
+        user_runs = []
+        start = prev = ordered[0]
+        for minute in ordered[1:]:
+            if minute != prev + 1:
+                user_runs.append((start * width, prev * width))
+                start = minute
+            prev = minute
+        user_runs.append((start * width, prev * width))
+        runs[user_key] = user_runs
+    return runs
+
+def refresh_for_rows(cursor: sqlite3.Cursor, rows: Iterable[Tuple], source: str = 'readings'):
+    for user_key, runs in touched_runs(rows).items():
+        for first_ts, last_ts in runs:
+            refresh_range(cursor, user_key, first_ts, last_ts, source)
+
+def rebuild_rollups(cursor: sqlite3.Cursor, user_key: Optional[int] = None, source: str = 'readings'):
+    if user_key is None:
+        user_keys = [row[0] for row in cursor.execute(f"SELECT DISTINCT user_key FROM {source}").fetchall()]
+    else:
+        user_keys = [user_key]
+    for key in user_keys:
+        first_ts, last_ts = cursor.execute(f"SELECT MIN(ts), MAX(ts) FROM {source} WHERE user_key = ?", (key,)).fetchone()
+        if first_ts is not None:
+            refresh_range(cursor, key, first_ts, last_ts, source)
+
+def bucket_filter(granularity: str, user_key: int, start_date: Optional[datetime],
+                  end_date: Optional[datetime]) -> Tuple[str, list]:
+    where = "user_key = ?"
+    params = [user_key]
+    if start_date:
+        width = width_of(granularity)
+        where += " AND bucket >= ?"
+        params.append(to_epoch_ms(start_date) // width * width)
+    if end_date:
+        where += " AND bucket <= ?"
+        params.append(to_epoch_ms(end_date))
+    return where, params
+
+def cover(start_ts: int, end_ts: int, levels: Sequence[Tuple[str, int]] = GRANULARITIES) -> List[Tuple[Optional[str], int, int]]:
+    # Splits [start_ts, end_ts) into (granularity, low, high) pieces, as
+    # coarse as alignment allows: whole days in the middle, then hours and
+    # minutes towards the edges, and None for the raw sub-minute ends
+    def split(low: int, high: int, level: int):
+        if low >= high:
+            return
+        if level < 0:
+            pieces.append((None, low, high))
+            return
+        granularity, width = levels[level]
+        first, last = -(-low // width) * width, high // width * width
+        if first >= last:
+            split(low, high, level - 1)
+            return
+        split(low, first, level - 1)
+        pieces.append((granularity, first, last))
+        split(last, high, level - 1)
+
+    pieces: List[Tuple[Optional[str], int, int]] = []
+    split(start_ts, end_ts, len(levels) - 1)
+    return pieces
+
+def summarize(row: Tuple) -> Dict:
+    # row: bucket epoch ms, count, then min/max/sum/sumsq per metric
+    count = row[1]
+    summary = {'bucket': to_datetime(row[0]), 'count': count}
+    for i, metric in enumerate(METRICS):
+        low, high, total, total_sq = row[2 + i * 4:6 + i * 4]
+        mean = total / count
+        variance = max(total_sq / count - mean * mean, 0.0)
+        summary[metric] = {'mean': mean, 'min': low, 'max': high, 'std': math.sqrt(variance)}
+    return summary
+
+def merge(a: Tuple, b: Tuple) -> Tuple:
+    # Two partial summaries of the same bucket, in the row layout summarize() takes
+    merged = [a[0], a[1] + b[1]]
+    for i in range(len(METRICS)):
+        offset = 2 + i * 4
+        merged += [min(a[offset], b[offset]), max(a[offset + 1], b[offset + 1]),
+                   a[offset + 2] + b[offset + 2], a[offset + 3] + b[offset + 3]]
+    return tuple(merged)
+
+def granularity_for(resolution: float) -> Optional[str]:
+    chosen = None
+    for granularity, width in GRANULARITIES:
+        if width <= resolution * 1000:
+            chosen = granularity
+    return chosen
+
+if __name__ == "__main__":
+    # python -m data.rollups [db_path] -- backfill rollups for an existing database
+    from config import CONFIG
+    from data.database import DatabaseManager
+
+    db = DatabaseManager(sys.argv[1] if len(sys.argv) > 1 else CONFIG['db_name'])
+    db.rebuild_rollups()
+    print(f"Rollups rebuilt for {db.db_name}")
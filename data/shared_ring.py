@@ -0,0 +1,110 @@
+from multiprocessing import shared_memory
+from typing import Optional, Tuple
+import numpy as np
+from data.models import ReadingBatch
+
+# Packed records as ReadingBatch holds them, so a slice of the ring is a
+# batch without conversion
+RECORD = np.dtype([('ts', '<i8'), ('glucose', '<f4'), ('ph', '<f4'), ('oxygen', '<f4')])
+
+# Header, int64 slots ahead of the records
+WRITTEN, CAPACITY, CONNECTED = range(3)
+HEADER_BYTES = 64
+UNKNOWN = -1
+
+class SharedReadingRing:
+    # Single-producer ring of readings in shared memory: the ingest process
+    # writes, the GUI process reads through NumPy views of the same pages.
+    # As in RingBuffer every record is stored twice, at i and i + capacity,
+    # so any run of up to capacity records is one contiguous slice.
+    #
+    # header[WRITTEN] counts every record ever written and is only advanced
+    # once they are in place; a reader keeps its own count and asks for the
+    # records after it. A reader that falls more than capacity behind loses
+    # the oldest ones. The producer publishes at most capacity // 4 records
+    # at a time, so records a reader got stay intact until WRITTEN passes
+    # their start by three quarters of the ring (see intact()).
+    def __init__(self, memory: shared_memory.SharedMemory, owner: bool):
+        self.memory = memory
+        self.owner = owner
+        self.header = np.ndarray(HEADER_BYTES // 8, dtype=np.int64, buffer=memory.buf)
+        self.capacity = int(self.header[CAPACITY])
+        self.records = np.ndarray(self.capacity * 2, dtype=RECORD, buffer=memory.buf, offset=HEADER_BYTES)
+        self.chunk = max(1, self.capacity // 4)
+
+    @classmethod
+    def create(cls, capacity: int) -> 'SharedReadingRing':
+        memory = shared_memory.SharedMemory(create=True, size=HEADER_BYTES + capacity * 2 * RECORD.itemsize)
+        header = np.ndarray(HEADER_BYTES // 8, dtype=np.int64, buffer=memory.buf)
+        header[:] = 0
+        header[CAPACITY] = capacity
+        header[CONNECTED] = UNKNOWN
+        del header
+        return cls(memory, owner=True)
+
+    @classmethod
+    def attach(cls, name: str) -> 'SharedReadingRing':
+        return cls(shared_memory.SharedMemory(name=name), owner=False)
+
+    @property
+    def name(self) -> str:
+        return self.memory.name
+
+    @property
+    def written(self) -> int:
+        return int(self.header[WRITTEN])
+
+    @property
+    def connected(self) -> Optional[bool]:
+        value = int(self.header[CONNECTED])
+        return None if value == UNKNOWN else bool(value)
+
+    def set_connected(self, connected: bool):
+        self.header[CONNECTED] = int(connected)
+
+    def write(self, batch: ReadingBatch):
+        # Producer side only
+        count = len(batch)
+        if count > self.capacity:
+            # Only the newest capacity records could ever be read; the rest
+            # are left out rather than counted
+            batch = ReadingBatch(*(getattr(batch, name)[-self.capacity:] for name in ReadingBatch.__slots__))
+            count = self.capacity
+        for start in range(0, count, self.chunk):
+            end = min(start + self.chunk, count)
+            written = int(self.header[WRITTEN])
+            positions = (written + np.arange(end - start)) % self.capacity
+            for field, name in zip(RECORD.names, ReadingBatch.__slots__):
+                values = getattr(batch, name)[start:end]
+                self.records[field][positions] = values
+                self.records[field][positions + self.capacity] = values
+            self.header[WRITTEN] = written + end - start
+
+    def read(self, since: int) -> Tuple[np.ndarray, int, int]:
+        # (records, start, end): a view of the records numbered start to end,
+        # the ones written after since that are still in the ring. start > since
+        # means start - since records were overwritten before they were read.
+        end = self.written
+        start = max(since, end - self.capacity + self.chunk)
+        if start >= end:
+            return self.records[:0], end, end
+        offset = start % self.capacity
+        return self.records[offset:offset + end - start], start, end
+
+    def intact(self, start: int) -> bool:
+        # Whether records read from start on can't have been overwritten since
+        return self.written + self.chunk - self.capacity <= start
+
+    def batch(self, records: np.ndarray) -> ReadingBatch:
+        # A ReadingBatch over the records' own memory
+        return ReadingBatch(records['ts'], records['glucose'], records['ph'], records['oxygen'])
+
+    def close(self):
+        # Views must go before the mapping can be released
+        self.header = self.records = None
+        try:
+            self.memory.close()
+        except BufferError:
+            pass  # a view is still held somewhere; the mapping goes with it
+        if self.owner:
+            self.memory.unlink()
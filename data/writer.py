@@ -0,0 +1,163 @@
+import queue
+import threading
+import time
+import sqlite3
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from data.instrumentation import metrics
+
+_STOP = object()
+
+class AlertEvents(NamedTuple):
+    # Queued beside readings: alert_events rows without their user_key
+    user_id: str
+    values: List[Tuple]
+
+
+class ReadingWriter(threading.Thread):
+    def __init__(self, db_manager, batch_size: int = 200, flush_interval: float = 1.0):
+        super().__init__(name="ReadingWriter", daemon=True)
+        self.db_manager = db_manager
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue()
+        self._pending = 0
+        self._closed = False
+
+        self.rows_written = 0
+        self.rows_failed = 0
+        self.commit_count = 0
+        self.last_commit_latency = 0.0
+        self.max_commit_latency = 0.0
+        self._total_commit_latency = 0.0
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() + self._pending
+
+    def put(self, row: Tuple):
+        self._queue.put(row)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        if not self.is_alive():
+            return False
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout: Optional[float] = None):
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        if self.is_alive():
+            self.join(timeout)
+
+    def stats(self) -> Dict:
+        return {
+            'queue_depth': self.queue_depth,
+            'rows_written': self.rows_written,
+            'rows_failed': self.rows_failed,
+            'commits': self.commit_count,
+            'last_commit_ms': self.last_commit_latency * 1000,
+            'max_commit_ms': self.max_commit_latency * 1000,
+            'avg_commit_ms': (self._total_commit_latency / self.commit_count * 1000) if self.commit_count else 0.0,
+        }
+
+    def run(self):
+        conn = self.db_manager.connect()
+        conn.execute("PRAGMA synchronous=NORMAL")
+        batch: List[Tuple] = []
+        deadline = None
+        try:
+            while True:
+                timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    item = None
+
+                if item is _STOP:
+                    break
+                if isinstance(item, threading.Event):
+                    self._commit(conn, batch)
+                    batch, deadline = [], None
+                    item.set()
+                    continue
+                if item is not None:
+                    batch.append(item)
+                    self._pending = len(batch)
+                    if deadline is None:
+                        deadline = time.monotonic() + self.flush_interval
+
+                if len(batch) >= self.batch_size or (batch and time.monotonic() >= deadline):
+                    self._commit(conn, batch)
+                    batch, deadline = [], None
+        finally:
+            # Anything queued before close() must still reach disk
+            waiters = []
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if isinstance(item, threading.Event):
+                    waiters.append(item)
+                elif item is not _STOP:
+                    batch.append(item)
+            self._commit(conn, batch)
+            conn.close()
+            for waiter in waiters:
+                waiter.set()
+
+    def _insert(self, cursor: sqlite3.Cursor, items: List[Tuple]):
+        rows = [item for item in items if not isinstance(item, AlertEvents)]
+        if rows:
+            self.db_manager.insert_rows(cursor, rows)
+        for item in items:
+            if isinstance(item, AlertEvents):
+                self.db_manager.insert_alert_events(cursor, item.user_id, item.values)
+
+    def _commit_rows(self, conn: sqlite3.Connection, batch: List[Tuple]) -> List[Tuple]:
+        # After a failed batch: one transaction per item, so a bad row only loses itself
+        written = []
+        for item in batch:
+            try:
+                with conn:
+                    self._insert(conn.cursor(), [item])
+            except sqlite3.Error:
+                self.db_manager.forget_user_keys([item[0]])
+            else:
+                written.append(item)
+        return written
+
+    def _commit(self, conn: sqlite3.Connection, batch: List[Tuple]):
+        if not batch:
+            return
+        started = time.perf_counter()
+        readings = [item for item in batch if not isinstance(item, AlertEvents)]
+        try:
+            with conn:
+                self._insert(conn.cursor(), batch)
+            written = readings
+        except sqlite3.Error as e:
+            # Keys of users first seen in this batch were rolled back with it
+            self.db_manager.forget_user_keys({item[0] for item in batch})
+            stored = self._commit_rows(conn, batch) if len(batch) > 1 else []
+            written = [item for item in stored if not isinstance(item, AlertEvents)]
+            failed = len(readings) - len(written)
+            alerts_failed = len(batch) - len(readings) - (len(stored) - len(written))
+            print(f"Failed to write {failed} of {len(readings)} readings"
+                  f"{f' and {alerts_failed} alert updates' if alerts_failed else ''}: {e}")
+            self.rows_failed += failed
+        if written:
+            self.rows_written += len(written)
+            metrics.count('db.rows_written', len(written))
+            self.db_manager.rows_written(written)
+        latency = time.perf_counter() - started
+        metrics.observe('db.commit', latency)
+        metrics.gauge('db.queue_depth', self._queue.qsize())
+        self.commit_count += 1
+        self.last_commit_latency = latency
+        self.max_commit_latency = max(self.max_commit_latency, latency)
+        self._total_commit_latency += latency
+        self._pending = 0
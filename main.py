@@ -1,53 +1,270 @@
 import sys
-from PyQt5.QtWidgets import QApplication, QMainWindow, QTabWidget
+import time
+
+STARTED = time.perf_counter()
+
+import argparse
+import importlib
+import sqlite3
+import threading
+from PyQt5.QtWidgets import QApplication, QMainWindow, QMessageBox, QPushButton, QTabWidget
 from PyQt5.QtGui import QIcon
+from PyQt5.QtCore import QEvent, QObject, QTimer
 
-from data.database import DatabaseManager
-from auth.auth_service import AuthService
+from auth.auth_service import AuthService, TokenCache
+from threads.auth_thread import AuthThread
 from ui.login import LoginWindow
-from ui.dashboard import DashboardWidget
-from ui.history import HistoryWidget
-from ui.settings import SettingsWidget
 from config import CONFIG
 
+# Everything behind the login window: matplotlib, numpy and requests alone
+# cost more than half a second, so they load on a background thread while
+# the user is typing
+PRELOAD_MODULES = [
+    'numpy',
+    'requests',
+    'matplotlib.backends.backend_qt5agg',
+    'data.database',
+    'ui.widgets',
+    'ui.dashboard',
+    'ui.history',
+    'ui.settings',
+    'ui.diagnostics',
+]
+
+class Preloader(threading.Thread):
+    def __init__(self, modules):
+        super().__init__(name="Preloader", daemon=True)
+        self.modules = modules
+        self.timings = {}
+
+    def run(self):
+        for name in self.modules:
+            started = time.perf_counter()
+            try:
+                importlib.import_module(name)
+            except Exception as e:
+                print(f"Preloading {name} failed: {e}")
+            self.timings[name] = time.perf_counter() - started
+
+class FirstPaint(QObject):
+    def __init__(self, widget, callback):
+        super().__init__(widget)
+        self.callback = callback
+        widget.installEventFilter(self)
+
+    def eventFilter(self, watched, event):
+        if event.type() == QEvent.Paint:
+            watched.removeEventFilter(self)
+            QTimer.singleShot(0, self.callback)
+        return False
+
 class MainWindow(QMainWindow):
-    def __init__(self):
+    def __init__(self, preloader: Preloader, restore_session: bool = True, replay=None):
         super().__init__()
         self.setWindowTitle(CONFIG['app_name'])
         self.setMinimumSize(1000, 700)
 
         self.tabs = QTabWidget()
         self.setCentralWidget(self.tabs)
+        sign_out_btn = QPushButton("Sign Out")
+        sign_out_btn.clicked.connect(self.sign_out)
+        self.tabs.setCornerWidget(sign_out_btn)
 
-        self.db_manager = DatabaseManager(CONFIG['db_name'])
-        self.auth_service = AuthService()
+        self.preloader = preloader
+        self.db_manager = None
+        self.auth_service = AuthService(token_cache=TokenCache(CONFIG['session_file']))
+        self.auth_thread = AuthThread(self.auth_service)
+        self.auth_thread.call_finished.connect(self.on_auth_call_finished)
         self.current_user = None
+        # (filename, speed, loop) to play back on the dashboard instead of the band
+        self.replay = replay
 
-        self.login_window = LoginWindow(self.auth_service)
+        self.login_window = LoginWindow(self.auth_service, self.auth_thread)
         self.login_window.login_successful.connect(self.on_login_success)
+
+        # The ID token is refreshed in the background, at startup and before it expires
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.timeout.connect(self.refresh_session_if_needed)
+        self.refresh_timer.start(60 * 1000)
+
+        user = self.auth_service.restore_session() if restore_session else None
+        if user is not None:
+            QTimer.singleShot(0, lambda: self.on_login_success(user))
+            self.auth_thread.submit('refresh')
+        else:
+            self.login_window.show()
+
+    def refresh_session_if_needed(self):
+        if self.auth_service.needs_refresh():
+            self.auth_thread.submit('refresh')
+
+    def on_auth_call_finished(self, operation: str, success: bool, message: str):
+        if (operation == 'refresh' and not success and self.current_user is not None
+                and not self.auth_service.is_authenticated()):
+            # The cached session was rejected (revoked, password changed); offline failures keep it,
+            # and a refresh that finishes after the user signed out is ignored
+            QMessageBox.warning(self, "Session expired", f"Please sign in again.\n{message}")
+            self.sign_out()
+
+    def sign_out(self):
+        if hasattr(self, 'dashboard'):
+            self.dashboard.stop_monitoring()
+            self.diagnostics.finish_capture()
+            del self.dashboard
+        if hasattr(self, 'history'):
+            self.history.stop_loading()
+        self.tabs.clear()
+        self.auth_service.logout()
+        self.current_user = None
         self.login_window.show()
 
     def on_login_success(self, user):
         self.current_user = user
         self.login_window.close()
 
+        # Normally finished long before the user has typed a password
+        self.preloader.join()
+        from data.alerts import Thresholds
+        from ui.dashboard import DashboardWidget
+        from data.instrumentation import metrics
+        from ui.diagnostics import DiagnosticsWidget
+        from ui.history import HistoryWidget
+        from ui.settings import SettingsWidget
+
+        if self.db_manager is None:
+            self.db_manager = self.open_database()
         self.dashboard = DashboardWidget(self.db_manager)
         self.history = HistoryWidget(self.db_manager)
-        self.settings = SettingsWidget()
+        self.settings = SettingsWidget(self.db_manager)
+        self.diagnostics = DiagnosticsWidget(self.db_manager)
+        if CONFIG['diagnostics_enabled']:
+            metrics.enable()
+            self.diagnostics.enabled_check.setChecked(True)
+        self.settings.thresholds_changed.connect(lambda values: self.dashboard.set_thresholds(Thresholds.from_settings(values)))
 
         self.tabs.addTab(self.dashboard, "Dashboard")
         self.tabs.addTab(self.history, "History")
         self.tabs.addTab(self.settings, "Settings")
+        self.tabs.addTab(self.diagnostics, "Diagnostics")
 
-        self.dashboard.start_monitoring(user, CONFIG['esp32_default_ip'])
+        self.settings.set_user(user)
+        self.dashboard.set_thresholds(Thresholds.from_settings(self.settings.alert_settings()))
+        if self.replay:
+            self.dashboard.start_replay(user, *self.replay)
+        else:
+            self.dashboard.start_monitoring(user, CONFIG['esp32_default_ip'])
         self.history.set_user(user)
 
+    def open_database(self):
+        from biotrack.ingest import read_status
+        from data.database import DatabaseManager
+
+        mode = CONFIG['ingest_mode']
+        if mode in ('auto', 'process'):
+            # A daemon already running owns the band and the writes
+            running = read_status(CONFIG['ingest_status_file'], CONFIG['ingest_status_interval'] * 3)
+            if running:
+                mode = 'attach'
+            elif mode == 'auto':
+                mode = 'local'
+        if mode == 'attach':
+            # The daemon writes and archives; this window only reads
+            try:
+                db_manager = DatabaseManager(CONFIG['db_name'], archive_dir=CONFIG['archive_dir'], read_only=True,
+                                             cache_bytes=CONFIG['query_cache_mb'] << 20)
+                self.setWindowTitle(f"{CONFIG['app_name']} (attached to ingest daemon)")
+                return db_manager
+            except sqlite3.Error as e:
+                QMessageBox.warning(self, "Attach failed",
+                                    f"Could not open {CONFIG['db_name']} read-only: {e}\nRecording locally instead.")
+
+        db_manager = DatabaseManager(
+            CONFIG['db_name'],
+            batch_size=CONFIG['db_batch_size'],
+            flush_interval=CONFIG['db_flush_interval'] / 1000,
+            archive_dir=CONFIG['archive_dir'],
+            cache_bytes=CONFIG['query_cache_mb'] << 20,
+            shared=mode == 'process'
+        )
+        # In process mode the dashboard's ingest process runs retention
+        if mode != 'process':
+            threading.Thread(target=db_manager.apply_retention, args=(CONFIG['retention_days'],),
+                             name="Retention", daemon=True).start()
+        return db_manager
+
+    def closeEvent(self, event):
+        if hasattr(self, 'dashboard'):
+            self.dashboard.stop_monitoring()
+            self.diagnostics.finish_capture()
+        if hasattr(self, 'history'):
+            self.history.stop_loading()
+        from threads.esp_thread import DeviceProbe
+        DeviceProbe.wait_detached()
+        if self.db_manager is not None:
+            self.db_manager.close()
+        self.auth_thread.stop()
+        super().closeEvent(event)
+
+def profile_startup(app: QApplication, window: MainWindow, imported: float):
+    # --profile-startup: logs in as a local profiling user as soon as the login
+    # window has painted, reports the timeline once the dashboard has painted, then quits
+    marks = {'main imports': imported}
+    preload_wait = 0.0
+
+    def mark(name):
+        marks[name] = time.perf_counter() - STARTED
+
+    def on_dashboard_paint():
+        mark('dashboard first paint')
+        print("Startup profile (seconds since main.py started, interpreter start-up excluded)")
+        for name, at in marks.items():
+            print(f"  {name:28} {at:7.3f}")
+        print(f"Background imports (login waited {preload_wait:.3f} s for them):")
+        for name, took in window.preloader.timings.items():
+            print(f"  {name:36} {took:7.3f}")
+        app.quit()
+
+    def on_login_paint():
+        nonlocal preload_wait
+        mark('login first paint')
+        waited = time.perf_counter()
+        window.preloader.join()
+        preload_wait = time.perf_counter() - waited
+        from data.models import User
+        window.on_login_success(User('startup-profile', 'profile@localhost', ''))
+        mark('dashboard built')
+        FirstPaint(window.dashboard, on_dashboard_paint)
+
+    FirstPaint(window.login_window, on_login_paint)
+
+def parse_args() -> argparse.Namespace:
+    # Unknown arguments are left for Qt (-style, -platform and the like)
+    parser = argparse.ArgumentParser(description=CONFIG['app_name'])
+    parser.add_argument('--profile-startup', action='store_true',
+                        help="sign in as a local user, print the startup timeline and quit")
+    parser.add_argument('--replay', metavar='CSV',
+                        help="play a recorded CSV (an export) on the dashboard instead of reading the band")
+    parser.add_argument('--replay-speed', type=float, default=1.0, metavar='N', help="1 to 1000 times real time")
+    parser.add_argument('--replay-loop', action='store_true', help="start over when the recording ends")
+    args, _ = parser.parse_known_args()
+    if not 1 <= args.replay_speed <= 1000:
+        parser.error("--replay-speed must be between 1 and 1000")
+    return args
+
 if __name__ == "__main__":
+    imported = time.perf_counter() - STARTED
+    args = parse_args()
     app = QApplication(sys.argv)
     app.setApplicationName(CONFIG['app_name'])
     app.setApplicationVersion(CONFIG['version'])
     app.setWindowIcon(QIcon("resources/bioicon.png"))
 
-    window = MainWindow()
+    preloader = Preloader(PRELOAD_MODULES)
+    preloader.start()
+
+    replay = (args.replay, args.replay_speed, args.replay_loop) if args.replay else None
+    window = MainWindow(preloader, restore_session=not args.profile_startup, replay=replay)
+    if args.profile_startup:
+        profile_startup(app, window, imported)
     window.show()
     sys.exit(app.exec_())
@@ -0,0 +1,113 @@
+import threading
+import time
+from typing import Dict, Optional
+import pytest
+from PyQt5.QtCore import Qt
+from auth.auth_service import AuthError, AuthService, FirebaseBackend, TokenCache
+from threads.auth_thread import AuthThread
+
+class BlockingBackend:
+    # refresh() waits until the test releases it, standing in for a slow network
+    def __init__(self, error: Optional[Exception] = None):
+        self.error = error
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def refresh(self, refresh_token: str) -> Dict:
+        self.started.set()
+        assert self.release.wait(5)
+        if self.error is not None:
+            raise self.error
+        return {'uid': 'alice', 'id_token': 'new-token', 'refresh_token': 'new-refresh', 'expires_at': time.time() + 3600}
+
+def session(uid: str = 'alice') -> Dict:
+    return {'uid': uid, 'email': f"{uid}@example.com", 'id_token': 'old-token', 'refresh_token': 'old-refresh',
+            'expires_at': time.time()}
+
+def refresh_during(service: AuthService, backend: BlockingBackend, action):
+    # Runs action() while a refresh is in flight on another thread
+    results = []
+    thread = threading.Thread(target=lambda: results.append(service.refresh()))
+    thread.start()
+    assert backend.started.wait(5)
+    action()
+    backend.release.set()
+    thread.join(5)
+    return results[0]
+
+def test_refresh_updates_session(tmp_path):
+    backend = BlockingBackend()
+    backend.release.set()
+    cache = TokenCache(str(tmp_path / 'session.json'))
+    service = AuthService(backend, cache)
+    service.start_session(session())
+    assert service.refresh() == (True, "Session refreshed")
+    assert service.current_user.token == 'new-token'
+    assert cache.load()['refresh_token'] == 'new-refresh'
+
+def test_logout_during_refresh_drops_result(tmp_path):
+    backend = BlockingBackend()
+    cache = TokenCache(str(tmp_path / 'session.json'))
+    service = AuthService(backend, cache)
+    service.start_session(session())
+    success, _ = refresh_during(service, backend, service.logout)
+    assert not success
+    assert service.session is None and not service.is_authenticated()
+    assert cache.load() is None
+
+def test_sign_in_during_refresh_keeps_new_session(tmp_path):
+    backend = BlockingBackend()
+    cache = TokenCache(str(tmp_path / 'session.json'))
+    service = AuthService(backend, cache)
+    service.start_session(session())
+    success, _ = refresh_during(service, backend, lambda: service.start_session(session('bob')))
+    assert not success
+    assert service.current_user.uid == 'bob' and service.session['id_token'] == 'old-token'
+    assert cache.load()['uid'] == 'bob'
+
+def test_rejected_refresh_ends_only_its_own_session(tmp_path):
+    backend = BlockingBackend(AuthError("TOKEN_EXPIRED"))
+    cache = TokenCache(str(tmp_path / 'session.json'))
+    service = AuthService(backend, cache)
+    service.start_session(session())
+    success, _ = refresh_during(service, backend, lambda: service.start_session(session('bob')))
+    assert not success
+    assert service.current_user.uid == 'bob'
+    assert cache.load()['uid'] == 'bob'
+
+class CannedBackend(FirebaseBackend):
+    # Answers every call with the same 200 response body
+    def __init__(self, data: Dict):
+        super().__init__(api_key='test')
+        self.data = data
+
+    def post(self, url: str, **kwargs) -> Dict:
+        return self.data
+
+def test_response_missing_fields_is_an_auth_error():
+    backend = CannedBackend({'localId': 'alice', 'email': 'alice@example.com'})
+    with pytest.raises(AuthError):
+        backend.sign_in('alice@example.com', 'secret')
+    with pytest.raises(AuthError):
+        backend.refresh('old-refresh')
+    assert AuthService(backend).sign_in('alice@example.com', 'secret')[0] is False
+
+class FailingService:
+    def __init__(self):
+        self.backend = CannedBackend({})
+
+    def sign_in(self, email: str, password: str):
+        raise RuntimeError("boom")
+
+    def reset_password(self, email: str):
+        return True, "sent"
+
+def test_auth_thread_reports_a_failing_call_and_carries_on():
+    results = []
+    thread = AuthThread(FailingService())
+    # Direct: the test has no event loop to deliver queued signals
+    thread.call_finished.connect(lambda *result: results.append(result), Qt.DirectConnection)
+    thread.submit('sign_in', 'alice@example.com', 'secret')
+    thread.submit('reset_password', 'alice@example.com')
+    thread.stop()
+    assert results == [('sign_in', False, 'boom'), ('reset_password', True, 'sent')]
@@ -0,0 +1,77 @@
+from datetime import datetime, timedelta
+from typing import List
+import pytest
+from data.database import DatabaseManager
+from data.models import BiometricReading
+
+# The paging and counting queries behind the History tab must stay index
+# searches: a SCAN or a temp B-tree sort grows with the table, not the page.
+
+START = datetime(2026, 1, 1)
+END = START + timedelta(hours=2)
+
+@pytest.fixture
+def db(tmp_path):
+    db = DatabaseManager(str(tmp_path / 'plans.db'))
+    for user_id in ('alice', 'bob'):
+        db.queue_readings(user_id, [BiometricReading(START + timedelta(minutes=minute), 100.0, 7.4, 98.0)
+                                    for minute in range(120)])
+    assert db.flush(10)
+    yield db
+    db.close()
+
+def traced(db: DatabaseManager, call) -> List[str]:
+    # The statements call() runs, with their parameters filled in
+    statements: List[str] = []
+    connect = db.connect
+
+    def tracing_connect(**options):
+        conn = connect(**options)
+        conn.set_trace_callback(statements.append)
+        return conn
+
+    db.connect = tracing_connect
+    try:
+        call()
+    finally:
+        db.connect = connect
+    return [statement for statement in statements if statement.lstrip().upper().startswith('SELECT')]
+
+def plan(db: DatabaseManager, statement: str) -> List[str]:
+    conn = db.connect()
+    try:
+        return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {statement}")]
+    finally:
+        conn.close()
+
+def assert_searches(db: DatabaseManager, call, table: str):
+    statements = [statement for statement in traced(db, call) if f"FROM {table} " in statement]
+    assert statements, f"no query on {table}"
+    for statement in statements:
+        details = plan(db, statement)
+        assert any(detail.startswith(f"SEARCH {table} USING") and ('PRIMARY KEY' in detail or 'INDEX' in detail)
+                   for detail in details), (statement, details)
+        assert not any('USE TEMP B-TREE' in detail for detail in details), (statement, details)
+        assert not any(detail.startswith('SCAN') for detail in details), (statement, details)
+
+@pytest.mark.parametrize('order', ['asc', 'desc'])
+@pytest.mark.parametrize('start, end', [(START, END), (None, END), (START, None), (None, None)])
+def test_get_rows_page_searches_primary_key(db, order, start, end):
+    assert_searches(db, lambda: db.get_rows_page('alice', start, end, limit=50, order=order), 'readings')
+
+@pytest.mark.parametrize('order', ['asc', 'desc'])
+def test_get_rows_page_after_cursor_searches_primary_key(db, order):
+    after = START + timedelta(minutes=60)
+    assert_searches(db, lambda: db.get_rows_page('alice', START, END, after_ts=after, limit=50, order=order), 'readings')
+
+def test_get_readings_page_searches_primary_key(db):
+    assert_searches(db, lambda: db.get_readings_page('alice', START, END, limit=50), 'readings')
+
+def test_estimate_reading_count_searches_primary_key(db):
+    assert_searches(db, lambda: db.estimate_reading_count('alice', START, END), 'rollup_minute')
+
+def test_pages_return_one_users_rows_in_order(db):
+    rows = db.get_rows_page('alice', START, END, limit=50, order='asc')
+    assert len(rows) == 50
+    assert [row[0] for row in rows] == sorted(row[0] for row in rows)
+    assert db.estimate_reading_count('alice', START, END) == 120
@@ -0,0 +1,170 @@
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+import pytest
+from data.models import to_epoch_ms
+from threads.sources import StreamSource
+from threads.stream_parser import SampleParser
+
+START_MS = 1767225600000
+SAMPLES = [{'timestamp': START_MS + i * 1000, 'glucose': 100.0 + i, 'ph': 7.4, 'oxygen': 98.0} for i in range(20)]
+
+def ndjson(samples) -> bytes:
+    return b''.join(json.dumps(sample).encode() + b'\n' for sample in samples)
+
+def sse(samples) -> bytes:
+    return b''.join(b': keep-alive\r\nevent: sample\r\ndata: ' + json.dumps(sample).encode() + b'\r\n\r\n'
+                    for sample in samples)
+
+def feed_in_pieces(parser: SampleParser, data: bytes, size: int) -> List:
+    samples = []
+    for start in range(0, len(data), size):
+        samples += parser.feed(data[start:start + size])
+    return samples
+
+@pytest.mark.parametrize('size', [1, 7, 64, 1 << 16])
+def test_ndjson_split_anywhere(size):
+    parser = SampleParser('ndjson')
+    assert feed_in_pieces(parser, ndjson(SAMPLES), size) == SAMPLES
+    assert parser.buffer == b'' and parser.errors == 0
+
+@pytest.mark.parametrize('size', [1, 7, 64, 1 << 16])
+def test_sse_split_anywhere(size):
+    parser = SampleParser('sse')
+    assert feed_in_pieces(parser, sse(SAMPLES), size) == SAMPLES
+    assert parser.errors == 0
+
+def test_sse_joins_multiline_data():
+    parser = SampleParser('sse')
+    assert parser.feed(b'data: {"a":\ndata: 1}\n\n') == [{'a': 1}]
+
+def test_incomplete_line_waits_for_the_rest():
+    parser = SampleParser('ndjson')
+    assert parser.feed(b'{"a": 1}\n{"b"') == [{'a': 1}]
+    assert parser.feed(b': 2}\n') == [{'b': 2}]
+
+def test_malformed_lines_are_counted_and_skipped():
+    parser = SampleParser('ndjson')
+    assert parser.feed(b'{"a": 1}\nnot json\n\n{"b": 2}\n') == [{'a': 1}, {'b': 2}]
+    assert parser.errors == 1
+
+def test_runaway_line_is_dropped():
+    parser = SampleParser('ndjson', max_buffer=16)
+    parser.feed(b'x' * 32)
+    assert parser.buffer == b'' and parser.errors == 1
+    assert parser.feed(b'{"a": 1}\n') == [{'a': 1}]
+
+def test_unknown_framing():
+    with pytest.raises(ValueError):
+        SampleParser('xml')
+
+class StreamHandler(BaseHTTPRequestHandler):
+    # /stream?format=sse|ndjson as chunked HTTP, cut into pieces that split samples
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.close_connection = True
+        body = sse(SAMPLES) if 'format=sse' in self.path else ndjson(SAMPLES)
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream' if 'format=sse' in self.path else 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        try:
+            for start in range(0, len(body), 37):
+                chunk = body[start:start + 37]
+                self.wfile.write(b'%x\r\n%s\r\n' % (len(chunk), chunk))
+                self.wfile.flush()
+            self.wfile.write(b'0\r\n\r\n')
+        except OSError:
+            pass  # the source hung up after it had enough
+
+    def log_message(self, *args):
+        pass
+
+class HangUpHandler(BaseHTTPRequestHandler):
+    # Accepts the stream and ends it straight away, counting the attempts
+    protocol_version = 'HTTP/1.1'
+    requests = 0
+
+    def do_GET(self):
+        HangUpHandler.requests += 1
+        self.close_connection = True
+        self.send_response(200)
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        self.wfile.write(b'0\r\n\r\n')
+
+    def log_message(self, *args):
+        pass
+
+def serve(handler):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def server():
+    yield from serve(StreamHandler)
+
+@pytest.fixture
+def hang_up_server():
+    HangUpHandler.requests = 0
+    yield from serve(HangUpHandler)
+
+def collect(source: StreamSource, received: List, count: int, start=None, timeout: float = 5.0):
+    # Runs the source until it has delivered count readings, then stops it
+    thread = threading.Thread(target=source.run, daemon=True)
+    thread.start()
+    if start is not None:
+        start()
+    deadline = time.monotonic() + timeout
+    while len(received) < count and time.monotonic() < deadline:
+        time.sleep(0.02)
+    source.stop()
+    thread.join(5)
+    assert not thread.is_alive()
+
+@pytest.mark.parametrize('transport', ['sse', 'chunked'])
+def test_stream_source_over_http(server, transport):
+    received = []
+    source = StreamSource(server, received.extend, transport=transport)
+    collect(source, received, len(SAMPLES))
+    assert [to_epoch_ms(reading.timestamp) for reading in received[:len(SAMPLES)]] == [s['timestamp'] for s in SAMPLES]
+    assert [reading.glucose for reading in received[:len(SAMPLES)]] == [s['glucose'] for s in SAMPLES]
+    assert source.parse_errors == 0
+
+def test_stream_that_ends_is_a_drop_and_backs_off(hang_up_server):
+    statuses = []
+    source = StreamSource(hang_up_server, lambda readings: None, statuses.append, transport='chunked')
+    thread = threading.Thread(target=source.run, daemon=True)
+    thread.start()
+    time.sleep(2.0)
+    source.stop()
+    thread.join(5)
+    # Backoff of 1-2 s, then 2-4 s: a tight loop would make hundreds of requests
+    assert 1 <= HangUpHandler.requests <= 3
+    assert statuses[-1] is False
+
+def test_stream_source_over_udp():
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+    received = []
+    connected = threading.Event()
+    source = StreamSource('127.0.0.1', received.extend, lambda ok: ok and connected.set(), transport='udp', udp_port=port)
+
+    def send():
+        assert connected.wait(5)
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sender:
+            # Two samples in one datagram, the last without its newline
+            for start in range(0, len(SAMPLES), 2):
+                sender.sendto(ndjson(SAMPLES[start:start + 2]).rstrip(b'\n'), ('127.0.0.1', port))
+
+    collect(source, received, len(SAMPLES), send)
+    assert [to_epoch_ms(reading.timestamp) for reading in received] == [s['timestamp'] for s in SAMPLES]
@@ -0,0 +1,43 @@
+import queue
+from PyQt5.QtCore import QThread, pyqtSignal
+from auth.auth_service import AuthService
+
+_STOP = object()
+
+
+class AuthThread(QThread):
+    # Runs AuthService calls one at a time off the GUI thread. Every call
+    # reports back through call_finished(operation, ok, message).
+    call_finished = pyqtSignal(str, bool, str)
+
+    OPERATIONS = ('sign_in', 'sign_up', 'reset_password', 'refresh')
+
+    def __init__(self, auth_service: AuthService):
+        super().__init__()
+        self.auth_service = auth_service
+        self.jobs = queue.Queue()
+
+    def submit(self, operation: str, *args):
+        if operation not in self.OPERATIONS:
+            raise ValueError(f"Unknown auth operation: {operation}")
+        self.jobs.put((operation, args))
+        if not self.isRunning():
+            self.start()
+
+    def run(self):
+        while True:
+            job = self.jobs.get()
+            if job is _STOP:
+                break
+            operation, args = job
+            # Whatever goes wrong, the caller hears back and the thread lives on
+            try:
+                ok, message = getattr(self.auth_service, operation)(*args)
+            except Exception as e:
+                ok, message = False, str(e)
+            self.call_finished.emit(operation, ok, message)
+        self.auth_service.backend.close()
+
+    def stop(self):
+        self.jobs.put(_STOP)
+        self.wait()
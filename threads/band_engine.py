@@ -0,0 +1,309 @@
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple
+from data.models import BiometricReading, to_epoch_ms
+from threads.sources import backoff_delay
+from threads.stream_parser import SampleParser
+
+# One asyncio loop on one thread serves every band: a device costs a
+# coroutine and a keep-alive socket instead of a QThread and a requests.Session.
+
+Batch = List[Tuple[str, BiometricReading]]
+
+class HttpError(Exception):
+    pass
+
+class HttpConnection:
+    # Minimal HTTP/1.1 keep-alive client for the band's tiny GET endpoints
+    def __init__(self, address: str):
+        host, _, port = address.partition(':')
+        self.host = host
+        self.port = int(port or 80)
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+
+    async def request(self, path: str, headers: str = '') -> Tuple[int, Dict[str, str]]:
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        self.writer.write(f"GET {path} HTTP/1.1\r\nHost: {self.host}\r\n{headers}\r\n".encode())
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise HttpError("connection closed")
+        status = int(status_line.split()[1])
+        response_headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            response_headers[name.strip().lower()] = value.strip()
+        return status, response_headers
+
+    async def get(self, path: str) -> Tuple[int, bytes]:
+        status, headers = await self.request(path)
+        if 'content-length' in headers:
+            body = await self.reader.readexactly(int(headers['content-length']))
+        elif headers.get('transfer-encoding') == 'chunked':
+            body = b''.join([chunk async for chunk in self.chunks()])
+        else:
+            body = await self.reader.read()
+            self.close()
+        if headers.get('connection', '').lower() == 'close':
+            self.close()
+        return status, body
+
+    async def chunks(self):
+        while True:
+            size = int((await self.reader.readline()).split(b';')[0], 16)
+            if size == 0:
+                await self.reader.readline()
+                return
+            chunk = await self.reader.readexactly(size)
+            await self.reader.readexactly(2)
+            yield chunk
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+class Device:
+    TRANSPORTS = ('poll', 'sse', 'chunked')
+
+    def __init__(self, device_id: str, address: str, user_id: Optional[str] = None, transport: str = 'poll',
+                 interval: float = 1.0, timeout: float = 3.0, max_backoff: float = 60.0,
+                 since: Optional[int] = None, catch_up_limit: int = 500):
+        if transport not in self.TRANSPORTS:
+            raise ValueError(f"Unknown transport: {transport}")
+        self.device_id = device_id
+        self.address = address
+        self.user_id = user_id if user_id is not None else device_id
+        self.transport = transport
+        self.interval = interval
+        self.timeout = timeout
+        self.max_backoff = max_backoff
+
+        self.connected = False
+        self.last_seen: Optional[float] = None
+        # Epoch ms of the newest sample seen; a poll device catches up from it
+        # after a gap, as PollingSource does
+        self.last_ts: Optional[int] = since
+        self.catch_up_limit = catch_up_limit
+        self.catch_up_supported = True
+        self.samples = 0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.latencies = deque(maxlen=256)
+
+    def health(self) -> Dict:
+        samples = sorted(self.latencies)
+        return {
+            'address': self.address,
+            'transport': self.transport,
+            'connected': self.connected,
+            'age_s': None if self.last_seen is None else time.monotonic() - self.last_seen,
+            'samples': self.samples,
+            'requests': self.requests,
+            'failures': self.failures,
+            'p50_ms': samples[len(samples) // 2] * 1000 if samples else None,
+        }
+
+class BandEngine:
+    def __init__(self, sink: Callable[[Batch], None], flush_interval: float = 0.1,
+                 on_status: Optional[Callable[[Device, bool], None]] = None):
+        self.sink = sink
+        # Called on the loop thread when a device connects or drops
+        self.on_status = on_status
+        self.flush_interval = flush_interval
+        self.devices: Dict[str, Device] = {}
+        self.tasks: Dict[str, asyncio.Task] = {}
+        self.pending: Batch = []
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.thread: Optional[threading.Thread] = None
+        self.stopping: Optional[asyncio.Event] = None
+        self.ready = threading.Event()
+        self.max_lag = 0.0
+
+    def add_device(self, device: Device):
+        self.devices[device.device_id] = device
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self._spawn, device)
+
+    def remove_device(self, device_id: str):
+        self.devices.pop(device_id, None)
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self._cancel, device_id)
+
+    def health(self) -> Dict[str, Dict]:
+        return {device_id: device.health() for device_id, device in list(self.devices.items())}
+
+    def start(self) -> 'BandEngine':
+        self.thread = threading.Thread(target=self.run, name="BandEngine", daemon=True)
+        self.thread.start()
+        self.ready.wait()
+        return self
+
+    def stop(self, timeout: Optional[float] = None):
+        if self.loop is not None and self.stopping is not None:
+            self.loop.call_soon_threadsafe(self.stopping.set)
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+    def run(self):
+        asyncio.run(self.main())
+
+    async def main(self):
+        self.loop = asyncio.get_running_loop()
+        self.stopping = asyncio.Event()
+        for device in self.devices.values():
+            self._spawn(device)
+        flusher = asyncio.create_task(self.flush_loop())
+        self.ready.set()
+
+        await self.stopping.wait()
+        for task in [flusher, *self.tasks.values()]:
+            task.cancel()
+        await asyncio.gather(flusher, *self.tasks.values(), return_exceptions=True)
+        self.tasks.clear()
+        self.flush()
+        self.loop = None
+
+    def _spawn(self, device: Device):
+        self._cancel(device.device_id)
+        runner = self.poll_device if device.transport == 'poll' else self.stream_device
+        self.tasks[device.device_id] = asyncio.create_task(runner(device))
+
+    def _cancel(self, device_id: str):
+        task = self.tasks.pop(device_id, None)
+        if task is not None:
+            task.cancel()
+
+    async def flush_loop(self):
+        # Readings from every device are handed over together, a few times a
+        # second, so the consumer sees tens of batches rather than thousands of calls
+        expected = self.loop.time() + self.flush_interval
+        while True:
+            await asyncio.sleep(max(0.0, expected - self.loop.time()))
+            self.max_lag = max(self.max_lag, self.loop.time() - expected)
+            self.flush()
+            expected = self.loop.time() + self.flush_interval
+
+    def flush(self):
+        if self.pending:
+            batch, self.pending = self.pending, []
+            try:
+                self.sink(batch)
+            except Exception as e:
+                print(f"Band engine sink failed: {e}")
+
+    def accept(self, device: Device, samples: List[Dict]):
+        for sample in samples:
+            try:
+                reading = BiometricReading.from_dict(sample)
+            except (KeyError, TypeError, ValueError):
+                continue
+            ts = to_epoch_ms(reading.timestamp)
+            # Only a repeat is skipped; an older sample means the band's
+            # clock went back (a reboot) and becomes the new reference
+            if ts == device.last_ts:
+                continue
+            device.last_ts = ts
+            device.samples += 1
+            self.pending.append((device.user_id, reading))
+        device.last_seen = time.monotonic()
+
+    def mark(self, device: Device, ok: bool):
+        changed = ok != device.connected
+        device.connected = ok
+        if changed and self.on_status:
+            self.on_status(device, ok)
+        if ok:
+            device.consecutive_failures = 0
+        else:
+            device.failures += 1
+            device.consecutive_failures += 1
+
+    async def poll_device(self, device: Device):
+        connection = HttpConnection(device.address)
+        next_poll = self.loop.time()
+        needs_catch_up = device.last_ts is not None
+        try:
+            while True:
+                if needs_catch_up and device.catch_up_supported:
+                    needs_catch_up = not await self.catch_up(device, connection)
+                device.requests += 1
+                started = time.perf_counter()
+                try:
+                    status, body = await asyncio.wait_for(connection.get('/data'), device.timeout)
+                    if status != 200:
+                        raise HttpError(f"HTTP {status}")
+                    device.latencies.append(time.perf_counter() - started)
+                    self.accept(device, [json.loads(body)])
+                    self.mark(device, True)
+                    # Same drift-free grid as ESP32DataThread
+                    next_poll += device.interval
+                    now = self.loop.time()
+                    if next_poll < now:
+                        next_poll += device.interval * ((now - next_poll) // device.interval + 1)
+                except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, HttpError, ValueError):
+                    connection.close()
+                    self.mark(device, False)
+                    needs_catch_up = device.last_ts is not None
+                    next_poll = self.loop.time() + backoff_delay(device.interval, device.consecutive_failures, device.max_backoff)
+                await asyncio.sleep(max(0.0, next_poll - self.loop.time()))
+        finally:
+            connection.close()
+
+    async def catch_up(self, device: Device, connection: HttpConnection) -> bool:
+        # Pages through /data?since=&limit= until the band has nothing newer
+        while True:
+            device.requests += 1
+            try:
+                status, body = await asyncio.wait_for(
+                    connection.get(f"/data?since={device.last_ts}&limit={device.catch_up_limit}"), device.timeout)
+                if status != 200:
+                    raise HttpError(f"HTTP {status}")
+                page = json.loads(body)
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, HttpError, ValueError):
+                connection.close()
+                return False
+            if not isinstance(page, list):
+                # Older firmware ignores the query and answers with the latest sample
+                device.catch_up_supported = False
+                return True
+            newest = device.last_ts
+            self.accept(device, page)
+            if device.last_ts == newest or len(page) < device.catch_up_limit:
+                return True
+
+    async def stream_device(self, device: Device):
+        framing = 'sse' if device.transport == 'sse' else 'ndjson'
+        accept = 'text/event-stream' if framing == 'sse' else 'application/x-ndjson'
+        while True:
+            connection = HttpConnection(device.address)
+            parser = SampleParser(framing)
+            try:
+                device.requests += 1
+                status, headers = await asyncio.wait_for(
+                    connection.request(f"/stream?format={framing}", f"Accept: {accept}\r\n"), device.timeout)
+                if status != 200 or headers.get('transfer-encoding') != 'chunked':
+                    raise HttpError(f"HTTP {status}")
+                self.mark(device, True)
+                chunks = connection.chunks()
+                while True:
+                    # A silent stream for longer than a few sample periods counts as a drop
+                    chunk = await asyncio.wait_for(chunks.__anext__(), device.timeout + device.interval * 3)
+                    self.accept(device, parser.feed(chunk))
+            except StopAsyncIteration:
+                self.mark(device, False)
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, HttpError, ValueError):
+                self.mark(device, False)
+            finally:
+                connection.close()
+            await asyncio.sleep(backoff_delay(device.interval, max(device.consecutive_failures, 1), device.max_backoff))
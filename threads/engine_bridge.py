@@ -0,0 +1,40 @@
+from typing import Dict, List, Optional
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+from data.database import DatabaseManager
+from threads.band_engine import Batch, BandEngine, Device
+
+class EngineBridge(QObject):
+    # readings_received carries [(user_id, BiometricReading), ...]. It is emitted
+    # from the engine's loop thread, so Qt queues it to receivers on the GUI thread.
+    readings_received = pyqtSignal(list)
+    health_changed = pyqtSignal(dict)
+
+    def __init__(self, devices: List[Device], db_manager: Optional[DatabaseManager] = None,
+                 flush_interval: float = 0.1, health_interval: int = 1000):
+        super().__init__()
+        self.db_manager = db_manager
+        self.engine = BandEngine(self.deliver, flush_interval)
+        for device in devices:
+            self.engine.add_device(device)
+        self.health_timer = QTimer(self)
+        self.health_timer.timeout.connect(self.report_health)
+        self.health_interval = health_interval
+
+    def start(self):
+        self.engine.start()
+        self.health_timer.start(self.health_interval)
+
+    def stop(self):
+        self.health_timer.stop()
+        self.engine.stop(timeout=5)
+
+    def deliver(self, batch: Batch):
+        # Runs on the engine thread: persisting here keeps the GUI thread out of the write path
+        if self.db_manager is not None:
+            for user_id, reading in batch:
+                self.db_manager.queue_reading(user_id, reading)
+        self.readings_received.emit(batch)
+
+    def report_health(self):
+        health: Dict[str, Dict] = self.engine.health()
+        self.health_changed.emit(health)
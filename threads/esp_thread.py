@@ -1,62 +1,120 @@
-import time
+from typing import Callable, Dict, List, Optional, Set
 import requests
-from datetime import datetime
-from PyQt5.QtCore import QThread, pyqtSignal
+from PyQt5.QtCore import QObject, QThread, pyqtSignal
+from data.instrumentation import metrics
 from data.models import BiometricReading
+from threads.sources import FakeSource, PollingSource, ReplaySource
 
 class ESP32DataThread(QThread):
     data_received = pyqtSignal(BiometricReading)
+    # Live samples and catch-up backlogs alike, as lists
+    readings_received = pyqtSignal(list)
     connection_status = pyqtSignal(bool)
+    poll_stats = pyqtSignal(dict)
 
-    def __init__(self, ip_address: str):
+    def __init__(self, ip_address: str, interval: float = 5.0, timeout: float = 3.0,
+                 max_backoff: float = 60.0, stats_every: int = 10,
+                 since: Optional[int] = None, catch_up_limit: int = 500,
+                 since_lookup: Optional[Callable[[], Optional[int]]] = None):
         super().__init__()
-        self.ip_address = ip_address
-        self.running = True
+        self.source = PollingSource(
+            ip_address, self.deliver, self.connection_status.emit,
+            interval=interval, timeout=timeout, max_backoff=max_backoff,
+            since=since, catch_up_limit=catch_up_limit,
+            on_sample=self.data_received.emit, on_stats=self.poll_stats.emit, stats_every=stats_every,
+            since_lookup=since_lookup
+        )
+
+    def deliver(self, readings: List[BiometricReading]):
+        metrics.sent('readings')
+        self.readings_received.emit(readings)
 
     def run(self):
-        while self.running:
-            try:
-                response = requests.get(f"http://{self.ip_address}/data", timeout=3)
-                if response.status_code == 200:
-                    data = response.json()
-                    reading = BiometricReading(
-                        data['timestamp'],
-                        data['glucose'],
-                        data['ph'],
-                        data['oxygen']
-                    )
-                    self.data_received.emit(reading)
-                    self.connection_status.emit(True)
-                else:
-                    self.connection_status.emit(False)
-            except Exception:
-                self.connection_status.emit(False)
-            time.sleep(5)
+        self.source.run()
+
+    def latency_stats(self) -> Dict:
+        return self.source.latency_stats()
 
     def stop(self):
-        self.running = False
+        self.source.stop()
 
 
 class FakeDataThread(QThread):
     data_received = pyqtSignal(BiometricReading)
+    readings_received = pyqtSignal(list)
     connection_status = pyqtSignal(bool)
 
-    def __init__(self):
+    def __init__(self, interval: float = 5.0):
         super().__init__()
-        self.running = True
+        self.source = FakeSource(self.deliver, self.connection_status.emit, interval, on_sample=self.data_received.emit)
+
+    def deliver(self, readings: List[BiometricReading]):
+        metrics.sent('readings')
+        self.readings_received.emit(readings)
 
     def run(self):
-        while self.running:
-            now = datetime.now()
-            fake_data = BiometricReading(
-                timestamp=now.isoformat(),
-                glucose=90 + (5 * (time.time() % 2)),
-                ph=7.0 + (0.2 * (time.time() % 1)),
-                oxygen=95 + (2 * (time.time() % 1))
-            )
-            self.data_received.emit(fake_data)
-            self.connection_status.emit(False)  # Sahte veri, bağlantı yok
-            time.sleep(5)
+        self.source.run()
 
     def stop(self):
-        self.running = False
+        self.source.stop()
+
+
+class ReplayDataThread(QThread):
+    # A recorded CSV played back in place of a band; finished fires when the
+    # trace runs out
+    readings_received = pyqtSignal(list)
+    connection_status = pyqtSignal(bool)
+
+    def __init__(self, filename: str, speed: float = 1.0, loop: bool = False):
+        super().__init__()
+        self.source = ReplaySource(filename, self.deliver, speed, loop)
+
+    def deliver(self, readings: List[BiometricReading]):
+        metrics.sent('readings')
+        self.readings_received.emit(readings)
+
+    def run(self):
+        self.source.run()
+
+    def stop(self):
+        self.source.stop()
+
+
+class DeviceProbe(QThread):
+    # One-off reachability check, run off the GUI thread so an absent band
+    # does not freeze the dashboard for the whole timeout
+    result = pyqtSignal(str, bool)
+    # Probes their owner gave up on, kept alive until the request runs out
+    detached: Set['DeviceProbe'] = set()
+
+    def __init__(self, ip_address: str, timeout: float = 3.0, parent: Optional[QObject] = None):
+        super().__init__(parent)
+        self.ip_address = ip_address
+        self.timeout = timeout
+
+    def run(self):
+        try:
+            reachable = requests.get(f"http://{self.ip_address}/data", timeout=self.timeout).status_code == 200
+        except requests.RequestException:
+            reachable = False
+        self.result.emit(self.ip_address, reachable)
+
+    def detach(self):
+        # Drops the answer and lets the probe finish on its own rather than
+        # blocking the caller on the request for up to the timeout
+        self.result.disconnect()
+        self.setParent(None)
+        DeviceProbe.detached.add(self)
+        self.finished.connect(self.forget)
+        if self.isFinished():
+            self.forget()
+
+    def forget(self):
+        DeviceProbe.detached.discard(self)
+
+    @classmethod
+    def wait_detached(cls):
+        # At exit: a QThread destroyed while running aborts the process
+        for probe in list(cls.detached):
+            probe.wait()
+        cls.detached.clear()
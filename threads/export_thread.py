@@ -0,0 +1,46 @@
+import os
+import sqlite3
+from datetime import datetime
+from typing import Optional, Sequence
+from PyQt5.QtCore import QThread, pyqtSignal
+from data.database import DatabaseManager
+
+class ExportThread(QThread):
+    progress = pyqtSignal(int, int)
+    export_finished = pyqtSignal(bool, str)
+
+    def __init__(self, db_manager: DatabaseManager, user_id: str, filename: str,
+                 start_date: Optional[datetime] = None, end_date: Optional[datetime] = None,
+                 columns: Optional[Sequence[str]] = None):
+        super().__init__()
+        self.db_manager = db_manager
+        self.user_id = user_id
+        self.filename = filename
+        self.start_date = start_date
+        self.end_date = end_date
+        self.columns = columns
+        self.cancelled = False
+
+    def run(self):
+        self.db_manager.flush()
+        try:
+            written = self.db_manager.export_to_csv(
+                self.user_id, self.filename, self.start_date, self.end_date, self.columns,
+                progress=self.progress.emit,
+                should_cancel=lambda: self.cancelled
+            )
+        except (OSError, sqlite3.Error) as e:
+            self.export_finished.emit(False, f"Export failed: {e}")
+            return
+
+        if self.cancelled:
+            try:
+                os.remove(self.filename)
+            except OSError:
+                pass
+            self.export_finished.emit(False, "Export cancelled")
+        else:
+            self.export_finished.emit(True, f"{written} readings exported to {self.filename}")
+
+    def cancel(self):
+        self.cancelled = True
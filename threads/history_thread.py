@@ -0,0 +1,59 @@
+import sqlite3
+from datetime import datetime
+from typing import Dict, Optional
+import numpy as np
+import matplotlib.dates as mdates
+from PyQt5.QtCore import QObject, QThread, pyqtSignal
+from data.database import DatabaseManager
+from data.models import ReadingBatch
+
+class HistoryLoadThread(QThread):
+    # The History tab's chart series and statistics, read off the GUI thread.
+    # Ranges up to raw_limit readings are plotted raw, so zooming shows every
+    # sample; longer ones as a min/max envelope of about buckets rollup
+    # buckets, which costs the same whatever the range.
+    # loaded: (date numbers, {metric: values}, statistics summary or None)
+    loaded = pyqtSignal(object, dict, object)
+
+    def __init__(self, db_manager: DatabaseManager, user_id: str, start_date: datetime, end_date: datetime,
+                 raw_limit: int = 200000, buckets: int = 2000, parent: Optional[QObject] = None):
+        super().__init__(parent)
+        self.db_manager = db_manager
+        self.user_id = user_id
+        self.start_date = start_date
+        self.end_date = end_date
+        self.raw_limit = raw_limit
+        self.buckets = buckets
+        self.cancelled = False
+
+    def run(self):
+        # A cancelled load stops after the query in progress and emits nothing
+        try:
+            if self.db_manager.estimate_reading_count(self.user_id, self.start_date, self.end_date) <= self.raw_limit:
+                batch = self.db_manager.get_reading_batch(self.user_id, self.start_date, self.end_date)
+                timestamps = mdates.date2num(batch.datetimes())
+                series = {metric: batch.column(metric) for metric in batch.METRICS}
+            else:
+                timestamps, series = self.envelope()
+            if self.cancelled:
+                return
+            statistics = self.db_manager.get_statistics(self.user_id, self.start_date, self.end_date)
+        except sqlite3.Error as e:
+            print(f"Loading history failed: {e}")
+            return
+        if not self.cancelled:
+            self.loaded.emit(timestamps, series, statistics[0] if statistics else None)
+
+    def cancel(self):
+        self.cancelled = True
+
+    def envelope(self):
+        # Each bucket's min and max, both at the bucket's start
+        span = (self.end_date - self.start_date).total_seconds()
+        aggregates = self.db_manager.get_aggregates(self.user_id, self.start_date, self.end_date,
+                                                    resolution=max(60.0, span / self.buckets))
+        timestamps = np.repeat(mdates.date2num([row['bucket'] for row in aggregates]), 2)
+        series: Dict[str, np.ndarray] = {}
+        for metric in ReadingBatch.METRICS:
+            series[metric] = np.array([(row[metric]['min'], row[metric]['max']) for row in aggregates]).reshape(-1)
+        return timestamps, series
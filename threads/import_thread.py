@@ -0,0 +1,40 @@
+import sqlite3
+from PyQt5.QtCore import QThread, pyqtSignal
+from data.database import DatabaseManager
+
+class ImportThread(QThread):
+    progress = pyqtSignal(int, int)
+    import_finished = pyqtSignal(bool, str)
+
+    def __init__(self, db_manager: DatabaseManager, user_id: str, filename: str, duplicates: str = 'skip'):
+        super().__init__()
+        self.db_manager = db_manager
+        self.user_id = user_id
+        self.filename = filename
+        self.duplicates = duplicates
+        self.cancelled = False
+
+    def run(self):
+        try:
+            report = self.db_manager.import_from_csv(
+                self.user_id, self.filename, self.duplicates,
+                progress=self.progress.emit,
+                should_cancel=lambda: self.cancelled
+            )
+        except (OSError, ValueError, sqlite3.Error) as e:
+            self.import_finished.emit(False, f"Import failed: {e}")
+            return
+
+        if self.cancelled:
+            # Slices already moved stay; importing the file again skips them
+            self.import_finished.emit(False, f"Import cancelled after {report['written']} readings")
+            return
+        message = f"{report['written']} of {report['rows']} readings imported from {self.filename}"
+        if report['skipped']:
+            message += f"\n{report['skipped']} were already stored and skipped"
+        if report['invalid']:
+            message += f"\n{report['invalid']} rows could not be read"
+        self.import_finished.emit(True, message)
+
+    def cancel(self):
+        self.cancelled = True
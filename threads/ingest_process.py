@@ -0,0 +1,73 @@
+import multiprocessing
+from typing import Dict, Optional
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+from biotrack.ingest import run_process
+from data.instrumentation import metrics
+from data.shared_ring import SharedReadingRing
+
+class IngestProcess(QObject):
+    # Polling, parsing and writing in a child process (biotrack.ingest's
+    # daemon), so neither they nor the GUI's redraws hold the other up on
+    # one GIL. Readings come back through shared memory: each tick hands the
+    # dashboard a ReadingBatch viewing the new records in place, valid only
+    # during the call. Same start/stop/wait as the data threads.
+    batch_received = pyqtSignal(object)
+    connection_status = pyqtSignal(bool)
+
+    def __init__(self, user_id: str, address: Optional[str], band_options: Dict, db_options: Dict,
+                 status_file: str, status_interval: float, retention_days: float,
+                 capacity: int = 65536, interval_ms: int = 33, parent: Optional[QObject] = None):
+        super().__init__(parent)
+        self.ring = SharedReadingRing.create(capacity)
+        self.position = 0
+        self.connected = None
+        # spawn: forking a process that runs Qt and threads isn't safe
+        context = multiprocessing.get_context('spawn')
+        self.stop_event = context.Event()
+        self.process = context.Process(
+            target=run_process, name="BioTrack ingest", daemon=True,
+            args=(self.ring.name, user_id, address, band_options, db_options,
+                  status_file, status_interval, retention_days, self.stop_event)
+        )
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.poll)
+        self.interval_ms = interval_ms
+
+    def start(self):
+        self.process.start()
+        self.timer.start(self.interval_ms)
+
+    def poll(self):
+        records, start, end = self.ring.read(self.position)
+        if start > self.position:
+            metrics.count('ring.lost', start - self.position)
+        self.position = end
+        if len(records):
+            metrics.count('ring.readings', len(records))
+            self.batch_received.emit(self.ring.batch(records))
+            if not self.ring.intact(start):
+                metrics.count('ring.overruns')
+
+        connected = self.ring.connected
+        if not self.process.is_alive():
+            if self.connected is not False:
+                print(f"Ingest process exited with code {self.process.exitcode}")
+            connected = False
+            self.timer.stop()
+        if connected is not None and connected != self.connected:
+            self.connected = connected
+            self.connection_status.emit(connected)
+
+    def stop(self):
+        self.timer.stop()
+        self.stop_event.set()
+
+    def wait(self, timeout: float = 10.0):
+        # The child flushes its writer before exiting
+        if self.process.pid is not None:
+            self.process.join(timeout)
+            if self.process.is_alive():
+                self.process.terminate()
+                self.process.join(timeout)
+        if self.ring.records is not None:
+            self.ring.close()
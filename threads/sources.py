@@ -0,0 +1,380 @@
+import random
+import socket
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+import numpy as np
+import requests
+from data import importer
+from data.instrumentation import metrics
+from data.models import BiometricReading, to_epoch_ms
+from threads.stream_parser import SampleParser
+
+# The band-facing half of ingestion, free of Qt so the headless daemon can run
+# it on plain threads. Each source loops in run() until stop() and hands its
+# readings to callbacks; the QThread classes in esp_thread and stream_thread
+# turn those callbacks into signals.
+
+ReadingsCallback = Callable[[List[BiometricReading]], None]
+StatusCallback = Callable[[bool], None]
+
+def backoff_delay(interval: float, failures: int, max_backoff: float) -> float:
+    # Exponential backoff with jitter, so a ward of bands that lost the same
+    # access point does not reconnect in lockstep
+    ceiling = min(max_backoff, interval * 2 ** failures)
+    return random.uniform(ceiling / 2, ceiling)
+
+class PollingSource:
+    def __init__(self, ip_address: str, on_readings: ReadingsCallback, on_status: Optional[StatusCallback] = None,
+                 interval: float = 5.0, timeout: float = 3.0, max_backoff: float = 60.0,
+                 since: Optional[int] = None, catch_up_limit: int = 500,
+                 on_sample: Optional[Callable[[BiometricReading], None]] = None,
+                 on_stats: Optional[Callable[[Dict], None]] = None, stats_every: int = 10,
+                 since_lookup: Optional[Callable[[], Optional[int]]] = None):
+        self.ip_address = ip_address
+        self.on_readings = on_readings
+        self.on_status = on_status
+        self.on_sample = on_sample
+        self.on_stats = on_stats
+        self.interval = interval
+        self.timeout = timeout
+        self.max_backoff = max_backoff
+        self.stats_every = stats_every
+        self.running = True
+        self.stop_event = threading.Event()
+        self.latencies = deque(maxlen=512)
+        self.polls = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        # Epoch ms of the newest sample we have seen; catch-up asks the band
+        # for everything after it
+        self.last_ts = since
+        self.catch_up_limit = catch_up_limit
+        self.catch_up_supported = True
+        self.needs_catch_up = since is not None
+        # Finds since on the source's own thread (it can mean flushing the
+        # database writer), replacing the value given
+        self.since_lookup = since_lookup
+        self.connected = None
+
+    def run(self):
+        if self.since_lookup is not None:
+            self.last_ts = self.since_lookup()
+            self.needs_catch_up = self.last_ts is not None
+        session = requests.Session()
+        next_poll = time.monotonic()
+        try:
+            while self.running:
+                if self.needs_catch_up and self.catch_up_supported:
+                    self.needs_catch_up = not self.catch_up(session)
+                if self.poll(session):
+                    self.consecutive_failures = 0
+                    # Fixed grid on the monotonic clock: request latency does not
+                    # push the schedule back, and overruns skip missed slots
+                    next_poll += self.interval
+                    now = time.monotonic()
+                    if next_poll < now:
+                        next_poll += self.interval * ((now - next_poll) // self.interval + 1)
+                else:
+                    self.consecutive_failures += 1
+                    self.needs_catch_up = self.last_ts is not None
+                    next_poll = time.monotonic() + backoff_delay(self.interval, self.consecutive_failures, self.max_backoff)
+
+                if self.on_stats and self.polls % self.stats_every == 0:
+                    self.on_stats(self.latency_stats())
+                self.stop_event.wait(max(0.0, next_poll - time.monotonic()))
+        finally:
+            session.close()
+
+    def poll(self, session: requests.Session) -> bool:
+        self.polls += 1
+        metrics.count('poll.requests')
+        started = time.perf_counter()
+        try:
+            response = session.get(f"http://{self.ip_address}/data", timeout=self.timeout)
+            self.latencies.append(time.perf_counter() - started)
+            metrics.observe('poll.http', self.latencies[-1])
+            if response.status_code == 200:
+                started = metrics.clock()
+                data = response.json()
+                metrics.record('poll.json', started)
+                started = metrics.clock()
+                reading = BiometricReading.from_dict(data)
+                metrics.record('poll.reading', started)
+                ts = to_epoch_ms(reading.timestamp)
+                # A poll faster than the band's sample rate returns the same
+                # sample again. An older one means the band's clock went back
+                # (a reboot): follow it rather than drop everything from now on.
+                if ts != self.last_ts:
+                    if self.last_ts is not None and ts < self.last_ts:
+                        metrics.count('poll.clock_resets')
+                    self.last_ts = ts
+                    if self.on_sample:
+                        self.on_sample(reading)
+                    self.on_readings([reading])
+                self.set_connected(True)
+                return True
+        except (requests.RequestException, ValueError, KeyError):
+            pass
+        self.failures += 1
+        metrics.count('poll.failures')
+        self.set_connected(False)
+        return False
+
+    def set_connected(self, connected: bool):
+        # Only transitions are reported; the receiver has nothing to redo otherwise
+        if connected != self.connected:
+            self.connected = connected
+            if self.on_status:
+                self.on_status(connected)
+
+    def catch_up(self, session: requests.Session) -> bool:
+        # Pages through /data?since=&limit= until the band has nothing newer,
+        # then hands the whole backlog over as one batch
+        backlog: List[BiometricReading] = []
+        ok = True
+        while self.running:
+            try:
+                response = session.get(f"http://{self.ip_address}/data",
+                                       params={'since': self.last_ts, 'limit': self.catch_up_limit},
+                                       timeout=self.timeout)
+                response.raise_for_status()
+                page = response.json()
+                if not isinstance(page, list):
+                    # Older firmware ignores the query and answers with the latest sample
+                    self.catch_up_supported = False
+                    break
+                readings = [BiometricReading.from_dict(sample) for sample in page]
+            except (requests.RequestException, ValueError, KeyError, TypeError):
+                ok = False
+                break
+
+            readings = [r for r in readings if to_epoch_ms(r.timestamp) > self.last_ts]
+            if not readings:
+                break
+            backlog.extend(readings)
+            self.last_ts = max(to_epoch_ms(r.timestamp) for r in readings)
+            if len(page) < self.catch_up_limit:
+                break
+
+        if backlog:
+            metrics.count('poll.catch_up_readings', len(backlog))
+            self.on_readings(backlog)
+        return ok
+
+    def latency_stats(self) -> Dict:
+        samples = sorted(self.latencies)
+        if not samples:
+            return {'polls': self.polls, 'failures': self.failures}
+        return {
+            'polls': self.polls,
+            'failures': self.failures,
+            'mean_ms': sum(samples) / len(samples) * 1000,
+            'p50_ms': samples[len(samples) // 2] * 1000,
+            'p95_ms': samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000,
+            'max_ms': samples[-1] * 1000
+        }
+
+    def stop(self):
+        self.running = False
+        self.stop_event.set()
+
+class StreamSource:
+    TRANSPORTS = ('sse', 'chunked', 'udp')
+
+    def __init__(self, ip_address: str, on_readings: ReadingsCallback, on_status: Optional[StatusCallback] = None,
+                 transport: str = 'sse', udp_port: int = 5005, batch_size: int = 500,
+                 read_timeout: float = 10.0, max_backoff: float = 60.0):
+        if transport not in self.TRANSPORTS:
+            raise ValueError(f"Unknown transport: {transport}")
+        self.ip_address = ip_address
+        self.on_readings = on_readings
+        self.on_status = on_status
+        self.transport = transport
+        self.udp_port = udp_port
+        self.batch_size = batch_size
+        self.read_timeout = read_timeout
+        self.max_backoff = max_backoff
+        self.running = True
+        self.stop_event = threading.Event()
+        self.response = None
+        self.samples = 0
+        self.parse_errors = 0
+
+    def run(self):
+        failures = 0
+        while self.running:
+            samples = self.samples
+            try:
+                if self.transport == 'udp':
+                    self.consume_udp()
+                else:
+                    self.consume_http()
+            except (requests.RequestException, OSError):
+                pass
+            if not self.running:
+                break
+            # A stream that ended is a drop like a failed connect; only one
+            # that delivered samples resets the backoff, so a band that
+            # accepts and hangs up at once is not retried in a tight loop
+            failures = 0 if self.samples > samples else failures + 1
+            self.set_connected(False)
+            self.stop_event.wait(backoff_delay(1.0, failures, self.max_backoff))
+
+    def set_connected(self, connected: bool):
+        if self.on_status:
+            self.on_status(connected)
+
+    def consume_http(self):
+        framing = 'sse' if self.transport == 'sse' else 'ndjson'
+        headers = {'Accept': 'text/event-stream' if framing == 'sse' else 'application/x-ndjson'}
+        parser = SampleParser(framing)
+        with requests.get(f"http://{self.ip_address}/stream", params={'format': framing}, headers=headers,
+                          stream=True, timeout=(3, self.read_timeout)) as response:
+            response.raise_for_status()
+            self.response = response
+            self.set_connected(True)
+            # chunk_size=None hands over whatever has arrived, so samples are
+            # parsed as they land instead of waiting for a fixed-size read
+            try:
+                for chunk in response.iter_content(chunk_size=None):
+                    if not self.running:
+                        break
+                    self.deliver(parser, chunk)
+            except Exception:
+                # stop() closes the response under a blocked read, which
+                # fails with whatever the closed connection raises
+                if self.running:
+                    raise
+
+    def consume_udp(self):
+        parser = SampleParser('ndjson')
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.bind(('', self.udp_port))
+            sock.settimeout(0.2)
+            self.set_connected(True)
+            while self.running:
+                try:
+                    datagram = sock.recv(65535)
+                except socket.timeout:
+                    continue
+                # A datagram is always complete, so terminate its last line
+                self.deliver(parser, datagram if datagram.endswith(b'\n') else datagram + b'\n')
+
+    def deliver(self, parser: SampleParser, data: bytes):
+        readings: List[BiometricReading] = []
+        for sample in parser.feed(data):
+            try:
+                readings.append(BiometricReading.from_dict(sample))
+            except (KeyError, TypeError, ValueError):
+                self.parse_errors += 1
+        self.parse_errors += parser.errors
+        parser.errors = 0
+
+        for start in range(0, len(readings), self.batch_size):
+            self.on_readings(readings[start:start + self.batch_size])
+        self.samples += len(readings)
+
+    def stop(self):
+        self.running = False
+        self.stop_event.set()
+        if self.response is not None:
+            # Unblocks a read waiting on a quiet stream
+            try:
+                self.response.close()
+            except Exception:
+                pass
+
+class FakeSource:
+    def __init__(self, on_readings: ReadingsCallback, on_status: Optional[StatusCallback] = None,
+                 interval: float = 5.0, on_sample: Optional[Callable[[BiometricReading], None]] = None):
+        self.on_readings = on_readings
+        self.on_status = on_status
+        self.on_sample = on_sample
+        self.interval = interval
+        self.running = True
+        self.stop_event = threading.Event()
+
+    def run(self):
+        if self.on_status:
+            self.on_status(False)  # Sahte veri, bağlantı yok
+        while self.running:
+            now = datetime.now()
+            fake_data = BiometricReading(
+                timestamp=now.isoformat(),
+                glucose=90 + (5 * (time.time() % 2)),
+                ph=7.0 + (0.2 * (time.time() % 1)),
+                oxygen=95 + (2 * (time.time() % 1))
+            )
+            if self.on_sample:
+                self.on_sample(fake_data)
+            self.on_readings([fake_data])
+            self.stop_event.wait(self.interval)
+
+    def stop(self):
+        self.running = False
+        self.stop_event.set()
+
+class ReplaySource:
+    # Plays a recorded CSV (an export) back at speed times real time, with
+    # the recorded timestamps, so alert episodes keep their true durations.
+    # Samples that fall due together go out as one list; a pause longer
+    # than max_gap seconds at the chosen speed is cut short. With loop, each
+    # lap is shifted past the previous one so time keeps moving forward.
+    MAX_SPEED = 1000
+
+    def __init__(self, filename: str, on_readings: ReadingsCallback, speed: float = 1.0, loop: bool = False,
+                 max_gap: float = 5.0, tick: float = 0.01, batch_size: int = 5000):
+        if not 1 <= speed <= self.MAX_SPEED:
+            raise ValueError(f"Replay speed must be between 1x and {self.MAX_SPEED}x, got {speed}")
+        self.filename = filename
+        self.on_readings = on_readings
+        self.speed = speed
+        self.loop = loop
+        self.max_gap = max_gap
+        self.tick = tick
+        self.batch_size = batch_size
+        self.running = True
+        self.stop_event = threading.Event()
+        self.sent = 0
+
+    def run(self):
+        try:
+            ts, glucose, ph, oxygen = importer.load(self.filename)
+        except (OSError, ValueError) as e:
+            print(f"Replay of {self.filename} failed: {e}")
+            return
+        if not len(ts):
+            return
+        # A lap is the trace span plus one typical sample interval
+        lap = int(ts[-1] - ts[0]) + (int(np.median(np.diff(ts))) if len(ts) > 1 else 1000)
+        offset = 0
+        # origin is the trace time that was due at started on the monotonic clock
+        origin, started, position = ts[0], time.monotonic(), 0
+        while self.running:
+            due = np.searchsorted(ts, origin + (time.monotonic() - started) * 1000 * self.speed, 'right')
+            while position < due:
+                end = min(due, position + self.batch_size)
+                self.on_readings([BiometricReading(int(ts[i]) + offset, float(glucose[i]), float(ph[i]), float(oxygen[i]))
+                                  for i in range(position, end)])
+                self.sent += end - position
+                position = end
+
+            if position == len(ts):
+                if not self.loop:
+                    return
+                offset += lap
+                origin, started, position = ts[0], time.monotonic(), 0
+                continue
+
+            wait = (ts[position] - origin) / 1000 / self.speed - (time.monotonic() - started)
+            if wait > self.max_gap:
+                origin += int((wait - self.max_gap) * 1000 * self.speed)
+                wait = self.max_gap
+            self.stop_event.wait(max(self.tick, wait))
+
+    def stop(self):
+        self.running = False
+        self.stop_event.set()
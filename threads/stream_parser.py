@@ -0,0 +1,40 @@
+import json
+from typing import Dict, List
+
+class SampleParser:
+    # Incremental parser for the band's push formats. 'ndjson' is one JSON
+    # object per line (chunked HTTP and UDP datagrams); 'sse' is a
+    # Server-Sent-Events stream whose data lines carry the same objects.
+    def __init__(self, framing: str = 'ndjson', max_buffer: int = 1 << 20):
+        if framing not in ('ndjson', 'sse'):
+            raise ValueError(f"Unknown framing: {framing}")
+        self.framing = framing
+        self.max_buffer = max_buffer
+        self.buffer = b''
+        self.errors = 0
+
+    def feed(self, data: bytes) -> List[Dict]:
+        self.buffer += data
+        separator = b'\n\n' if self.framing == 'sse' else b'\n'
+        if self.framing == 'sse':
+            self.buffer = self.buffer.replace(b'\r\n', b'\n')
+
+        *complete, self.buffer = self.buffer.split(separator)
+        if len(self.buffer) > self.max_buffer:
+            self.buffer = b''
+            self.errors += 1
+
+        samples = []
+        for frame in complete:
+            payload = self._event_data(frame) if self.framing == 'sse' else frame.strip()
+            if not payload:
+                continue
+            try:
+                samples.append(json.loads(payload))
+            except ValueError:
+                self.errors += 1
+        return samples
+
+    def _event_data(self, event: bytes) -> bytes:
+        lines = [line[5:].lstrip() for line in event.split(b'\n') if line.startswith(b'data:')]
+        return b'\n'.join(lines)
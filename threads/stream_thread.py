@@ -0,0 +1,29 @@
+from typing import List
+from PyQt5.QtCore import QThread, pyqtSignal
+from data.instrumentation import metrics
+from data.models import BiometricReading
+from threads.sources import StreamSource
+
+class ESP32StreamThread(QThread):
+    readings_received = pyqtSignal(list)
+    connection_status = pyqtSignal(bool)
+
+    TRANSPORTS = StreamSource.TRANSPORTS
+
+    def __init__(self, ip_address: str, transport: str = 'sse', udp_port: int = 5005,
+                 batch_size: int = 500, read_timeout: float = 10.0, max_backoff: float = 60.0):
+        super().__init__()
+        self.source = StreamSource(
+            ip_address, self.deliver, self.connection_status.emit, transport=transport, udp_port=udp_port,
+            batch_size=batch_size, read_timeout=read_timeout, max_backoff=max_backoff
+        )
+
+    def deliver(self, readings: List[BiometricReading]):
+        metrics.sent('readings')
+        self.readings_received.emit(readings)
+
+    def run(self):
+        self.source.run()
+
+    def stop(self):
+        self.source.stop()
@@ -0,0 +1,57 @@
+import sqlite3
+import threading
+from typing import Optional
+from PyQt5.QtCore import QThread, pyqtSignal
+from biotrack.ingest import read_status
+from data.database import DatabaseManager
+from data.instrumentation import metrics
+from data.models import BiometricReading
+
+class DatabaseTailThread(QThread):
+    # The dashboard's data source while attached to an ingest daemon: new rows
+    # are read back from the database, with the daemon's status file standing
+    # in for the band connection. Same signals as ESP32DataThread.
+    readings_received = pyqtSignal(list)
+    connection_status = pyqtSignal(bool)
+
+    def __init__(self, db_manager: DatabaseManager, user_id: str, status_file: str, interval: float = 1.0,
+                 status_max_age: float = 15.0, since: Optional[int] = None, batch_limit: int = 5000):
+        super().__init__()
+        self.db_manager = db_manager
+        self.user_id = user_id
+        self.status_file = status_file
+        self.interval = interval
+        self.status_max_age = status_max_age
+        self.batch_limit = batch_limit
+        # Rows that land behind the newest one already shown (a catch-up
+        # backlog committed late) are left to the History tab
+        self.last_ts = since
+        self.running = True
+        self.stop_event = threading.Event()
+        self.connected = None
+
+    def run(self):
+        while self.running:
+            try:
+                rows = self.db_manager.get_rows_page(self.user_id, after_ts=self.last_ts, limit=self.batch_limit, order='asc')
+            except sqlite3.Error as e:
+                print(f"Reading new rows failed: {e}")
+                rows = []
+            if rows:
+                self.last_ts = rows[-1][0]
+                metrics.sent('readings')
+                self.readings_received.emit([BiometricReading(row[0], row[1], row[2], row[3]) for row in rows])
+                if len(rows) == self.batch_limit:
+                    continue
+
+            status = read_status(self.status_file, self.status_max_age)
+            band = status['bands'].get(self.user_id) if status else None
+            connected = bool(band and band['connected'])
+            if connected != self.connected:
+                self.connected = connected
+                self.connection_status.emit(connected)
+            self.stop_event.wait(self.interval)
+
+    def stop(self):
+        self.running = False
+        self.stop_event.set()
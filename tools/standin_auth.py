@@ -0,0 +1,145 @@
+# Local stand-in for the Firebase Auth REST endpoints the app uses, for
+# development and tests. Accounts and tokens live in memory. Run with:
+#   python -m tools.standin_auth --port 9099 [--latency 0.5]
+# and point the app at it with
+#   AuthService(FirebaseBackend(**server.urls()))
+
+import argparse
+import json
+import secrets
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlparse
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        server = self.server.auth
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if server.latency:
+            time.sleep(server.latency)
+
+        path = urlparse(self.path).path
+        if path == '/v1/token':
+            form = {key: values[0] for key, values in parse_qs(body.decode()).items()}
+            status, payload = server.refresh(form.get('refresh_token', ''))
+        else:
+            try:
+                request = json.loads(body or b'{}')
+            except ValueError:
+                request = {}
+            action = path.rsplit(':', 1)[-1]
+            handler = {
+                'signUp': server.sign_up,
+                'signInWithPassword': server.sign_in,
+                'sendOobCode': server.send_oob_code,
+            }.get(action)
+            status, payload = handler(request) if handler else (404, {'error': {'message': 'NOT_FOUND'}})
+        self.send_json(status, payload)
+
+    def send_json(self, status: int, payload: Dict):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+class StandInAuth:
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: float = 0.0, token_lifetime: int = 3600):
+        self.latency = latency
+        self.token_lifetime = token_lifetime
+        self.accounts: Dict[str, Dict] = {}  # email -> {uid, password}
+        self.refresh_tokens: Dict[str, str] = {}  # refresh token -> uid
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), _Handler)
+        self.server.daemon_threads = True
+        self.server.auth = self
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def address(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"{host}:{port}"
+
+    def urls(self) -> Dict[str, str]:
+        return {'auth_url': f"http://{self.address}/v1/accounts", 'token_url': f"http://{self.address}/v1/token"}
+
+    def start(self) -> 'StandInAuth':
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def revoke(self, uid: str):
+        with self.lock:
+            self.refresh_tokens = {token: owner for token, owner in self.refresh_tokens.items() if owner != uid}
+
+    def tokens(self, uid: str) -> Dict:
+        refresh_token = secrets.token_urlsafe(24)
+        self.refresh_tokens[refresh_token] = uid
+        return {'idToken': secrets.token_urlsafe(24), 'refreshToken': refresh_token, 'expiresIn': str(self.token_lifetime)}
+
+    def sign_up(self, request: Dict):
+        email, password = request.get('email'), request.get('password', '')
+        with self.lock:
+            if not email or email in self.accounts:
+                return 400, {'error': {'message': 'EMAIL_EXISTS' if email else 'MISSING_EMAIL'}}
+            if len(password) < 6:
+                return 400, {'error': {'message': 'WEAK_PASSWORD'}}
+            uid = secrets.token_hex(14)
+            self.accounts[email] = {'uid': uid, 'password': password}
+            return 200, dict(self.tokens(uid), localId=uid, email=email)
+
+    def sign_in(self, request: Dict):
+        email = request.get('email')
+        with self.lock:
+            account = self.accounts.get(email)
+            if account is None or account['password'] != request.get('password'):
+                return 400, {'error': {'message': 'INVALID_LOGIN_CREDENTIALS'}}
+            return 200, dict(self.tokens(account['uid']), localId=account['uid'], email=email)
+
+    def send_oob_code(self, request: Dict):
+        with self.lock:
+            if request.get('email') not in self.accounts:
+                return 400, {'error': {'message': 'EMAIL_NOT_FOUND'}}
+        return 200, {'email': request['email']}
+
+    def refresh(self, refresh_token: str):
+        with self.lock:
+            uid = self.refresh_tokens.pop(refresh_token, None)
+            if uid is None:
+                return 400, {'error': {'message': 'INVALID_REFRESH_TOKEN'}}
+            tokens = self.tokens(uid)
+        return 200, {
+            'id_token': tokens['idToken'],
+            'refresh_token': tokens['refreshToken'],
+            'expires_in': tokens['expiresIn'],
+            'user_id': uid
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description="Stand-in Firebase Auth server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9099)
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds added to every response")
+    args = parser.parse_args()
+
+    server = StandInAuth(args.host, args.port, args.latency)
+    print(f"Stand-in auth on {server.urls()['auth_url']}", flush=True)
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+# Local stand-in for an ESP32 band, for development, tests and benchmarks.
+# Serves GET /data (latest sample, for polling; with ?since=<epoch ms>&limit=N
+# the samples recorded after since, oldest first), GET /stream (chunked NDJSON,
+# or Server-Sent Events with ?format=sse), and can push NDJSON datagrams to a
+# UDP address. Run with:
+#   python -m tools.standin_band --port 8080 --rate 10 [--udp 127.0.0.1:5005] [--count 100]
+
+import argparse
+import json
+import math
+import socket
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+def make_sample(now: Optional[float] = None) -> Dict:
+    now = time.time() if now is None else now
+    return {
+        'timestamp': datetime.fromtimestamp(now, timezone.utc).replace(tzinfo=None).isoformat(timespec='milliseconds'),
+        'glucose': round(100 + 15 * math.sin(now / 60), 2),
+        'ph': round(7.2 + 0.15 * math.sin(now / 45), 3),
+        'oxygen': round(96 + 2 * math.sin(now / 30), 2)
+    }
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        if url.path == '/data' and 'since' in query:
+            limit = int(query.get('limit', ['500'])[0])
+            self.send_json(self.server.band.history(int(query['since'][0]), limit))
+        elif url.path == '/data':
+            self.send_json(make_sample())
+        elif url.path == '/stream':
+            sse = query.get('format', [''])[0] == 'sse' or 'text/event-stream' in self.headers.get('Accept', '')
+            self.stream(sse)
+        else:
+            self.send_error(404)
+
+    def send_json(self, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def stream(self, sse: bool):
+        band = self.server.band
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream' if sse else 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+
+        next_tick = time.monotonic()
+        try:
+            while not band.stopped.is_set():
+                line = json.dumps(make_sample())
+                payload = (f"data: {line}\n\n" if sse else f"{line}\n").encode()
+                self.wfile.write(f"{len(payload):x}\r\n".encode() + payload + b"\r\n")
+                self.wfile.flush()
+                next_tick += 1 / band.rate
+                band.stopped.wait(max(0.0, next_tick - time.monotonic()))
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        self.close_connection = True
+
+class StandInBand:
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, rate: float = 1.0,
+                 udp_target: Optional[Tuple[str, int]] = None, memory: float = 3600.0):
+        self.rate = rate
+        self.memory = memory
+        self.udp_target = udp_target
+        self.stopped = threading.Event()
+        self.server = ThreadingHTTPServer((host, port), _Handler)
+        self.server.daemon_threads = True
+        self.server.band = self
+        self.threads = []
+
+    @property
+    def address(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"{host}:{port}"
+
+    def history(self, since_ms: int, limit: int) -> List[Dict]:
+        # The band keeps `memory` seconds of samples on a 1/rate grid
+        now = time.time()
+        first = max(since_ms / 1000, now - self.memory)
+        tick = math.floor(first * self.rate) + 1
+        samples = []
+        while len(samples) < limit and tick / self.rate <= now:
+            samples.append(make_sample(tick / self.rate))
+            tick += 1
+        return samples
+
+    def start(self) -> 'StandInBand':
+        self.threads.append(threading.Thread(target=self.server.serve_forever, daemon=True))
+        if self.udp_target:
+            self.threads.append(threading.Thread(target=self.push_udp, daemon=True))
+        for thread in self.threads:
+            thread.start()
+        return self
+
+    def push_udp(self):
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            next_tick = time.monotonic()
+            while not self.stopped.is_set():
+                sock.sendto((json.dumps(make_sample()) + "\n").encode(), self.udp_target)
+                next_tick += 1 / self.rate
+                self.stopped.wait(max(0.0, next_tick - time.monotonic()))
+
+    def stop(self):
+        self.stopped.set()
+        self.server.shutdown()
+        self.server.server_close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Stand-in ESP32 band")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--rate', type=float, default=1.0, help="samples per second on push transports")
+    parser.add_argument('--udp', help="host:port to push NDJSON datagrams to")
+    parser.add_argument('--count', type=int, default=1, help="start this many bands on consecutive ports")
+    parser.add_argument('--memory', type=float, default=3600.0, help="seconds of samples kept for ?since= catch-up")
+    args = parser.parse_args()
+
+    udp_target = None
+    if args.udp:
+        host, port = args.udp.rsplit(':', 1)
+        udp_target = (host, int(port))
+
+    bands = [StandInBand(args.host, args.port + i, args.rate, udp_target if i == 0 else None, args.memory).start()
+             for i in range(args.count)]
+    addresses = bands[0].address if args.count == 1 else f"{bands[0].address} .. {bands[-1].address}"
+    print(f"Stand-in band on http://{addresses} at {args.rate} Hz", flush=True)
+    try:
+        bands[0].stopped.wait()
+    except KeyboardInterrupt:
+        for band in bands:
+            band.stop()
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,35 @@
 # ui/dashboard.py
 
+import functools
 from PyQt5.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QLabel
 from data.database import DatabaseManager
-from data.models import BiometricReading, User
-from threads.esp_thread import ESP32DataThread, FakeDataThread
-from ui.widgets import MetricCard, ChartWidget
+from data.alerts import AlertEvaluator, Thresholds
+from data.instrumentation import metrics
+from data.models import BiometricReading, ReadingBatch, User, to_datetime
+from threads.esp_thread import DeviceProbe, ESP32DataThread, FakeDataThread, ReplayDataThread
+from threads.ingest_process import IngestProcess
+from threads.stream_thread import ESP32StreamThread
+from threads.tail_thread import DatabaseTailThread
+from ui.widgets import ChartWidget, FrameScheduler, MetricCard
 from PyQt5.QtCore import Qt
-import requests
+from config import CONFIG
 from datetime import datetime
+from typing import List, Optional
 
 class DashboardWidget(QWidget):
     def __init__(self, db_manager: DatabaseManager):
         super().__init__()
         self.db_manager = db_manager
         self.esp32_thread = None
+        self.probe = None
         self.current_user = None
+        self.connected = None
+        # Whether incoming readings and alert episodes are written; not for
+        # replays, nor while an ingest daemon or process already writes them
+        self.recording = False
+        self.pending_readings: List[BiometricReading] = []
+        self.set_thresholds(Thresholds())
+        self.refresh_scheduler = FrameScheduler(self.refresh_ui, int(1000 / CONFIG['ui_max_fps']), self)
         self.setup_ui()
 
     def setup_ui(self):
@@ -39,9 +54,10 @@ class DashboardWidget(QWidget):
         metrics_layout.addWidget(self.ph_card)
         metrics_layout.addWidget(self.oxygen_card)
 
-        self.glucose_chart = ChartWidget("Glucose Levels", "#ff6b6b")
-        self.ph_chart = ChartWidget("pH Levels", "#4ecdc4")
-        self.oxygen_chart = ChartWidget("Oxygen Levels", "#45b7d1")
+        chart_options = {'capacity': CONFIG['chart_capacity'], 'window': CONFIG['chart_window_seconds']}
+        self.glucose_chart = ChartWidget("Glucose Levels", "#ff6b6b", **chart_options)
+        self.ph_chart = ChartWidget("pH Levels", "#4ecdc4", **chart_options)
+        self.oxygen_chart = ChartWidget("Oxygen Levels", "#45b7d1", **chart_options)
 
         layout.addLayout(header_layout)
         layout.addLayout(metrics_layout)
@@ -53,40 +69,152 @@ class DashboardWidget(QWidget):
 
     def start_monitoring(self, user: User, esp32_ip: str):
         self.current_user = user
+        self.stop_monitoring()
+        # A shared writable database is ingest_mode 'process': a child process records
+        self.recording = not self.db_manager.shared
+
+        if self.db_manager.read_only:
+            # An ingest daemon records the band; show what it writes
+            self.connected = None
+            self.esp32_thread = DatabaseTailThread(
+                self.db_manager, user.uid, CONFIG['ingest_status_file'],
+                interval=CONFIG['attach_poll_interval'] / 1000,
+                status_max_age=CONFIG['ingest_status_interval'] * 3,
+                since=self.db_manager.latest_timestamp(user.uid)
+            )
+            self.esp32_thread.readings_received.connect(self.handle_new_batch)
+            self.esp32_thread.connection_status.connect(self.update_connection_status)
+            self.esp32_thread.start()
+            return
+
+        # The dashboard is usable straight away; the data source is chosen
+        # once the probe answers or times out
+        self.connected = None
+        self.status_label.setText("● Connecting...")
+        self.status_label.setStyleSheet("color: orange; font-weight: bold;")
+        self.probe = DeviceProbe(esp32_ip, CONFIG['esp32_timeout'], parent=self)
+        self.probe.result.connect(self.on_probe_result)
+        self.probe.finished.connect(self.probe.deleteLater)
+        self.probe.start()
+
+    def start_replay(self, user: User, filename: str, speed: float = 1.0, loop: bool = False):
+        self.current_user = user
+        self.stop_monitoring()
+        self.recording = False
+        self.connected = None
+        self.esp32_thread = ReplayDataThread(filename, speed, loop)
+        self.esp32_thread.readings_received.connect(self.handle_new_batch)
+        self.esp32_thread.finished.connect(self.on_replay_finished)
+        self.status_label.setText(f"● Replaying ({speed:g}x)")
+        self.status_label.setStyleSheet("color: #7b5cd6; font-weight: bold;")
+        self.esp32_thread.start()
 
-        if hasattr(self, 'esp32_thread') and self.esp32_thread:
-            self.esp32_thread.stop()
-            self.esp32_thread.wait()
-
-        try:
-            response = requests.get(f"http://{esp32_ip}/data", timeout=3)
-            if response.status_code == 200:
-                self.esp32_thread = ESP32DataThread(esp32_ip)
-            else:
-                raise Exception("ESP32 bağlantısı başarısız")
-        except Exception:
+    def on_replay_finished(self):
+        if self.sender() is self.esp32_thread:
+            self.status_label.setText("● Replay finished")
+            self.status_label.setStyleSheet("color: #666; font-weight: bold;")
+
+    def on_probe_result(self, esp32_ip: str, reachable: bool):
+        if self.sender() is not self.probe or self.current_user is None:
+            return  # superseded by a later start_monitoring or stopped meanwhile
+        self.probe = None
+
+        if self.db_manager.shared:
+            self.start_ingest_process(esp32_ip if reachable else None)
+            return
+        if reachable and CONFIG['esp32_transport'] != 'poll':
+            self.esp32_thread = ESP32StreamThread(
+                esp32_ip,
+                transport=CONFIG['esp32_transport'],
+                udp_port=CONFIG['esp32_udp_port'],
+                max_backoff=CONFIG['esp32_max_backoff']
+            )
+        elif reachable:
+            self.esp32_thread = ESP32DataThread(
+                esp32_ip,
+                interval=CONFIG['data_refresh_interval'] / 1000,
+                timeout=CONFIG['esp32_timeout'],
+                max_backoff=CONFIG['esp32_max_backoff'],
+                since_lookup=functools.partial(self.db_manager.latest_timestamp, self.current_user.uid),
+                catch_up_limit=CONFIG['esp32_catch_up_limit']
+            )
+        else:
             print("ESP32 bağlantısı yok, sahte veri kullanılacak.")
-            self.esp32_thread = FakeDataThread()
+            self.esp32_thread = FakeDataThread(CONFIG['data_refresh_interval'] / 1000)
 
-        self.esp32_thread.data_received.connect(self.handle_new_data)
+        self.esp32_thread.readings_received.connect(self.handle_new_batch)
         self.esp32_thread.connection_status.connect(self.update_connection_status)
         self.esp32_thread.start()
 
-    def handle_new_data(self, reading: BiometricReading):
-        self.glucose_card.update_value(reading.glucose, self.get_glucose_status(reading.glucose))
-        self.ph_card.update_value(reading.ph, self.get_ph_status(reading.ph))
-        self.oxygen_card.update_value(reading.oxygen, self.get_oxygen_status(reading.oxygen))
-
-        self.glucose_chart.add_data_point(reading.timestamp, reading.glucose)
-        self.ph_chart.add_data_point(reading.timestamp, reading.ph)
-        self.oxygen_chart.add_data_point(reading.timestamp, reading.oxygen)
-
-        if self.current_user:
-            self.db_manager.save_reading(self.current_user.uid, reading)
+    def start_ingest_process(self, esp32_ip: Optional[str]):
+        if esp32_ip is None:
+            print("ESP32 bağlantısı yok, sahte veri kullanılacak.")
+        band_options = {
+            'transport': CONFIG['esp32_transport'],
+            'interval': CONFIG['data_refresh_interval'] / 1000,
+            'timeout': CONFIG['esp32_timeout'],
+            'max_backoff': CONFIG['esp32_max_backoff'],
+            'catch_up_limit': CONFIG['esp32_catch_up_limit'],
+            'udp_port': CONFIG['esp32_udp_port']
+        }
+        db_options = {
+            'db_name': self.db_manager.db_name,
+            'batch_size': CONFIG['db_batch_size'],
+            'flush_interval': CONFIG['db_flush_interval'] / 1000,
+            'archive_dir': self.db_manager.archive_dir
+        }
+        self.esp32_thread = IngestProcess(
+            self.current_user.uid, esp32_ip, band_options, db_options,
+            CONFIG['ingest_status_file'], CONFIG['ingest_status_interval'], CONFIG['retention_days'],
+            capacity=CONFIG['ingest_ring_capacity'], interval_ms=int(1000 / CONFIG['ui_max_fps']), parent=self
+        )
+        self.esp32_thread.batch_received.connect(self.show_batch)
+        self.esp32_thread.connection_status.connect(self.update_connection_status)
+        self.esp32_thread.start()
 
-        self.last_update_label.setText(f"Last update: {reading.timestamp.strftime('%H:%M:%S')}")
+    @metrics.timed('dashboard.handle_batch')
+    def handle_new_batch(self, readings: List[BiometricReading]):
+        # Readings are written straight away but only drawn by refresh_ui, at
+        # most once per frame however fast they arrive
+        metrics.received('readings')
+        metrics.count('dashboard.readings', len(readings))
+        if self.current_user and self.recording:
+            self.db_manager.queue_readings(self.current_user.uid, readings)
+        self.pending_readings.extend(readings)
+        self.refresh_scheduler.request()
+
+    def refresh_ui(self):
+        readings, self.pending_readings = self.pending_readings, []
+        if readings:
+            self.show_batch(ReadingBatch.from_readings(readings))
+
+    @metrics.timed('dashboard.refresh')
+    def show_batch(self, batch: ReadingBatch):
+        # Also the ingest process's per-tick slot; its batch views shared
+        # memory, so nothing here may hold on to the arrays
+        metrics.count('dashboard.frames')
+        self.glucose_chart.add_epoch_points(batch.timestamps, batch.glucose)
+        self.ph_chart.add_epoch_points(batch.timestamps, batch.ph)
+        self.oxygen_chart.add_epoch_points(batch.timestamps, batch.oxygen)
+
+        glucose, ph, oxygen = float(batch.glucose[-1]), float(batch.ph[-1]), float(batch.oxygen[-1])
+        self.glucose_card.update_value(glucose, self.thresholds.status('glucose', glucose))
+        self.ph_card.update_value(ph, self.thresholds.status('ph', ph))
+        self.oxygen_card.update_value(oxygen, self.thresholds.status('oxygen', oxygen))
+
+        started = metrics.clock()
+        episodes = self.alert_evaluator.feed(batch)
+        if episodes and self.current_user and self.recording:
+            self.db_manager.queue_alert_events(self.current_user.uid, episodes)
+        metrics.record('dashboard.alerts', started)
+
+        latest = to_datetime(int(batch.timestamps[-1]))
+        self.last_update_label.setText(f"Last update: {latest.strftime('%H:%M:%S')}")
 
     def update_connection_status(self, connected: bool):
+        if connected == self.connected:
+            return
+        self.connected = connected
         if connected:
             self.status_label.setText("● Connected")
             self.status_label.setStyleSheet("color: green; font-weight: bold;")
@@ -94,28 +222,16 @@ class DashboardWidget(QWidget):
             self.status_label.setText("● Disconnected")
             self.status_label.setStyleSheet("color: red; font-weight: bold;")
 
-    def get_glucose_status(self, value: float) -> str:
-        if value < 70 or value > 140:
-            return "critical"
-        elif value < 80 or value > 120:
-            return "warning"
-        return "normal"
-
-    def get_ph_status(self, value: float) -> str:
-        if value < 6.5 or value > 7.5:
-            return "critical"
-        elif value < 7.0 or value > 7.4:
-            return "warning"
-        return "normal"
-
-    def get_oxygen_status(self, value: float) -> str:
-        if value < 90:
-            return "critical"
-        elif value < 95:
-            return "warning"
-        return "normal"
+    def set_thresholds(self, thresholds: Thresholds):
+        # Open episodes belong to the old limits; the evaluator starts afresh
+        self.thresholds = thresholds
+        self.alert_evaluator = AlertEvaluator(thresholds)
 
     def stop_monitoring(self):
+        if self.probe is not None:
+            self.probe.detach()
+            self.probe = None
         if self.esp32_thread:
             self.esp32_thread.stop()
             self.esp32_thread.wait()
+            self.esp32_thread = None
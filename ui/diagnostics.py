@@ -0,0 +1,167 @@
+# ui/diagnostics.py
+
+from PyQt5.QtWidgets import (
+    QWidget, QVBoxLayout, QHBoxLayout, QGroupBox, QLabel, QCheckBox, QPushButton, QSpinBox,
+    QComboBox, QTableWidget, QTableWidgetItem, QHeaderView, QPlainTextEdit, QFileDialog, QMessageBox
+)
+from PyQt5.QtCore import QTimer
+from PyQt5.QtGui import QFont
+from data.instrumentation import Capture, metrics
+from datetime import datetime
+from typing import Dict, List, Optional
+
+STAGE_COLUMNS = ["Stage", "Count", "Mean ms", "p50 ms", "p95 ms", "p99 ms", "Max ms"]
+
+class DiagnosticsWidget(QWidget):
+    def __init__(self, db_manager=None):
+        super().__init__()
+        self.db_manager = db_manager
+        self.capture: Optional[Capture] = None
+        self.capture_report = ""
+        self.setup_ui()
+
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.timeout.connect(self.refresh)
+        self.refresh_timer.start(1000)
+
+    def setup_ui(self):
+        layout = QVBoxLayout()
+
+        controls_layout = QHBoxLayout()
+        self.enabled_check = QCheckBox("Record timings")
+        self.enabled_check.setChecked(metrics.enabled)
+        self.enabled_check.toggled.connect(metrics.enable)
+        controls_layout.addWidget(self.enabled_check)
+
+        reset_btn = QPushButton("Reset")
+        reset_btn.clicked.connect(self.reset)
+        controls_layout.addWidget(reset_btn)
+
+        save_btn = QPushButton("Save JSON...")
+        save_btn.clicked.connect(self.save_json)
+        controls_layout.addWidget(save_btn)
+
+        controls_layout.addStretch()
+        self.summary_label = QLabel()
+        self.summary_label.setStyleSheet("color: #666;")
+        controls_layout.addWidget(self.summary_label)
+
+        self.stages_table = QTableWidget(0, len(STAGE_COLUMNS))
+        self.stages_table.setHorizontalHeaderLabels(STAGE_COLUMNS)
+        self.stages_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.stages_table.verticalHeader().setVisible(False)
+        self.stages_table.setEditTriggers(QTableWidget.NoEditTriggers)
+
+        self.counters_table = QTableWidget(0, 2)
+        self.counters_table.setHorizontalHeaderLabels(["Counter", "Value"])
+        self.counters_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.counters_table.verticalHeader().setVisible(False)
+        self.counters_table.setEditTriggers(QTableWidget.NoEditTriggers)
+
+        tables_layout = QHBoxLayout()
+        tables_layout.addWidget(self.stages_table, 3)
+        tables_layout.addWidget(self.counters_table, 1)
+
+        # Profiling
+        capture_group = QGroupBox("Capture")
+        capture_layout = QVBoxLayout()
+        capture_controls = QHBoxLayout()
+        self.capture_kind = QComboBox()
+        self.capture_kind.addItem("CPU profile (GUI thread)", 'cpu')
+        self.capture_kind.addItem("Memory allocations", 'memory')
+        capture_controls.addWidget(self.capture_kind)
+        capture_controls.addWidget(QLabel("for"))
+        self.capture_seconds = QSpinBox()
+        self.capture_seconds.setRange(1, 300)
+        self.capture_seconds.setValue(10)
+        self.capture_seconds.setSuffix(" s")
+        capture_controls.addWidget(self.capture_seconds)
+        self.capture_btn = QPushButton("Start Capture")
+        self.capture_btn.clicked.connect(self.start_capture)
+        capture_controls.addWidget(self.capture_btn)
+        capture_controls.addStretch()
+
+        self.capture_output = QPlainTextEdit()
+        self.capture_output.setReadOnly(True)
+        self.capture_output.setFont(QFont("Monospace", 9))
+        capture_layout.addLayout(capture_controls)
+        capture_layout.addWidget(self.capture_output)
+        capture_group.setLayout(capture_layout)
+
+        layout.addLayout(controls_layout)
+        layout.addLayout(tables_layout, 2)
+        layout.addWidget(capture_group, 1)
+        self.setLayout(layout)
+
+    def snapshot(self) -> Dict:
+        snapshot = metrics.snapshot()
+        if self.db_manager is not None:
+            snapshot['writer'] = self.db_manager.writer_stats()
+            snapshot['cache'] = self.db_manager.cache_stats()
+        return snapshot
+
+    def refresh(self):
+        if not self.isVisible():
+            return
+        snapshot = self.snapshot()
+
+        stages = snapshot['stages']
+        self.stages_table.setRowCount(len(stages))
+        for row, (name, stats) in enumerate(stages.items()):
+            values = [name, str(stats['count'])] + [
+                f"{stats[key]:.3f}" for key in ('mean_ms', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms')
+            ]
+            for column, value in enumerate(values):
+                self.stages_table.setItem(row, column, QTableWidgetItem(value))
+
+        counters: List = list(snapshot['counters'].items()) + [(name, f"{value:g}") for name, value in snapshot['gauges'].items()]
+        counters += [(f"writer.{name}", f"{value:.1f}" if isinstance(value, float) else value)
+                     for name, value in snapshot.get('writer', {}).items()]
+        counters += [(f"cache.{name}", f"{value:.3f}" if isinstance(value, float) else value)
+                     for name, value in snapshot.get('cache', {}).items()]
+        self.counters_table.setRowCount(len(counters))
+        for row, (name, value) in enumerate(counters):
+            self.counters_table.setItem(row, 0, QTableWidgetItem(name))
+            self.counters_table.setItem(row, 1, QTableWidgetItem(str(value)))
+
+        state = "recording" if snapshot['enabled'] else "off"
+        self.summary_label.setText(f"{state}, {snapshot['seconds']:.0f} s of data")
+
+    def reset(self):
+        metrics.reset()
+        self.refresh()
+
+    def save_json(self):
+        filename, _ = QFileDialog.getSaveFileName(
+            self, "Save Diagnostics",
+            f"biotrack_diagnostics_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
+            "JSON Files (*.json)"
+        )
+        if not filename:
+            return
+        extra = {'writer': self.db_manager.writer_stats(), 'cache': self.db_manager.cache_stats()} if self.db_manager is not None else {}
+        if self.capture_report:
+            extra['capture'] = self.capture_report
+        try:
+            metrics.dump(filename, extra)
+        except OSError as e:
+            QMessageBox.warning(self, "Error", f"Could not save diagnostics: {e}")
+
+    def start_capture(self):
+        if self.capture is not None:
+            return
+        seconds = self.capture_seconds.value()
+        self.capture = Capture(self.capture_kind.currentData())
+        self.capture.start()
+        self.capture_btn.setEnabled(False)
+        self.capture_output.setPlainText(f"Capturing for {seconds} s...")
+        QTimer.singleShot(seconds * 1000, lambda capture=self.capture: self.finish_capture(capture))
+
+    def finish_capture(self, capture: Optional[Capture] = None):
+        # Without an argument, stops whatever capture is running
+        if self.capture is None or capture not in (None, self.capture):
+            return
+        capture, self.capture = self.capture, None
+        self.capture_report = capture.stop()
+        self.capture_output.setPlainText(self.capture_report)
+        self.capture_btn.setEnabled(True)
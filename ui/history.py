@@ -2,18 +2,120 @@
 
 from PyQt5.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton,
-    QDateEdit, QTableWidget, QTableWidgetItem, QHeaderView, QFileDialog, QMessageBox
+    QDateEdit, QTableView, QHeaderView, QFileDialog, QMessageBox,
+    QCheckBox, QProgressDialog, QSplitter
 )
-from PyQt5.QtCore import QDate
+from PyQt5.QtCore import QDate, Qt, QAbstractTableModel, QModelIndex
 from data.database import DatabaseManager
-from data.models import User
+from data.models import User, to_datetime
+from threads.export_thread import ExportThread
+from threads.history_thread import HistoryLoadThread
+from threads.import_thread import ImportThread
+from ui.widgets import HistoryChartWidget, StatisticsStrip
 from datetime import datetime
+from typing import Dict, List, Optional
+import numpy as np
+
+class ReadingsTableModel(QAbstractTableModel):
+    HEADERS = ["Timestamp", "Glucose", "pH", "Oxygen"]
+    FORMATS = [None, "{:.1f}", "{:.2f}", "{:.1f}"]
+
+    def __init__(self, db_manager: DatabaseManager, page_size: int = 500):
+        super().__init__()
+        self.db_manager = db_manager
+        self.page_size = page_size
+        self.user_id: Optional[str] = None
+        self.start_date: Optional[datetime] = None
+        self.end_date: Optional[datetime] = None
+        self.rows: List[tuple] = []  # newest first, raw (epoch ms, glucose, ph, oxygen)
+        self.exhausted = True
+
+    def set_query(self, user_id: str, start_date: datetime, end_date: datetime):
+        self.beginResetModel()
+        self.user_id = user_id
+        self.start_date = start_date
+        self.end_date = end_date
+        self.rows = []
+        self.exhausted = False
+        self.endResetModel()
+        self.fetchMore(QModelIndex())
+
+    def is_query(self, user_id: str, start_date: datetime, end_date: datetime) -> bool:
+        return (self.user_id, self.start_date, self.end_date) == (user_id, start_date, end_date)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role != Qt.DisplayRole:
+            return None
+
+        value = self.rows[index.row()][index.column()]
+        if index.column() == 0:
+            return to_datetime(value).strftime('%Y-%m-%d %H:%M:%S')
+        return self.FORMATS[index.column()].format(value)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self.exhausted
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self.exhausted or self.user_id is None:
+            return
+
+        oldest = self.rows[-1][0] if self.rows else None
+        page = self.db_manager.get_rows_page(
+            self.user_id, self.start_date, self.end_date, after_ts=oldest, limit=self.page_size, order='desc'
+        )
+        if len(page) < self.page_size:
+            self.exhausted = True
+        if page:
+            self.beginInsertRows(QModelIndex(), len(self.rows), len(self.rows) + len(page) - 1)
+            self.rows.extend(page)
+            self.endInsertRows()
+
+    def refresh(self):
+        if self.user_id is None:
+            return
+        if not self.rows:
+            self.exhausted = False
+            self.fetchMore(QModelIndex())
+            return
+
+        newest = self.rows[0][0]
+        new_rows = []
+        while True:
+            page = self.db_manager.get_rows_page(
+                self.user_id, self.start_date, self.end_date, after_ts=newest, limit=self.page_size, order='asc'
+            )
+            new_rows.extend(page)
+            if len(page) < self.page_size:
+                break
+            newest = page[-1][0]
+
+        if new_rows:
+            new_rows.reverse()
+            self.beginInsertRows(QModelIndex(), 0, len(new_rows) - 1)
+            self.rows[:0] = new_rows
+            self.endInsertRows()
 
 class HistoryWidget(QWidget):
     def __init__(self, db_manager: DatabaseManager):
         super().__init__()
         self.db_manager = db_manager
         self.current_user = None
+        self.export_thread = None
+        self.import_thread = None
+        self.load_thread = None
+        # Superseded loads still running; each is dropped when it finishes
+        self.load_threads: List[HistoryLoadThread] = []
         self.setup_ui()
 
     def setup_ui(self):
@@ -40,46 +142,184 @@ class HistoryWidget(QWidget):
         self.export_btn.clicked.connect(self.export_data)
         controls_layout.addWidget(self.export_btn)
 
+        self.export_range_check = QCheckBox("Selected range only")
+        controls_layout.addWidget(self.export_range_check)
+
+        self.import_btn = QPushButton("Import CSV...")
+        self.import_btn.clicked.connect(self.import_data)
+        # Attached to an ingest daemon the database is read-only
+        self.import_btn.setEnabled(not self.db_manager.read_only)
+        controls_layout.addWidget(self.import_btn)
+
         controls_layout.addStretch()
 
-        self.history_table = QTableWidget()
-        self.history_table.setColumnCount(4)
-        self.history_table.setHorizontalHeaderLabels(["Timestamp", "Glucose", "pH", "Oxygen"])
+        self.history_model = ReadingsTableModel(self.db_manager)
+        self.history_table = QTableView()
+        self.history_table.setModel(self.history_model)
         self.history_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.history_table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+
+        self.history_chart = HistoryChartWidget()
+        self.statistics_strip = StatisticsStrip()
+
+        table_pane = QWidget()
+        table_layout = QVBoxLayout()
+        table_layout.setContentsMargins(0, 0, 0, 0)
+        table_layout.addWidget(self.statistics_strip)
+        table_layout.addWidget(self.history_table)
+        table_pane.setLayout(table_layout)
+
+        splitter = QSplitter(Qt.Vertical)
+        splitter.addWidget(self.history_chart)
+        splitter.addWidget(table_pane)
 
         layout.addLayout(controls_layout)
-        layout.addWidget(self.history_table)
+        layout.addWidget(splitter)
         self.setLayout(layout)
 
     def set_user(self, user: User):
         self.current_user = user
         self.load_history()
 
+    def selected_range(self):
+        start_dt = datetime.combine(self.start_date.date().toPyDate(), datetime.min.time())
+        end_dt = datetime.combine(self.end_date.date().toPyDate(), datetime.max.time())
+        return start_dt, end_dt
+
     def load_history(self):
         if not self.current_user:
             return
 
-        start_dt = datetime.combine(self.start_date.date().toPyDate(), datetime.min.time())
-        end_dt = datetime.combine(self.end_date.date().toPyDate(), datetime.max.time())
-        readings = self.db_manager.get_readings(self.current_user.uid, start_dt, end_dt)
+        self.db_manager.flush()
+        start_dt, end_dt = self.selected_range()
+        if self.history_model.is_query(self.current_user.uid, start_dt, end_dt):
+            self.history_model.refresh()
+        else:
+            self.history_model.set_query(self.current_user.uid, start_dt, end_dt)
+        # A month of raw rows takes seconds; the chart and statistics follow when read
+        if self.load_thread is not None:
+            self.load_thread.cancel()
+        self.load_thread = HistoryLoadThread(self.db_manager, self.current_user.uid, start_dt, end_dt)
+        self.load_thread.loaded.connect(self.on_history_loaded)
+        self.load_thread.finished.connect(self.on_load_finished)
+        self.load_threads.append(self.load_thread)
+        self.load_thread.start()
+
+    def on_history_loaded(self, timestamps: np.ndarray, series: Dict[str, np.ndarray], statistics: Optional[Dict]):
+        if self.sender() is not self.load_thread:
+            return  # superseded by a later load
+        self.history_chart.set_data(timestamps, series)
+        self.statistics_strip.set_statistics(statistics)
+
+    def on_load_finished(self):
+        thread = self.sender()
+        if thread in self.load_threads:
+            self.load_threads.remove(thread)
+            thread.deleteLater()
+        if thread is self.load_thread:
+            self.load_thread = None
 
-        self.history_table.setRowCount(len(readings))
-        for i, reading in enumerate(readings):
-            self.history_table.setItem(i, 0, QTableWidgetItem(reading.timestamp.strftime('%Y-%m-%d %H:%M:%S')))
-            self.history_table.setItem(i, 1, QTableWidgetItem(f"{reading.glucose:.1f}"))
-            self.history_table.setItem(i, 2, QTableWidgetItem(f"{reading.ph:.2f}"))
-            self.history_table.setItem(i, 3, QTableWidgetItem(f"{reading.oxygen:.1f}"))
+    def stop_loading(self):
+        # Before the widget goes away: a QThread destroyed while running aborts the process
+        for thread in self.load_threads:
+            thread.cancel()
+        for thread in self.load_threads:
+            thread.wait()
+        self.load_threads.clear()
+        self.load_thread = None
+
+    def closeEvent(self, event):
+        self.stop_loading()
+        super().closeEvent(event)
 
     def export_data(self):
-        if not self.current_user:
+        if not self.current_user or self.export_thread:
             return
 
         filename, _ = QFileDialog.getSaveFileName(
             self, "Export Data",
             f"biotrack_data_{datetime.now().strftime('%Y%m%d')}.csv",
-            "CSV Files (*.csv)"
+            "CSV Files (*.csv);;Compressed CSV Files (*.csv.gz)"
+        )
+
+        if not filename:
+            return
+
+        start_dt, end_dt = self.selected_range() if self.export_range_check.isChecked() else (None, None)
+        self.export_thread = ExportThread(self.db_manager, self.current_user.uid, filename, start_dt, end_dt)
+
+        self.export_progress = QProgressDialog("Exporting readings...", "Cancel", 0, 100, self)
+        self.export_progress.setWindowModality(Qt.WindowModal)
+        self.export_progress.setMinimumDuration(500)
+        self.export_progress.canceled.connect(self.export_thread.cancel)
+
+        self.export_thread.progress.connect(self.update_export_progress)
+        self.export_thread.export_finished.connect(self.on_export_finished)
+        self.export_btn.setEnabled(False)
+        self.export_thread.start()
+
+    def update_export_progress(self, written: int, total: int):
+        if total:
+            self.export_progress.setValue(min(99, written * 100 // total))
+
+    def on_export_finished(self, success: bool, message: str):
+        self.export_progress.reset()
+        self.export_thread.wait()
+        self.export_thread = None
+        self.export_btn.setEnabled(True)
+
+        if success:
+            QMessageBox.information(self, "Success", message)
+        elif message != "Export cancelled":
+            QMessageBox.critical(self, "Export Failed", message)
+
+    def import_data(self):
+        if not self.current_user or self.import_thread:
+            return
+
+        filename, _ = QFileDialog.getOpenFileName(
+            self, "Import Data", "",
+            "CSV Files (*.csv *.csv.gz);;All Files (*)"
+        )
+
+        if not filename:
+            return
+
+        answer = QMessageBox.question(
+            self, "Import Data",
+            "Readings already stored for the same times: replace them with the file's values?\n"
+            "Choose No to keep the stored readings.",
+            QMessageBox.Yes | QMessageBox.No | QMessageBox.Cancel, QMessageBox.No
         )
+        if answer == QMessageBox.Cancel:
+            return
+        duplicates = 'replace' if answer == QMessageBox.Yes else 'skip'
+        self.import_thread = ImportThread(self.db_manager, self.current_user.uid, filename, duplicates)
+
+        self.import_progress = QProgressDialog("Importing readings...", "Cancel", 0, 100, self)
+        self.import_progress.setWindowModality(Qt.WindowModal)
+        self.import_progress.setMinimumDuration(500)
+        self.import_progress.canceled.connect(self.import_thread.cancel)
+
+        self.import_thread.progress.connect(self.update_import_progress)
+        self.import_thread.import_finished.connect(self.on_import_finished)
+        self.import_btn.setEnabled(False)
+        self.import_thread.start()
+
+    def update_import_progress(self, done: int, total: int):
+        if total:
+            self.import_progress.setValue(min(99, done * 100 // total))
+
+    def on_import_finished(self, success: bool, message: str):
+        self.import_progress.reset()
+        self.import_thread.wait()
+        self.import_thread = None
+        self.import_btn.setEnabled(True)
+        self.load_history()
 
-        if filename:
-            self.db_manager.export_to_csv(self.current_user.uid, filename)
-            QMessageBox.information(self, "Success", f"Data exported to {filename}")
+        if success:
+            QMessageBox.information(self, "Success", message)
+        elif message.startswith("Import cancelled"):
+            QMessageBox.information(self, "Import Cancelled", message)
+        else:
+            QMessageBox.critical(self, "Import Failed", message)
@@ -4,14 +4,16 @@ from PyQt5.QtWidgets import (
 from PyQt5.QtGui import QFont
 from PyQt5.QtCore import Qt, pyqtSignal
 from auth.auth_service import AuthService
-from data.models import User
+from threads.auth_thread import AuthThread
 
 class LoginWindow(QWidget):
-    login_successful = pyqtSignal(User)
+    login_successful = pyqtSignal(object)  # data.models.User; not imported so login stays light
 
-    def __init__(self, auth_service: AuthService):
+    def __init__(self, auth_service: AuthService, auth_thread: AuthThread):
         super().__init__()
         self.auth_service = auth_service
+        self.auth_thread = auth_thread
+        self.auth_thread.call_finished.connect(self.on_call_finished)
         self.setup_ui()
 
     def setup_ui(self):
@@ -98,12 +100,7 @@ class LoginWindow(QWidget):
             QMessageBox.warning(self, "Error", "Please fill in all fields")
             return
 
-        success, message = self.auth_service.sign_in(email, password)
-        if success:
-            self.login_successful.emit(self.auth_service.current_user)
-            self.close()
-        else:
-            QMessageBox.critical(self, "Login Failed", message)
+        self.submit('sign_in', email, password)
 
     def handle_signup(self):
         email = self.email_input.text()
@@ -117,11 +114,7 @@ class LoginWindow(QWidget):
             QMessageBox.warning(self, "Error", "Password must be at least 6 characters")
             return
 
-        success, message = self.auth_service.sign_up(email, password)
-        if success:
-            QMessageBox.information(self, "Success", message)
-        else:
-            QMessageBox.critical(self, "Registration Failed", message)
+        self.submit('sign_up', email, password)
 
     def handle_reset_password(self):
         email = self.email_input.text()
@@ -129,8 +122,34 @@ class LoginWindow(QWidget):
             QMessageBox.warning(self, "Error", "Please enter your email address")
             return
 
-        success, message = self.auth_service.reset_password(email)
-        if success:
+        self.submit('reset_password', email)
+
+    def submit(self, operation: str, *args):
+        # The network call runs on the auth thread; the window stays responsive
+        self.set_busy(True)
+        self.auth_thread.submit(operation, *args)
+
+    def set_busy(self, busy: bool):
+        for button in (self.login_btn, self.signup_btn, self.reset_btn):
+            button.setEnabled(not busy)
+        self.login_btn.setText("Signing in..." if busy else "Sign In")
+
+    def on_call_finished(self, operation: str, success: bool, message: str):
+        if operation == 'refresh':
+            return
+        self.set_busy(False)
+        if operation == 'sign_in':
+            if success:
+                self.login_successful.emit(self.auth_service.current_user)
+                self.close()
+            else:
+                QMessageBox.critical(self, "Login Failed", message)
+        elif operation == 'sign_up':
+            if success:
+                QMessageBox.information(self, "Success", message)
+            else:
+                QMessageBox.critical(self, "Registration Failed", message)
+        elif success:
             QMessageBox.information(self, "Success", message)
         else:
             QMessageBox.critical(self, "Error", message)
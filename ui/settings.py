@@ -4,15 +4,41 @@ from PyQt5.QtWidgets import (
     QWidget, QVBoxLayout, QGroupBox, QLabel, QLineEdit, QSpinBox,
     QPushButton, QGridLayout, QMessageBox
 )
-from PyQt5.QtCore import QSettings
+from PyQt5.QtCore import QSettings, pyqtSignal
 from config import CONFIG
+from typing import Dict, Optional
 
 class SettingsWidget(QWidget):
-    def __init__(self):
+    # Alert thresholds in real units (pH not scaled), as user_settings stores them
+    thresholds_changed = pyqtSignal(dict)
+
+    def __init__(self, db_manager=None):
         super().__init__()
         self.settings = QSettings(CONFIG['settings_file'], QSettings.IniFormat)
+        self.db_manager = db_manager
+        self.user = None
         self.setup_ui()
 
+    def set_user(self, user):
+        # Per-user thresholds saved earlier win over the machine-wide QSettings values
+        self.user = user
+        saved: Optional[Dict] = self.db_manager.get_user_settings(user.uid) if self.db_manager else None
+        if saved:
+            self.glucose_min_spin.setValue(int(saved['glucose_min']))
+            self.glucose_max_spin.setValue(int(saved['glucose_max']))
+            self.ph_min_spin.setValue(round(saved['ph_min'] * 10))
+            self.ph_max_spin.setValue(round(saved['ph_max'] * 10))
+            self.oxygen_min_spin.setValue(int(saved['oxygen_min']))
+
+    def alert_settings(self) -> Dict:
+        return {
+            'glucose_min': self.glucose_min_spin.value(),
+            'glucose_max': self.glucose_max_spin.value(),
+            'ph_min': self.ph_min_spin.value() / 10,
+            'ph_max': self.ph_max_spin.value() / 10,
+            'oxygen_min': self.oxygen_min_spin.value()
+        }
+
     def setup_ui(self):
         layout = QVBoxLayout()
 
@@ -81,4 +107,12 @@ class SettingsWidget(QWidget):
         self.settings.setValue('ph_min', self.ph_min_spin.value())
         self.settings.setValue('ph_max', self.ph_max_spin.value())
         self.settings.setValue('oxygen_min', self.oxygen_min_spin.value())
-        QMessageBox.information(self, "Success", "Settings saved successfully!")
+        if self.db_manager and self.user and not self.db_manager.read_only:
+            self.db_manager.save_user_settings(self.user.uid, dict(self.alert_settings(), esp32_ip=self.esp32_ip_input.text()))
+        self.thresholds_changed.emit(self.alert_settings())
+        if self.db_manager and self.db_manager.read_only:
+            # Attached read-only: the ingest daemon keeps the thresholds stored with its database
+            QMessageBox.information(self, "Saved", "Settings saved for this window. Recorded alerts keep "
+                                                   "the thresholds stored in the ingest daemon's database.")
+        else:
+            QMessageBox.information(self, "Success", "Settings saved successfully!")
@@ -1,13 +1,55 @@
 # ui/widgets.py
 
-from PyQt5.QtWidgets import QFrame, QLabel, QVBoxLayout, QWidget
-from PyQt5.QtCore import Qt
+from PyQt5.QtWidgets import QFrame, QHBoxLayout, QLabel, QVBoxLayout, QWidget
+from PyQt5.QtCore import QObject, Qt, QTimer
 from PyQt5.QtGui import QFont
 
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+from matplotlib.backends.backend_qt5agg import NavigationToolbar2QT as NavigationToolbar
 from matplotlib.figure import Figure
 import matplotlib.dates as mdates
 
+import time
+from datetime import datetime
+from typing import Callable, Dict, Optional
+import numpy as np
+
+from data.downsample import downsample
+from data.instrumentation import metrics
+from data.ringbuffer import RingBuffer
+
+# Epoch milliseconds to matplotlib date numbers
+MS_PER_DAY = 86400000.0
+EPOCH_NUM = mdates.date2num(datetime(1970, 1, 1))
+
+class FrameScheduler(QObject):
+    # Coalesces any number of request() calls into at most one callback per
+    # frame interval. After an idle period the callback runs on the next
+    # event-loop pass, so a slow stream is not delayed by the cap.
+    def __init__(self, callback: Callable[[], None], interval_ms: int = 33, parent: Optional[QObject] = None):
+        super().__init__(parent)
+        self.callback = callback
+        self.interval_ms = interval_ms
+        self.last_frame = None
+        self.frames = 0
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.fire)
+
+    def request(self):
+        if self.timer.isActive():
+            return
+        delay = 0
+        if self.last_frame is not None:
+            delay = max(0, int(self.interval_ms - (time.monotonic() - self.last_frame) * 1000))
+        self.timer.start(delay)
+
+    def fire(self):
+        self.last_frame = time.monotonic()
+        self.frames += 1
+        self.callback()
+
+
 class MetricCard(QFrame):
     def __init__(self, title: str, unit: str, color: str):
         super().__init__()
@@ -58,9 +100,13 @@ class MetricCard(QFrame):
 
     def update_value(self, value: float, status: str = "normal"):
         self.value = value
-        self.status = status
         self.value_label.setText(f"{value:.1f}")
 
+        # setStyleSheet re-polishes the widget, so only touch it on a status change
+        if status == self.status:
+            return
+        self.status = status
+
         status_colors = {
             "normal": "green",
             "warning": "orange",
@@ -70,12 +116,68 @@ class MetricCard(QFrame):
         self.status_label.setStyleSheet(f"color: {status_colors.get(status, 'green')};")
 
 
+class StatisticsStrip(QFrame):
+    # One line per metric summarising a get_statistics result
+    METRICS = [
+        # metric, title, unit, color, decimals
+        ('glucose', "Glucose", "mg/dL", "#ff6b6b", 1),
+        ('ph', "pH", "", "#4ecdc4", 2),
+        ('oxygen', "Oxygen", "%", "#45b7d1", 1),
+    ]
+
+    def __init__(self):
+        super().__init__()
+        self.setFrameStyle(QFrame.StyledPanel)
+        layout = QHBoxLayout()
+        self.count_label = QLabel("No readings")
+        self.count_label.setStyleSheet("color: #666;")
+        layout.addWidget(self.count_label)
+        self.labels = {}
+        for metric, title, unit, color, decimals in self.METRICS:
+            label = QLabel()
+            label.setStyleSheet(f"color: {color};")
+            label.setTextFormat(Qt.RichText)
+            layout.addWidget(label, 1)
+            self.labels[metric] = label
+        self.setLayout(layout)
+        self.set_statistics(None)
+
+    def set_statistics(self, summary: Optional[Dict]):
+        if not summary or not summary['count']:
+            self.count_label.setText("No readings")
+            for label in self.labels.values():
+                label.setText("")
+            return
+
+        self.count_label.setText(f"{summary['count']:,} readings")
+        for metric, title, unit, color, decimals in self.METRICS:
+            stats = summary.get(metric)
+            if stats is None:
+                self.labels[metric].setText("")
+                continue
+            text = (f"<b>{title}</b> {stats['mean']:.{decimals}f} ± {stats['std']:.{decimals}f} {unit}"
+                    f"<br>{stats['min']:.{decimals}f} – {stats['max']:.{decimals}f}")
+            median = stats['percentiles'].get(50)
+            if median is not None:
+                text += f", median ≈ {median:.{decimals}f}"
+            if 'in_range' in stats:
+                text += f", {stats['in_range']:.0%} in range"
+            self.labels[metric].setText(text)
+
+
 class ChartWidget(QWidget):
-    def __init__(self, title: str, color: str):
+    def __init__(self, title: str, color: str, capacity: int = 100, blit: bool = True,
+                 window: Optional[float] = None, downsample_method: str = 'minmax'):
         super().__init__()
         self.title = title
         self.color = color
-        self.data_points = []
+        self.blit = blit
+        self.window = window  # seconds of history to show, None for the whole buffer
+        self.downsample_method = downsample_method
+        self.timestamps = RingBuffer(capacity)
+        self.values = RingBuffer(capacity)
+        self.background = None
+        self.redraw_pending = False
         self.setup_ui()
 
     def setup_ui(self):
@@ -88,26 +190,166 @@ class ChartWidget(QWidget):
         self.ax.set_ylabel("Value")
         self.ax.grid(True, alpha=0.3)
 
+        if self.blit:
+            self.line, = self.ax.plot([], [], color=self.color, linewidth=2, animated=True)
+            self.ax.xaxis_date()
+            self.ax.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M'))
+            self.figure.autofmt_xdate()
+            self.canvas.mpl_connect('draw_event', self.on_draw)
+
         layout.addWidget(self.canvas)
         self.setLayout(layout)
 
     def add_data_point(self, timestamp, value: float):
-        self.data_points.append((timestamp, value))
-        if len(self.data_points) > 100:
-            self.data_points = self.data_points[-100:]
-        self.update_chart()
+        self.timestamps.append(mdates.date2num(timestamp))
+        self.values.append(value)
+        self.schedule_redraw()
+
+    def add_data_points(self, timestamps, values):
+        self.timestamps.extend(mdates.date2num(timestamps))
+        self.values.extend(values)
+        self.schedule_redraw()
+
+    def add_epoch_points(self, timestamps: np.ndarray, values: np.ndarray):
+        # Epoch-ms timestamps, as ReadingBatch holds them; values are copied in
+        self.timestamps.extend(timestamps / MS_PER_DAY + EPOCH_NUM)
+        self.values.extend(values)
+        self.schedule_redraw()
+
+    def schedule_redraw(self):
+        # Several samples arriving in one event-loop pass cost a single frame
+        if not self.redraw_pending:
+            self.redraw_pending = True
+            QTimer.singleShot(0, self.update_chart)
 
+    @metrics.timed('chart.update')
     def update_chart(self):
-        if not self.data_points:
+        self.redraw_pending = False
+        if not len(self.values):
             return
 
-        timestamps, values = zip(*self.data_points)
+        timestamps, values = self.visible_series()
 
-        self.ax.clear()
-        self.ax.plot(timestamps, values, color=self.color, linewidth=2)
-        self.ax.set_title(self.title)
-        self.ax.set_ylabel("Value")
-        self.ax.grid(True, alpha=0.3)
-        self.ax.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M'))
+        if not self.blit:
+            self.ax.clear()
+            self.ax.plot(timestamps, values, color=self.color, linewidth=2)
+            self.ax.xaxis_date()
+            self.ax.set_title(self.title)
+            self.ax.set_ylabel("Value")
+            self.ax.grid(True, alpha=0.3)
+            self.ax.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M'))
+            self.figure.autofmt_xdate()
+            self.canvas.draw()
+            return
+
+        self.line.set_data(timestamps, values)
+        if self.rescale_if_needed(timestamps, values) or self.background is None:
+            self.canvas.draw_idle()
+            return
+
+        self.canvas.restore_region(self.background)
+        self.ax.draw_artist(self.line)
+        self.canvas.blit(self.ax.bbox)
+
+    def visible_series(self):
+        timestamps = self.timestamps.view()
+        values = self.values.view()
+        if self.window is not None:
+            first = timestamps.searchsorted(timestamps[-1] - self.window / 86400)
+            timestamps, values = timestamps[first:], values[first:]
+
+        # Never plot more than about two points per horizontal pixel
+        width = max(int(self.ax.bbox.width), 1)
+        if len(values) > width * 2:
+            timestamps, values = downsample(timestamps, values, width * 2, self.downsample_method)
+        return timestamps, values
+
+    def rescale_if_needed(self, timestamps, values) -> bool:
+        x_min, x_max = self.ax.get_xlim()
+        y_min, y_max = self.ax.get_ylim()
+        first, last = timestamps[0], timestamps[-1]
+        low, high = values.min(), values.max()
+        if first >= x_min and last <= x_max and low >= y_min and high <= y_max:
+            return False
+
+        # Leave headroom so the next samples still fit without another full draw
+        span = max(last - first, 1 / 1440)
+        self.ax.set_xlim(first, last + span * 0.25)
+        margin = max((high - low) * 0.1, abs(high) * 0.01, 1e-3)
+        self.ax.set_ylim(low - margin, high + margin)
+        return True
+
+    def on_draw(self, event):
+        # Full redraws happen later, from draw_idle, so they are counted here rather than timed
+        metrics.count('chart.full_draws')
+        self.background = self.canvas.copy_from_bbox(self.ax.bbox)
+        self.ax.draw_artist(self.line)
+
+
+class HistoryChartWidget(QWidget):
+    SERIES = [
+        ('glucose', "Glucose", "#ff6b6b"),
+        ('ph', "pH", "#4ecdc4"),
+        ('oxygen', "Oxygen", "#45b7d1")
+    ]
+
+    def __init__(self, downsample_method: str = 'minmax'):
+        super().__init__()
+        self.downsample_method = downsample_method
+        self.timestamps = np.empty(0)
+        self.series: Dict[str, np.ndarray] = {}
+        self.redraw_pending = False
+        self.setup_ui()
+
+    def setup_ui(self):
+        layout = QVBoxLayout()
+        self.figure = Figure(figsize=(12, 5), dpi=100)
+        self.canvas = FigureCanvas(self.figure)
+        self.axes = self.figure.subplots(len(self.SERIES), 1, sharex=True)
+        self.lines = {}
+
+        for ax, (key, label, color) in zip(self.axes, self.SERIES):
+            self.lines[key], = ax.plot([], [], color=color, linewidth=1)
+            ax.set_ylabel(label)
+            ax.grid(True, alpha=0.3)
+            ax.xaxis_date()
+        self.axes[-1].xaxis.set_major_formatter(mdates.DateFormatter('%m-%d %H:%M'))
         self.figure.autofmt_xdate()
-        self.canvas.draw()
+        self.axes[0].callbacks.connect('xlim_changed', lambda ax: self.schedule_redraw())
+
+        layout.addWidget(NavigationToolbar(self.canvas, self))
+        layout.addWidget(self.canvas)
+        self.setLayout(layout)
+
+    def set_data(self, timestamps: np.ndarray, series: Dict[str, np.ndarray]):
+        self.timestamps = timestamps
+        self.series = series
+        if len(timestamps):
+            self.axes[0].set_xlim(timestamps[0], max(timestamps[-1], timestamps[0] + 1 / 1440))
+            for ax, (key, _, _) in zip(self.axes, self.SERIES):
+                low, high = series[key].min(), series[key].max()
+                margin = max((high - low) * 0.1, 1e-3)
+                ax.set_ylim(low - margin, high + margin)
+        self.schedule_redraw()
+
+    def schedule_redraw(self):
+        if not self.redraw_pending:
+            self.redraw_pending = True
+            QTimer.singleShot(0, self.update_chart)
+
+    def update_chart(self):
+        self.redraw_pending = False
+        # Only the zoomed-in slice is reduced, so zooming reveals full detail
+        x_min, x_max = self.axes[0].get_xlim()
+        first = max(self.timestamps.searchsorted(x_min) - 1, 0)
+        last = self.timestamps.searchsorted(x_max) + 1
+        timestamps = self.timestamps[first:last]
+        width = max(int(self.axes[0].bbox.width), 1)
+
+        for key, line in self.lines.items():
+            values = self.series.get(key, np.empty(0))[first:last]
+            if len(values) > width * 2:
+                line.set_data(*downsample(timestamps, values, width * 2, self.downsample_method))
+            else:
+                line.set_data(timestamps, values)
+        self.canvas.draw_idle()